@@ -0,0 +1,324 @@
+"""Vectorized analysis of result files.
+
+Slowdowns are computed as arrays over all the runs of a scheduler, and
+their distributions are summarized by quantile sketches: these have a
+fixed size whatever the number of jobs, can be cached per result file
+and merged across files (e.g., different seeds).
+"""
+
+from __future__ import division, print_function
+
+import sys
+
+import numpy
+
+import result_loader
+import weibull_workload
+
+
+def _probabilities():
+    # dense in the tails, where slowdown distributions are interesting
+    body = numpy.linspace(0, 1, 201)
+    tail = numpy.logspace(-6, -2, 33)
+    return numpy.unique(numpy.concatenate([body, tail, 1 - tail]))
+
+PROBABILITIES = _probabilities()
+
+
+class QuantileSketch(object):
+    """Quantiles of a distribution at fixed probabilities.
+
+    The distribution is approximated by interpolating between quantiles,
+    i.e., by a piecewise-linear CDF. For positive values interpolation is
+    done in logarithmic scale, which is much more accurate for
+    heavy-tailed distributions such as slowdowns.
+    """
+
+    def __init__(self, probabilities, values, count):
+        self.probabilities = probabilities
+        self.values = values
+        self.count = count
+
+    @property
+    def log(self):
+        return self.count > 0 and self.values[0] > 0
+
+    @classmethod
+    def from_values(cls, values, probabilities=PROBABILITIES):
+        """Sketch of an array of values; NaN values are ignored."""
+
+        values = numpy.asarray(values, float).ravel()
+        values = values[~numpy.isnan(values)]
+        if not len(values):
+            return cls(probabilities, numpy.full(len(probabilities),
+                                                 numpy.nan), 0)
+        return cls(probabilities, numpy.quantile(values, probabilities),
+                   len(values))
+
+    def quantile(self, p):
+        if self.log:
+            return numpy.exp(numpy.interp(p, self.probabilities,
+                                          numpy.log(self.values)))
+        return numpy.interp(p, self.probabilities, self.values)
+
+    def cdf(self, x):
+        if self.log:
+            x = numpy.log(numpy.maximum(x, self.values[0]))
+            return numpy.interp(x, numpy.log(self.values),
+                                self.probabilities, left=0, right=1)
+        return numpy.interp(x, self.values, self.probabilities,
+                            left=0, right=1)
+
+
+def merge(sketches, probabilities=PROBABILITIES):
+    """Sketch of the union of the samples summarized by sketches.
+
+    The CDF of the union is the mixture of the CDFs of the sketches,
+    weighted by their counts; it is evaluated on all their quantiles and
+    inverted at the given probabilities.
+    """
+
+    sketches = [s for s in sketches if s.count]
+    total = sum(s.count for s in sketches)
+    if not total:
+        return QuantileSketch(probabilities,
+                              numpy.full(len(probabilities), numpy.nan), 0)
+    xs = numpy.unique(numpy.concatenate([s.values for s in sketches]))
+    cdf = sum(s.count / total * s.cdf(xs) for s in sketches)
+    # numpy.interp needs increasing abscissae: drop flat parts of the CDF
+    keep = numpy.concatenate([[True], numpy.diff(cdf) > 0])
+    cdf, xs = cdf[keep], xs[keep]
+    if all(s.log for s in sketches):
+        values = numpy.exp(numpy.interp(probabilities, cdf, numpy.log(xs)))
+    else:
+        values = numpy.interp(probabilities, cdf, xs)
+    return QuantileSketch(probabilities, values, total)
+
+
+# key of result files holding the sketches of each run (see run_sketches)
+TAILS = 'tails'
+
+TAIL_PROBABILITIES = 0.95, 0.99, 0.999
+
+
+def run_sketches(sojourns, sizes=None, priorities=None):
+    """Sketches of the sojourn times and slowdowns of a simulation run.
+
+    Returns a dict with keys 'sojourn' and, if sizes are given,
+    'slowdown' (jobs of size 0 are ignored); if priorities are given,
+    there are also keys such as ('sojourn', priority) for each class.
+    Sketches of different runs can then be merged without keeping their
+    sojourn times (see merge() and tail_sketches()).
+    """
+
+    sojourns = numpy.asarray(sojourns, float)
+    metrics = {'sojourn': sojourns}
+    if sizes is not None:
+        sizes = numpy.asarray(sizes, float)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            metrics['slowdown'] = numpy.where(sizes > 0, sojourns / sizes,
+                                              numpy.nan)
+    res = {}
+    for metric, values in metrics.items():
+        res[metric] = QuantileSketch.from_values(values)
+        if priorities is not None:
+            priorities = numpy.asarray(priorities)
+            for pri in numpy.unique(priorities).tolist():
+                res[metric, pri] = QuantileSketch.from_values(
+                    values[priorities == pri])
+    return res
+
+
+def tail_sketches(fname, shelf, cachedir=None):
+    """{scheduler: {key: QuantileSketch}} merging the run_sketches() of all
+    the runs in a result file; a summary function for result_loader.load().
+
+    For files written before sketches were stored, they are computed from
+    the sojourn times and the sizes, found as in weibull_sizes(); if those
+    cannot be found, only sojourn times are summarized.
+    """
+
+    tails = shelf.get(TAILS, {})
+    sizes = None
+    res = {}
+    for scheduler in result_loader.scheduler_names(shelf):
+        runs = shelf[scheduler]
+        sketches = tails.get(scheduler, [])
+        if len(sketches) < len(runs):
+            if sizes is None:
+                sizes = _legacy_sizes(fname, shelf, cachedir)
+            sketches = [run_sketches(run, sizes) for run in runs]
+        res[scheduler] = {key: merge([s[key] for s in sketches])
+                          for key in sketches[0]}
+    return res
+
+
+def _legacy_sizes(fname, shelf, cachedir):
+    # sizes for a file without stored sketches, or None with a warning
+    try:
+        return weibull_sizes(fname, shelf, cachedir)
+    except (IndexError, ValueError) as e:
+        print("{}: no job sizes ({}), skipping its slowdowns".format(
+            fname, e), file=sys.stderr)
+        return None
+
+
+def slowdowns(runs, sizes):
+    """Slowdowns as a (runs x jobs) array, from the sojourn times of each
+    run (as stored in result files) and the job sizes."""
+
+    return numpy.asarray(runs, float) / numpy.asarray(sizes, float)
+
+
+def weibull_sizes(fname, shelf, cachedir=None):
+    """Job sizes for a result file of experiment_weibull.py.
+
+    Sizes are stored in result files; for files written before that, the
+    workload is regenerated (or taken from the workload cache in cachedir)
+    from the parameters in the file name.
+    """
+
+    if 'sizes' in shelf:
+        return numpy.asarray(shelf['sizes'])
+    fields = result_loader.fields(fname)
+    shape, load, timeshape = (float(fields[i]) for i in (1, 3, 4))
+    njobs, seed = int(fields[5]), int(fields[-1])
+    generator = shelf.get('generator', 'weibull_workload.workload')
+    workload = weibull_workload.cached_workload(
+        cachedir, generator, shape, load, njobs, timeshape, seed)
+    return workload['size']
+
+
+def _summaries(fname, shelf, schedulers, summarize, cachedir):
+    # {scheduler: summarize(slowdowns, sizes)} for a Weibull result file
+    sizes = weibull_sizes(fname, shelf, cachedir)
+    return {scheduler: summarize(slowdowns(shelf[scheduler], sizes), sizes)
+            for scheduler in schedulers if shelf.get(scheduler)}
+
+
+def _sketch(slowdowns, sizes):
+    return QuantileSketch.from_values(slowdowns)
+
+
+def slowdown_sketches(fname, shelf, schedulers, cachedir=None):
+    """{scheduler: QuantileSketch} of slowdowns in a Weibull result file.
+
+    Can be used as a summary function for result_loader.load().
+    """
+
+    return _summaries(fname, shelf, schedulers, _sketch, cachedir)
+
+
+SIZE_EDGES = 10 ** numpy.arange(-8, 8.01, 0.1)
+SLOWDOWN_EDGES = 10 ** numpy.arange(0, 15.01, 0.05)
+
+
+class SizeBuckets(object):
+    """Slowdowns aggregated by job size.
+
+    Jobs are assigned to log-spaced size buckets (jobs outside
+    size_edges go in two extra buckets at the ends). Each bucket holds
+    the number of jobs, the sums of their sizes and slowdowns, and a
+    histogram of slowdowns on log-spaced bins, from which tail quantiles
+    are estimated. Buckets are updated incrementally with add() and
+    merged by summing them with +=.
+    """
+
+    def __init__(self, size_edges=SIZE_EDGES, slowdown_edges=SLOWDOWN_EDGES):
+        self.size_edges = size_edges
+        self.slowdown_edges = slowdown_edges
+        nbuckets = len(size_edges) + 1
+        self.counts = numpy.zeros(nbuckets, numpy.int64)
+        self.size_sums = numpy.zeros(nbuckets)
+        self.slowdown_sums = numpy.zeros(nbuckets)
+        self.histograms = numpy.zeros((nbuckets, len(slowdown_edges) + 1),
+                                      numpy.int64)
+
+    def add(self, sizes, slowdowns):
+        """Add slowdowns, a (runs x jobs) array, of jobs of given sizes;
+        NaN slowdowns (jobs that did not complete) are ignored."""
+
+        slowdowns = numpy.asarray(slowdowns, float)
+        sizes = numpy.broadcast_to(sizes, slowdowns.shape).ravel()
+        slowdowns = slowdowns.ravel()
+        valid = ~numpy.isnan(slowdowns)
+        sizes, slowdowns = sizes[valid], slowdowns[valid]
+
+        nbuckets, nbins = self.histograms.shape
+        buckets = numpy.searchsorted(self.size_edges, sizes, 'right')
+        bins = numpy.searchsorted(self.slowdown_edges, slowdowns, 'right')
+        self.counts += numpy.bincount(buckets, minlength=nbuckets)
+        self.size_sums += numpy.bincount(buckets, sizes, nbuckets)
+        self.slowdown_sums += numpy.bincount(buckets, slowdowns, nbuckets)
+        self.histograms += numpy.bincount(
+            buckets * nbins + bins, minlength=nbuckets * nbins).reshape(
+                nbuckets, nbins)
+
+    def __iadd__(self, other):
+        self.counts += other.counts
+        self.size_sums += other.size_sums
+        self.slowdown_sums += other.slowdown_sums
+        self.histograms += other.histograms
+        return self
+
+    def means(self):
+        """(mean size, mean slowdown) arrays for non-empty buckets."""
+
+        nonempty = self.counts > 0
+        counts = self.counts[nonempty]
+        return (self.size_sums[nonempty] / counts,
+                self.slowdown_sums[nonempty] / counts)
+
+    def quantiles(self, p):
+        """(mean size, slowdown quantile p) arrays for non-empty buckets.
+
+        Quantiles are the geometric centers of histogram bins, so their
+        precision is the width of slowdown bins.
+        """
+
+        nonempty = self.counts > 0
+        cumulative = self.histograms[nonempty].cumsum(1)
+        targets = numpy.maximum(p * self.counts[nonempty], 1)
+        bins = (cumulative < targets[:, None]).sum(1)
+        # bin i covers [edges[i - 1], edges[i]); the first and last bins
+        # are open-ended and represented by the closest edge
+        edges = self.slowdown_edges
+        lower = edges[numpy.maximum(bins - 1, 0)]
+        upper = edges[numpy.minimum(bins, len(edges) - 1)]
+        return (self.size_sums[nonempty] / self.counts[nonempty],
+                numpy.sqrt(lower * upper))
+
+
+def _buckets(slowdowns, sizes):
+    buckets = SizeBuckets()
+    buckets.add(sizes, slowdowns)
+    return buckets
+
+
+def size_buckets(fname, shelf, schedulers, cachedir=None):
+    """{scheduler: SizeBuckets} for a Weibull result file, as
+    slowdown_sketches()."""
+
+    return _summaries(fname, shelf, schedulers, _buckets, cachedir)
+
+
+def priority_means(fname, shelf, schedulers, shape, load, njobs, timeshape=1):
+    """{scheduler: {priority: mean sojourn time}} for a result file of
+    experiment_priorities.py, whose workload had the given parameters."""
+
+    seed = int(result_loader.fields(fname)[-1])
+    _, priorities = weibull_workload.workload_priorities(
+        shape, load, njobs, timeshape, seed)
+    priorities = numpy.array(priorities)
+    res = {}
+    for scheduler in schedulers:
+        runs = numpy.asarray(shelf.get(scheduler, []), float)
+        if not runs.size:
+            res[scheduler] = {}
+            continue
+        pris = numpy.broadcast_to(priorities, runs.shape).ravel()
+        sums = numpy.bincount(pris, runs.ravel())
+        counts = numpy.bincount(pris)
+        res[scheduler] = {pri: sums[pri] / counts[pri]
+                          for pri in numpy.flatnonzero(counts).tolist()}
+    return res
@@ -0,0 +1,172 @@
+"""Bursty and non-stationary arrival processes.
+
+Each process is a function taking the number of jobs n and a
+numpy.random.Generator, and returning the sorted arrival times of n jobs,
+starting at 0. Rates are normalized so that the long-run mean arrival
+rate is 1: durations and periods are expressed in units of the mean
+inter-arrival time. Workload generators then stretch times to obtain the
+desired load (see weibull_workload.workload_arrays).
+
+Processes can be described by strings such as 'mmpp:1,10:100,10',
+'diurnal:1,1,2,4,2,1:1000' or 'batch:8' (see parse()).
+"""
+
+from __future__ import division
+
+import numpy
+
+
+def _piecewise_poisson(starts, durations, rates, rng):
+    # Poisson arrivals with rate rates[i] in [starts[i], starts[i] +
+    # durations[i]): given their number, arrivals are uniform in the interval
+    counts = rng.poisson(rates * durations)
+    times = numpy.repeat(starts, counts)
+    times += rng.random(len(times)) * numpy.repeat(durations, counts)
+    times.sort()
+    return times
+
+
+def _collect(n, chunks):
+    # concatenate arrays from chunks until we have n values
+    if n == 0:
+        return numpy.zeros(0)
+    res, total = [], 0
+    for chunk in chunks:
+        res.append(chunk)
+        total += len(chunk)
+        if total >= n:
+            break
+    times = numpy.concatenate(res)[:n]
+    times -= times[0]
+    return times
+
+
+def mmpp(n, rng, rates, durations):
+    """Markov-modulated Poisson process.
+
+    In state i, jobs arrive with rate proportional to rates[i], and the
+    state changes after an exponential time of mean durations[i]; the next
+    state is chosen uniformly among the others.
+    """
+
+    rates = numpy.atleast_1d(numpy.asarray(rates, float))
+    durations = numpy.atleast_1d(numpy.asarray(durations, float))
+    k = len(rates)
+    if k != len(durations) or k < 2:
+        raise ValueError("mmpp needs at least two states, with a rate and "
+                         "a duration each")
+    if (rates < 0).any() or not (rates * durations).sum() > 0:
+        raise ValueError("mmpp rates must be non-negative, and not all 0")
+    if not (durations > 0).all():
+        raise ValueError("mmpp durations must be positive")
+    # the embedded chain is uniform over states, so time in each state is
+    # proportional to its mean duration
+    rates = rates * durations.sum() / (rates * durations).sum()
+    periods = max(1024, int(n / (rates * durations).mean() / 4))
+
+    def chunks():
+        state, t = rng.integers(k), 0
+        while True:
+            jumps = rng.integers(1, k, periods)
+            states = (state + numpy.cumsum(jumps)) % k
+            state = states[-1]
+            lengths = rng.exponential(durations[states])
+            starts = t + numpy.cumsum(lengths) - lengths
+            t = starts[-1] + lengths[-1]
+            yield _piecewise_poisson(starts, lengths, rates[states], rng)
+
+    return _collect(n, chunks())
+
+
+def diurnal(n, rng, rates, period):
+    """Poisson process with piecewise-constant rate repeating with the given
+    period: the period is split in len(rates) equal slots, and the rate in
+    slot i is proportional to rates[i]."""
+
+    rates = numpy.atleast_1d(numpy.asarray(rates, float))
+    if (rates < 0).any() or not rates.sum() > 0:
+        raise ValueError("diurnal rates must be non-negative, and not all 0")
+    if not period > 0:
+        raise ValueError("the diurnal period must be positive")
+    rates = rates / rates.mean()
+    slot = period / len(rates)
+    cycles = max(1, int(n / period / 4))
+
+    def chunks():
+        t = 0
+        while True:
+            starts = t + slot * numpy.arange(cycles * len(rates))
+            t += cycles * period
+            yield _piecewise_poisson(starts, numpy.full(len(starts), slot),
+                                     numpy.tile(rates, cycles), rng)
+
+    return _collect(n, chunks())
+
+
+def batch(n, rng, mean_batch):
+    """Batches of jobs arriving together, with Poisson batch arrivals and
+    geometrically distributed batch sizes of mean mean_batch."""
+
+    if not mean_batch >= 1:
+        raise ValueError("batches must have at least one job on average")
+    nbatches = int(n / mean_batch) + 1
+
+    def chunks():
+        t = 0
+        while True:
+            times = t + numpy.cumsum(rng.exponential(mean_batch, nbatches))
+            t = times[-1]
+            yield numpy.repeat(times, rng.geometric(1 / mean_batch, nbatches))
+
+    return _collect(n, chunks())
+
+
+PROCESSES = {'mmpp': mmpp, 'diurnal': diurnal, 'batch': batch}
+
+# parameters of each process, and whether they are lists
+PARAMETERS = {'mmpp': [('rates', True), ('durations', True)],
+              'diurnal': [('rates', True), ('period', False)],
+              'batch': [('mean_batch', False)]}
+
+
+def parse(spec):
+    """Turn a 'name:param:param...' description in an arrival process.
+
+    Parameters are numbers or comma-separated lists of numbers (as given
+    in PARAMETERS), passed positionally to the function named name in
+    PROCESSES. Invalid descriptions raise ValueError.
+    """
+
+    name, *params = spec.split(':')
+    if name not in PROCESSES:
+        raise ValueError("unknown arrival process {!r}; choose among "
+                         "{}".format(name, ', '.join(sorted(PROCESSES))))
+    expected = PARAMETERS[name]
+    if len(params) != len(expected):
+        raise ValueError("{} takes {} parameters ({}), not {}".format(
+            name, len(expected), ', '.join(p for p, _ in expected),
+            len(params)))
+    values = []
+    for param, (pname, is_list) in zip(params, expected):
+        try:
+            numbers = [float(x) for x in param.split(',')]
+        except ValueError:
+            raise ValueError("invalid {} for {}: {!r}".format(
+                pname, name, param))
+        if not is_list and len(numbers) > 1:
+            raise ValueError("{} for {} must be a single number, not "
+                             "{!r}".format(pname, name, param))
+        values.append(numbers if is_list else numbers[0])
+    process = PROCESSES[name]
+    # check values now rather than when generating the workload
+    process(0, numpy.random.default_rng(0), *values)
+    return lambda n, rng: process(n, rng, *values)
+
+
+def tag(spec):
+    """Short description of an arrival process, to be used in file names:
+    returns its name and its parameters."""
+
+    # underscores separate fields in result file names
+    name, _, params = spec.partition(':')
+    return name, params.replace(':', '-') or '-'
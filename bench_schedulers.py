@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+"""Microbenchmarks of the schedulers in schedulers.py.
+
+For each scheduler and queue size n, a scheduler is filled with n jobs
+and then driven through cycles of enqueue, schedule, next_internal_event
+and dequeue (of a scheduled job), which keep the queue size constant.
+For each operation we measure its median latency and, with tracemalloc,
+the memory it allocates; the scaling exponent of latencies with n is
+fitted in log-log scale, so that an exponent close to 1 denotes an O(n)
+operation. Results are printed as a summary and can be saved as JSON
+and compared to a previous report.
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import collections
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+import schedulers
+
+SCHEDULERS = collections.OrderedDict(
+    (name, getattr(schedulers, name)) for name in [
+        'FIFO', 'PS', 'GPS', 'SRPT', 'SRPT_plus_PS', 'FSP', 'FSP_plus_PS',
+        'FSPE_PS_DC', 'LAS', 'SRPT_plus_LAS', 'FSP_plus_LAS', 'PSBS',
+        'WSRPTE_GPS'])
+
+OPERATIONS = 'enqueue', 'schedule', 'next_internal_event', 'dequeue'
+
+# time between operations: small with respect to job sizes, so that
+# queues don't drain while we measure
+DT = 1e-3
+
+# exponents above this are reported as linear (or worse) operations
+LINEAR_THRESHOLD = 0.5
+
+
+def build(factory, n, rng):
+    """Return (scheduler, t): a scheduler with n jobs enqueued by time t."""
+
+    scheduler = factory()
+    t = 0
+    for jobid in range(n):
+        scheduler.enqueue(t, jobid, rng.uniform(1, 10))
+        t += DT
+    scheduler.schedule(t)
+    return scheduler, t
+
+
+def cycle(scheduler, t, jobid, size, probe):
+    """Run a cycle of OPERATIONS on scheduler at time t, enqueueing job
+    jobid; probe(op, f) runs f() and measures it."""
+
+    probe('enqueue', lambda: scheduler.enqueue(t, jobid, size))
+    schedule = probe('schedule', lambda: scheduler.schedule(t))
+    probe('next_internal_event', scheduler.next_internal_event)
+    victim = next(iter(schedule)) if schedule else jobid
+    probe('dequeue', lambda: scheduler.dequeue(t, victim))
+
+
+def _cycles(scheduler, t, n, rng, probe, min_time, min_cycles, max_cycles):
+    # run cycles until min_time has elapsed; returns the number of cycles
+    start = time.perf_counter()
+    count = 0
+    while count < max_cycles and (
+            count < min_cycles or time.perf_counter() - start < min_time):
+        t += DT
+        cycle(scheduler, t, n + count, rng.uniform(1, 10), probe)
+        count += 1
+    return count
+
+
+def measure(factory, n, seed=0, min_time=0.2, min_cycles=5,
+            max_cycles=10000, memory=True):
+    """Benchmark a scheduler with queue size n.
+
+    Returns a dict with the median latency (in seconds) and, if memory is
+    True, the median memory allocated (in bytes, as the peak of traced
+    memory during the operation) of each operation, the number of cycles
+    and the memory used per queued job.
+    """
+
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    scheduler, t = build(factory, n, rng)
+    res = {'setup_time': time.perf_counter() - start}
+
+    latencies = collections.defaultdict(list)
+
+    def time_probe(op, f):
+        before = time.perf_counter()
+        result = f()
+        latencies[op].append(time.perf_counter() - before)
+        return result
+
+    res['cycles'] = _cycles(scheduler, t, n, rng, time_probe, min_time,
+                            min_cycles, max_cycles)
+    res['latency'] = {op: statistics.median(latencies[op])
+                      for op in OPERATIONS}
+    if not memory:
+        return res
+
+    # a separate pass: tracing memory slows down operations
+    allocations = collections.defaultdict(list)
+
+    def memory_probe(op, f):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = f()
+        _, peak = tracemalloc.get_traced_memory()
+        allocations[op].append(peak - before)
+        return result
+
+    rng = random.Random(seed)
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        scheduler, t = build(factory, n, rng)
+        after, _ = tracemalloc.get_traced_memory()
+        _cycles(scheduler, t, n, rng, memory_probe, 0, min_cycles,
+                min(res['cycles'], 100))
+    finally:
+        tracemalloc.stop()
+    res['bytes_per_job'] = (after - before) / max(n, 1)
+    res['allocated'] = {op: statistics.median(allocations[op])
+                        for op in OPERATIONS}
+    return res
+
+
+def exponent(sizes, values):
+    """Slope of log(values) as a function of log(sizes)."""
+
+    sizes, values = numpy.asarray(sizes, float), numpy.asarray(values, float)
+    valid = values > 0
+    if valid.sum() < 2:
+        return float('nan')
+    slope, _ = numpy.polyfit(numpy.log(sizes[valid]),
+                             numpy.log(values[valid]), 1)
+    return float(slope)
+
+
+def benchmark(names, sizes, memory=True, min_time=0.2, seed=0,
+              verbose=True):
+    """Run measure() for the given schedulers and queue sizes; return the
+    report as a JSON-serializable dict."""
+
+    report = {'python': platform.python_version(),
+              'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+              'sizes': list(sizes), 'schedulers': {}}
+    for name in names:
+        runs = []
+        for n in sizes:
+            if verbose:
+                print('{} n={}'.format(name, n), end='', file=sys.stderr)
+                sys.stderr.flush()
+            runs.append(measure(SCHEDULERS[name], n, seed, min_time,
+                                memory=memory))
+            if verbose:
+                print(' ({} cycles)'.format(runs[-1]['cycles']),
+                      file=sys.stderr)
+        sched_report = {
+            'cycles': [run['cycles'] for run in runs],
+            'setup_time': [run['setup_time'] for run in runs],
+            'latency': {op: [run['latency'][op] for run in runs]
+                        for op in OPERATIONS},
+        }
+        sched_report['exponent'] = {
+            op: exponent(sizes, latencies)
+            for op, latencies in sched_report['latency'].items()}
+        if memory:
+            sched_report['bytes_per_job'] = [run['bytes_per_job']
+                                             for run in runs]
+            sched_report['allocated'] = {
+                op: [run['allocated'][op] for run in runs]
+                for op in OPERATIONS}
+        report['schedulers'][name] = sched_report
+    return report
+
+
+def summary(report):
+    """Human-readable summary of a report, as a list of lines."""
+
+    n = report['sizes'][-1]
+    lines = ['latency at n={} (us) and scaling exponent; * marks '
+             'operations scaling as O(n) or worse'.format(n),
+             '{:14} {:>21} {:>21} {:>21} {:>21} {:>9}'.format(
+                 'scheduler', *OPERATIONS + ('bytes/job',))]
+    for name, sched_report in report['schedulers'].items():
+        cells = []
+        for op in OPERATIONS:
+            latency = sched_report['latency'][op][-1] * 1e6
+            slope = sched_report['exponent'][op]
+            flag = '*' if slope > LINEAR_THRESHOLD else ' '
+            cells.append('{:10.2f} n^{:5.2f}{}'.format(latency, slope, flag))
+        bytes_per_job = sched_report.get('bytes_per_job', [float('nan')])[-1]
+        lines.append('{:14} {:>21} {:>21} {:>21} {:>21} {:9.0f}'.format(
+            name, *cells + [bytes_per_job]))
+    return lines
+
+
+def compare(report, baseline, tolerance=0.5, exponent_tolerance=0.25):
+    """Regressions of report with respect to baseline, as a list of lines.
+
+    Latencies are compared at the largest queue size both reports have;
+    a regression is a latency more than (1 + tolerance) times the
+    baseline one, or an exponent larger by more than exponent_tolerance.
+    """
+
+    sizes = [n for n in report['sizes'] if n in baseline['sizes']]
+    if not sizes:
+        return ['no queue size in common with the baseline']
+    n = sizes[-1]
+    idx, base_idx = report['sizes'].index(n), baseline['sizes'].index(n)
+    res = []
+    for name, sched_report in report['schedulers'].items():
+        base = baseline['schedulers'].get(name)
+        if base is None:
+            continue
+        for op in OPERATIONS:
+            ratio = (sched_report['latency'][op][idx]
+                     / base['latency'][op][base_idx])
+            if ratio > 1 + tolerance:
+                res.append('{} {}: {:.2f}x slower at n={}'.format(
+                    name, op, ratio, n))
+            delta = sched_report['exponent'][op] - base['exponent'][op]
+            if delta > exponent_tolerance:
+                res.append('{} {}: exponent {:.2f} -> {:.2f}'.format(
+                    name, op, base['exponent'][op],
+                    sched_report['exponent'][op]))
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description="microbenchmarks of the "
+                                     "operations of schedulers")
+    parser.add_argument('schedulers', nargs='*', metavar='scheduler',
+                        help="schedulers to benchmark; default: all ({})"
+                        .format(', '.join(SCHEDULERS)))
+    parser.add_argument('--max_size', type=int, default=10 ** 5,
+                        help="largest queue size; sizes are powers of 10 "
+                        "from 10 to this (e.g. 1000000); default: 100000")
+    parser.add_argument('--min_time', type=float, default=0.2,
+                        help="seconds of cycles measured for each queue "
+                        "size; default: 0.2")
+    parser.add_argument('--nomemory', default=False, action='store_true',
+                        help="don't measure allocations with tracemalloc")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--output', help="save the report as JSON here")
+    parser.add_argument('--baseline', help="compare with this JSON report, "
+                        "and exit with an error in case of regressions")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="with --baseline, tolerated relative latency "
+                        "increase; default: 0.5")
+    args = parser.parse_args()
+
+    names = args.schedulers or list(SCHEDULERS)
+    unknown = set(names) - set(SCHEDULERS)
+    if unknown:
+        parser.error("unknown schedulers: {}".format(', '.join(unknown)))
+    sizes = [10 ** k for k in range(1, 8) if 10 ** k <= args.max_size]
+    report = benchmark(names, sizes, not args.nomemory, args.min_time,
+                       args.seed)
+    print('\n'.join(summary(report)))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print('\nregressions:')
+            print('\n'.join(regressions))
+            sys.exit(1)
+        print('\nno regressions')
+
+
+if __name__ == '__main__':
+    main()
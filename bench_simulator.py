@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+"""End-to-end benchmark of simulator.Simulation.
+
+Fixed-seed Weibull workloads (for several shapes, loads and numbers of
+jobs) and SWIM workloads are simulated with each scheduler, reporting
+the events and jobs processed per second, the peak resident memory and
+the wall time. Each simulation runs in its own process, so that peak
+memory is that of a single run. Reports are saved as JSON, and a run can
+be compared to a baseline report to accept or reject changes to the
+simulator and the schedulers.
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+
+import memory_usage
+import schedulers
+import simulator
+import swim_parser
+import weibull_workload
+
+# (scheduler, whether it sees estimated sizes), named as in
+# experiment_weibull.py
+SCHEDULERS = collections.OrderedDict([
+    ('FIFO', (schedulers.FIFO, False)),
+    ('PS', (schedulers.PS, False)),
+    ('SRPT', (schedulers.SRPT, False)),
+    ('FSP', (schedulers.FSP, False)),
+    ('LAS', (schedulers.LAS, False)),
+    ('SRPTE', (schedulers.SRPT, True)),
+    ('SRPTE+PS', (schedulers.SRPT_plus_PS, True)),
+    ('SRPTE+LAS', (schedulers.SRPT_plus_LAS, True)),
+    ('FSPE', (schedulers.FSP, True)),
+    ('FSPE+PS', (schedulers.FSP_plus_PS, True)),
+    ('FSPE+LAS', (schedulers.FSP_plus_LAS, True)),
+    ('FSPE+DC', (schedulers.FSPE_PS_DC, True)),
+])
+
+SWIM_FILES = ['FB09-0.tsv', 'FB09-1.tsv', 'FB10.tsv']
+
+# d over n ratio for SWIM workloads, as in experiment.py
+D_OVER_N = 4
+
+
+def weibull_jobs(shape, load, njobs, seed):
+    t, size = weibull_workload.workload_arrays(shape, load, njobs, seed=seed)
+    return list(zip(range(njobs), t.tolist(), size.tolist()))
+
+
+def swim_jobs(fname, load):
+    jobid, t, size = swim_parser.schedule(swim_parser.load_columns(fname),
+                                          D_OVER_N, load)
+    return list(zip(jobid.tolist(), t.tolist(), size.tolist()))
+
+
+def workloads(shapes, loads, njobs, swim_files, seed):
+    """{name: (function, arguments)} generating each workload's jobs."""
+
+    res = collections.OrderedDict()
+    for n in njobs:
+        for shape in shapes:
+            for load in loads:
+                name = 'weibull_{}_{}_{}'.format(shape, load, n)
+                res[name] = weibull_jobs, (shape, load, n, seed)
+    for fname in swim_files:
+        for load in loads:
+            name = 'swim_{}_{}'.format(
+                os.path.splitext(os.path.basename(fname))[0], load)
+            res[name] = swim_jobs, (fname, load)
+    return res
+
+
+def peak_rss():
+    """Peak resident memory of this process, in bytes."""
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def run(generate, generate_args, scheduler_name, sigma=0.5, seed=0,
+        time_budget=None, memory_every=None):
+    """Simulate a workload with a scheduler; return the measurements.
+
+    Meant to run in a process of its own: peak_rss is the peak memory of
+    the process, and setup_rss the one after generating the workload. If
+    memory_every is given, the memory used by each data structure is
+    measured every memory_every events, and its peak is in structures.
+    """
+
+    jobs = generate(*generate_args)
+    factory, estimated = SCHEDULERS[scheduler_name]
+    error = simulator.lognorm_error(sigma) if estimated else simulator.identity
+    simulator.rand.seed(seed)
+    res = {'setup_rss': peak_rss()}
+
+    sampler = None
+    if memory_every is not None:
+        sampler = simulator.Sampler(every=memory_every, memory=True)
+    simulation = simulator.Simulation(jobs, factory, error, sampler=sampler)
+    completed = 0
+    start = time.perf_counter()
+    try:
+        for _ in simulation.run(time_budget=time_budget):
+            completed += 1
+    except simulator.BudgetExceeded:
+        res['truncated'] = True
+    elapsed = time.perf_counter() - start
+
+    res.update(peak_rss=peak_rss(), time=elapsed, events=simulation.n_events,
+               jobs=completed, events_per_s=simulation.n_events / elapsed,
+               jobs_per_s=completed / elapsed)
+    if sampler is not None and len(sampler):
+        res['structures'] = memory_usage.peaks(sampler.columns)
+    return res
+
+
+def benchmark(workload_specs, names, sigma=0.5, seed=0, time_budget=None,
+              memory_every=None, verbose=True):
+    """Run each scheduler on each workload in a new process; return the
+    report as a JSON-serializable dict."""
+
+    report = {'python': platform.python_version(),
+              'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+              'sigma': sigma, 'seed': seed, 'runs': collections.OrderedDict()}
+    start = time.perf_counter()
+    for workload, (generate, generate_args) in workload_specs.items():
+        for name in names:
+            key = '{}/{}'.format(workload, name)
+            if verbose:
+                print(key, end=' ', file=sys.stderr)
+                sys.stderr.flush()
+            with multiprocessing.Pool(1) as pool:
+                res = pool.apply(run, (generate, generate_args, name, sigma,
+                                       seed, time_budget, memory_every))
+            report['runs'][key] = res
+            if verbose:
+                print('{:.1f}s'.format(res['time']), file=sys.stderr)
+    report['total_time'] = time.perf_counter() - start
+    return report
+
+
+def summary(report):
+    """Human-readable summary of a report, as a list of lines."""
+
+    lines = ['{:40} {:>12} {:>10} {:>9} {:>9}'.format(
+        'workload/scheduler', 'events/s', 'jobs/s', 'peak MB', 'time (s)')]
+    for key, res in report['runs'].items():
+        lines.append('{:40} {:12.0f} {:10.0f} {:9.1f} {:9.2f}{}'.format(
+            key, res['events_per_s'], res['jobs_per_s'],
+            res['peak_rss'] / 2 ** 20, res['time'],
+            ' (truncated)' if res.get('truncated') else ''))
+        if 'structures' in res:
+            lines.append('    ' + memory_usage.format_peaks(
+                res['structures'], 4))
+    lines.append('total wall time: {:.1f}s'.format(report['total_time']))
+    return lines
+
+
+def compare(report, baseline, tolerance=0.2, memory_tolerance=0.2):
+    """Regressions of report with respect to baseline, as a list of lines.
+
+    A regression is a run of the baseline whose events per second drop by
+    more than a fraction tolerance, or whose peak memory grows by more
+    than a fraction memory_tolerance.
+    """
+
+    res = []
+    for key, run_res in report['runs'].items():
+        base = baseline['runs'].get(key)
+        if base is None:
+            continue
+        speed = run_res['events_per_s'] / base['events_per_s']
+        if speed < 1 - tolerance:
+            res.append('{}: {:.0f} events/s, {:.0f} in the baseline'.format(
+                key, run_res['events_per_s'], base['events_per_s']))
+        memory = run_res['peak_rss'] / base['peak_rss']
+        if memory > 1 + memory_tolerance:
+            res.append('{}: peak memory {:.1f}MB, {:.1f}MB in the '
+                       'baseline'.format(key, run_res['peak_rss'] / 2 ** 20,
+                                         base['peak_rss'] / 2 ** 20))
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description="end-to-end benchmark of "
+                                     "simulations")
+    parser.add_argument('schedulers', nargs='*', metavar='scheduler',
+                        help="schedulers to benchmark; default: all ({})"
+                        .format(', '.join(SCHEDULERS)))
+    parser.add_argument('--shapes', type=float, nargs='*',
+                        default=[0.25, 1, 4],
+                        help="shapes of Weibull job size distributions; "
+                        "default: 0.25 1 4")
+    parser.add_argument('--loads', type=float, nargs='+',
+                        default=[0.5, 0.9, 0.99],
+                        help="loads; default: 0.5 0.9 0.99")
+    parser.add_argument('--njobs', type=int, nargs='+', default=[10000],
+                        help="numbers of jobs of Weibull workloads (e.g., "
+                        "10000 100000 1000000); default: 10000")
+    parser.add_argument('--swim', nargs='*', default=SWIM_FILES,
+                        help="SWIM .tsv files (see get_datasets); missing "
+                        "ones are skipped; default: {}".format(
+                            ' '.join(SWIM_FILES)))
+    parser.add_argument('--sigma', type=float, default=0.5,
+                        help="sigma of the log-normal error of size "
+                        "estimations; default: 0.5")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--time_budget', type=float,
+                        help="stop each simulation after this many seconds")
+    parser.add_argument('--memory_every', type=int,
+                        help="measure the memory used by each data "
+                        "structure every this many events, and report "
+                        "their peaks (this slows down simulations)")
+    parser.add_argument('--output', help="save the report as JSON here")
+    parser.add_argument('--baseline', help="compare with this JSON report, "
+                        "and exit with an error in case of regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="with --baseline, tolerated relative decrease "
+                        "of events per second and increase of peak memory; "
+                        "default: 0.2")
+    args = parser.parse_args()
+
+    names = args.schedulers or list(SCHEDULERS)
+    unknown = set(names) - set(SCHEDULERS)
+    if unknown:
+        parser.error("unknown schedulers: {}".format(', '.join(unknown)))
+    swim_files = []
+    for fname in args.swim:
+        if os.path.exists(fname):
+            swim_files.append(fname)
+        else:
+            print("{} not found, skipping it".format(fname), file=sys.stderr)
+
+    specs = workloads(args.shapes, args.loads, args.njobs, swim_files,
+                      args.seed)
+    report = benchmark(specs, names, args.sigma, args.seed, args.time_budget,
+                       args.memory_every)
+    print('\n'.join(summary(report)))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance,
+                                  args.tolerance)
+        if regressions:
+            print('\nregressions:')
+            print('\n'.join(regressions))
+            sys.exit(1)
+        print('\nno regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+"""Compact binary format for job traces, readable via memory-mapping.
+
+Layout (little-endian, every section aligned to 8 bytes):
+
+ - header: the magic string b'SCHEDTR1', then n, flags and the length in
+   bytes of the jobid string table, as unsigned 64-bit integers;
+ - n int64 jobids, n float64 submission times and n float64 sizes;
+ - if flags & ESTIMATE, n float64 size estimations;
+ - if flags & NAMES, n + 1 int64 offsets followed by the UTF-8 string
+   table: the name of job i is table[offsets[i]:offsets[i + 1]], and the
+   jobid column contains indexes in it.
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import collections
+import struct
+
+import numpy
+
+MAGIC = b'SCHEDTR1'
+HEADER = struct.Struct('<8sQQQ')
+ESTIMATE, NAMES = 1, 2
+
+# estimate and names are None if absent
+Trace = collections.namedtuple('Trace', 'jobid t size estimate names')
+
+
+class StringTable(object):
+    """Sequence of job names, decoded only when accessed."""
+
+    def __init__(self, offsets, table):
+        self.offsets = offsets
+        self.table = table
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return bytes(self.table[start:end]).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _align(offset):
+    return (offset + 7) // 8 * 8
+
+
+def _layout(n, flags, names_len):
+    # returns {section: (offset, dtype, count)} and total file size
+    sections = collections.OrderedDict()
+    offset = HEADER.size
+    columns = [('jobid', '<i8', n), ('t', '<f8', n), ('size', '<f8', n)]
+    if flags & ESTIMATE:
+        columns.append(('estimate', '<f8', n))
+    if flags & NAMES:
+        columns += [('offsets', '<i8', n + 1), ('table', 'u1', names_len)]
+    for name, dtype, count in columns:
+        sections[name] = offset, dtype, count
+        offset = _align(offset + numpy.dtype(dtype).itemsize * count)
+    return sections, offset
+
+
+def _views(mm, sections):
+    res = {}
+    for name, (offset, dtype, count) in sections.items():
+        size = numpy.dtype(dtype).itemsize * count
+        res[name] = mm[offset:offset + size].view(dtype)
+    return res
+
+
+def _trace(views):
+    names = None
+    if 'offsets' in views:
+        names = StringTable(views['offsets'], views['table'])
+    return Trace(views['jobid'], views['t'], views['size'],
+                 views.get('estimate'), names)
+
+
+def is_trace(fname):
+    """Whether fname is a binary trace, judging from its magic string."""
+
+    with open(fname, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read(fname, mode='r'):
+    """Memory-map a trace; use mode='r+' to modify it in place."""
+
+    with open(fname, 'rb') as f:
+        header = f.read(HEADER.size)
+    magic, n, flags, names_len = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError("{} is not a binary trace".format(fname))
+    sections, _ = _layout(n, flags, names_len)
+    mm = numpy.memmap(fname, numpy.uint8, mode)
+    return _trace(_views(mm, sections))
+
+
+def create(fname, n, estimate=False, names_len=None):
+    """Create a trace of n jobs and return it memory-mapped for writing.
+
+    Columns are zero-filled and can be written in chunks, so that traces
+    larger than memory can be produced. If names_len is not None, the
+    trace has a string table of that many bytes.
+    """
+
+    flags = ((ESTIMATE if estimate else 0)
+             | (NAMES if names_len is not None else 0))
+    names_len = names_len or 0
+    sections, total = _layout(n, flags, names_len)
+    with open(fname, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, n, flags, names_len))
+        f.truncate(total)
+    mm = numpy.memmap(fname, numpy.uint8, 'r+')
+    return _trace(_views(mm, sections))
+
+
+def flush(trace):
+    """Write the changes to a memory-mapped trace to disk."""
+
+    # columns of empty traces are not memory-mapped, nothing to write
+    if isinstance(trace.jobid, numpy.memmap):
+        trace.jobid.flush()
+
+
+def write(fname, t, size, estimate=None, jobids=None):
+    """Write a trace; jobids can be integers, strings or None (0..n-1)."""
+
+    n = len(t)
+    names = None
+    if jobids is not None and len(jobids) and isinstance(jobids[0], str):
+        names = [jobid.encode('utf-8') for jobid in jobids]
+    names_len = None if names is None else sum(len(name) for name in names)
+    trace = create(fname, n, estimate is not None, names_len)
+    trace.t[:] = t
+    trace.size[:] = size
+    if estimate is not None:
+        trace.estimate[:] = estimate
+    if names is not None:
+        trace.jobid[:] = numpy.arange(n)
+        trace.names.offsets[0] = 0
+        numpy.cumsum([len(name) for name in names],
+                     out=trace.names.offsets[1:])
+        trace.names.table[:] = numpy.frombuffer(b''.join(names),
+                                                numpy.uint8)
+    elif jobids is not None:
+        trace.jobid[:] = jobids
+    else:
+        trace.jobid[:] = numpy.arange(n)
+    flush(trace)
+
+
+def jobs(trace):
+    """Iterate on (jobid, t, size) triples, as needed by the simulator."""
+
+    if trace.names is not None:
+        names = trace.names
+        jobids = (names[i] for i in trace.jobid.tolist())
+    else:
+        jobids = trace.jobid.tolist()
+    return zip(jobids, trace.t.tolist(), trace.size.tolist())
+
+
+def from_swim(fname, d_over_n=4, load=0.9):
+    """Convert a SWIM .tsv file, as parsed by swim_parser.parse_swim."""
+
+    import swim_parser
+    jobids, t, size = zip(*swim_parser.parse_swim(fname, d_over_n, load))
+    return t, size, None, jobids
+
+
+def from_text(fname, estimations=False, nojobid=False):
+    """Convert a whitespace-separated schedule of (jobid, t, size) lines,
+    optionally followed by estimations; jobids can be omitted."""
+
+    jobids, t, size, estimate = [], [], [], []
+    with open(fname) as f:
+        for line in f:
+            values = line.split()
+            if not values:
+                continue
+            if estimations:
+                estimate.append(float(values.pop()))
+            if not nojobid:
+                jobids.append(values.pop(0))
+            t.append(float(values[0]))
+            size.append(float(values[1]))
+    return t, size, estimate if estimations else None, jobids or None
+
+
+def from_table(fname):
+    """Convert a numeric (t, size[, estimation]) table as read by
+    numpy.loadtxt, e.g. the output of renorm_trace.py."""
+
+    table = numpy.loadtxt(fname, ndmin=2)
+    estimate = table[:, 2] if table.shape[1] > 2 else None
+    return table[:, 0], table[:, 1], estimate, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert traces to and "
+                                     "from the binary trace format")
+    parser.add_argument('format', choices=['swim', 'text', 'table', 'dump'],
+                        help="format of the input file; 'dump' prints a "
+                        "binary trace as text")
+    parser.add_argument('input', help="input file")
+    parser.add_argument('output', nargs='?', help="output binary trace "
+                        "(unused with 'dump')")
+    parser.add_argument('--d_over_n', type=float, default=4,
+                        help="d over n for SWIM files; default is 4")
+    parser.add_argument('--load', type=float, default=0.9,
+                        help="load for SWIM files; default is 0.9")
+    parser.add_argument('--estimations', default=False, action='store_true',
+                        help="text files have estimations as last column")
+    parser.add_argument('--nojobid', default=False, action='store_true',
+                        help="text files do not have jobids")
+    args = parser.parse_args()
+
+    if args.format == 'dump':
+        trace = read(args.input)
+        if trace.estimate is None:
+            for jobid, t, size in jobs(trace):
+                print("{}\t{}\t{}".format(jobid, t, size))
+        else:
+            for (jobid, t, size), e in zip(jobs(trace),
+                                           trace.estimate.tolist()):
+                print("{}\t{}\t{}\t{}".format(jobid, t, size, e))
+        return
+
+    if args.output is None:
+        parser.error("an output file is needed")
+    if args.format == 'swim':
+        columns = from_swim(args.input, args.d_over_n, args.load)
+    elif args.format == 'text':
+        columns = from_text(args.input, args.estimations, args.nojobid)
+    else:
+        columns = from_table(args.input)
+    write(args.output, *columns)
+
+if __name__ == '__main__':
+    main()
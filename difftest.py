@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+"""Differential testing of a candidate scheduler against a reference one.
+
+Thousands of small random workloads are simulated with both schedulers,
+and the completion time of each job is compared within a tolerance.
+Workloads stress corner cases: ties in arrival times and sizes,
+simultaneous arrivals, zero-size jobs and extreme estimation errors. The
+first workload on which the schedulers disagree is shrunk (by removing
+jobs and simplifying their parameters while they still disagree) and
+printed as a minimal reproducer.
+
+Schedulers are given as names in schedulers.py (e.g., FSP) or as
+module.Class for reimplementations living elsewhere, e.g.:
+
+$./difftest.py FSP fast_schedulers.FSP --cases 10000
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import importlib
+import math
+import random
+import sys
+
+import schedulers
+import simulator
+
+
+def load_scheduler(name):
+    """Scheduler class from a name in schedulers.py or a module.Class."""
+
+    module_name, _, class_name = name.rpartition('.')
+    module = importlib.import_module(module_name) if module_name else schedulers
+    return getattr(module, class_name)
+
+
+def random_case(rng, max_jobs=12):
+    """A random workload, as a list of (jobid, t, size, estimate) tuples
+    sorted by arrival time."""
+
+    n = rng.randint(1, max_jobs)
+    # few distinct values, so that ties are frequent
+    grid = [rng.choice([0, 0.5, 1, 2, 3, 10]) for _ in range(3)]
+    t = 0
+    res = []
+    for jobid in range(n):
+        if rng.random() < 0.6:
+            t += rng.choice(grid + [rng.expovariate(1)])
+        if rng.random() < 0.15:
+            size = 0
+        elif rng.random() < 0.4:
+            size = rng.choice(grid) or 1
+        else:
+            size = rng.lognormvariate(0, 2)
+        r = rng.random()
+        if r < 0.4:
+            estimate = size
+        elif r < 0.55:
+            estimate = size * 10 ** rng.choice([-6, -3, 3, 6])  # extreme
+        elif r < 0.65:
+            estimate = 0
+        else:
+            estimate = size * rng.lognormvariate(0, 1)
+        res.append((jobid, t, size, estimate))
+    return res
+
+
+def run(factory, case):
+    """Completion times of a case, as a {jobid: t} dict, or a string
+    describing why the simulation failed."""
+
+    jobs = [(jobid, t, size) for jobid, t, size, _ in case]
+    # estimations are drawn in order of arrival, i.e. of (t, jobid)
+    estimates = [estimate for _, _, _, estimate in
+                 sorted(case, key=lambda job: (job[1], job[0]))]
+    # buggy candidates might not terminate
+    max_events = 10 * (len(case) + 1) ** 2 + 1000
+    try:
+        completions = list(simulator.simulator(
+            jobs, factory, simulator.fixed_estimations(estimates),
+            max_events=max_events))
+    except simulator.BudgetExceeded:
+        return 'more than {} events'.format(max_events)
+    except Exception as e:
+        return '{}: {}'.format(type(e).__name__, e)
+    res = {}
+    for t, jobid in completions:
+        if jobid in res:
+            return 'job {} completed twice'.format(jobid)
+        res[jobid] = t
+    return res
+
+
+def differences(expected, actual, rel_tol=1e-9, abs_tol=1e-9):
+    """Differences between two results of run(), as a list of strings."""
+
+    if isinstance(expected, str) or isinstance(actual, str):
+        if isinstance(expected, str) and isinstance(actual, str):
+            return []  # both fail
+        return ['reference: {}; candidate: {}'.format(
+            expected if isinstance(expected, str) else 'ok',
+            actual if isinstance(actual, str) else 'ok')]
+    res = []
+    for jobid in sorted(set(expected) | set(actual)):
+        if jobid not in actual:
+            res.append('job {} not completed by candidate'.format(jobid))
+        elif jobid not in expected:
+            res.append('job {} not completed by reference'.format(jobid))
+        else:
+            t1, t2 = expected[jobid], actual[jobid]
+            if abs(t1 - t2) > max(abs_tol, rel_tol * max(abs(t1), abs(t2))):
+                res.append('job {} completes at {!r} instead of {!r}'.format(
+                    jobid, t2, t1))
+    return res
+
+
+def _simplifications(case):
+    # candidate cases that are simpler than case, simplest first; no
+    # simplification increases times or sizes, and a variant only making an
+    # estimate exact keeps them, so shrinking terminates
+    for i in range(len(case)):
+        yield case[:i] + case[i + 1:]
+    if case and case[0][1] != 0:
+        start = case[0][1]
+        yield [(jobid, t - start, size, estimate)
+               for jobid, t, size, estimate in case]
+    for i, (jobid, t, size, estimate) in enumerate(case):
+        variants = [(jobid, t, size, size),
+                    (jobid, t, math.floor(size), estimate),
+                    (jobid, math.floor(t), size, estimate)]
+        if i > 0:
+            variants.append((jobid, case[i - 1][1], size, estimate))
+        for variant in variants:
+            if variant != case[i]:
+                yield sorted(case[:i] + [variant] + case[i + 1:],
+                             key=lambda job: (job[1], job[0]))
+
+
+def shrink(case, fails):
+    """Greedily simplify a case while fails(case) is true."""
+
+    progress = True
+    while progress:
+        progress = False
+        for simpler in _simplifications(case):
+            if simpler and fails(simpler):
+                case, progress = simpler, True
+                break
+    return case
+
+
+def check(reference, candidate, cases=1000, seed=0, max_jobs=12,
+          rel_tol=1e-9, abs_tol=1e-9):
+    """Compare the schedulers on random cases; return None if they agree,
+    or the shrunk (case, differences) of the first disagreement."""
+
+    def fails(case):
+        return differences(run(reference, case), run(candidate, case),
+                           rel_tol, abs_tol)
+
+    rng = random.Random(seed)
+    for _ in range(cases):
+        case = random_case(rng, max_jobs)
+        if fails(case):
+            case = shrink(case, fails)
+            return case, fails(case)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare the completions "
+                                     "of a candidate scheduler with a "
+                                     "reference one on random workloads")
+    parser.add_argument('reference', help="reference scheduler, e.g. FSP")
+    parser.add_argument('candidate', help="candidate scheduler, e.g. "
+                        "module.Class")
+    parser.add_argument('--cases', type=int, default=1000,
+                        help="number of random workloads; default: 1000")
+    parser.add_argument('--max_jobs', type=int, default=12,
+                        help="maximum number of jobs per workload; "
+                        "default: 12")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--rel_tol', type=float, default=1e-9,
+                        help="relative tolerance on completion times; "
+                        "default: 1e-9")
+    parser.add_argument('--abs_tol', type=float, default=1e-9,
+                        help="absolute tolerance on completion times; "
+                        "default: 1e-9")
+    args = parser.parse_args()
+
+    try:
+        reference = load_scheduler(args.reference)
+        candidate = load_scheduler(args.candidate)
+    except (ImportError, AttributeError) as e:
+        parser.error(str(e))
+
+    failure = check(reference, candidate, args.cases, args.seed,
+                    args.max_jobs, args.rel_tol, args.abs_tol)
+    if failure is None:
+        print("{} and {} agree on {} workloads".format(
+            args.reference, args.candidate, args.cases))
+        return
+    case, diffs = failure
+    print("minimal workload, as (jobid, t, size, estimate) tuples:")
+    print('[' + ',\n '.join(repr(job) for job in case) + ']')
+    print('\n'.join(diffs))
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
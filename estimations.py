@@ -0,0 +1,204 @@
+"""Vectorized models of size estimation errors.
+
+Unlike the error functions in simulator.py, which draw an estimation each
+time a job arrives, these models generate the estimations of a whole
+workload at once: a model is a function taking an array of job sizes, a
+numpy.random.Generator and its parameters, and returning an array of
+estimations. Models are registered by name in MODELS, so that experiment
+drivers can select them with --error_model and --error_params.
+"""
+
+from __future__ import division
+
+import os.path
+import random
+
+import numpy
+
+import simulator
+
+
+def lognorm(sizes, rng, sigma=0.5, factor=1):
+    """Multiplicative log-normal error, as simulator.lognorm_error."""
+
+    return factor * sizes * numpy.exp(sigma * rng.standard_normal(len(sizes)))
+
+
+def lognorm_size(sizes, rng, sigma=0.5, alpha=0, bias=0):
+    """Log-normal error with size-dependent bias and spread: the logarithm
+    of estimation / size has mean bias * log(size) and standard deviation
+    sigma * size ** alpha. Jobs of size 0 are estimated exactly."""
+
+    sizes = numpy.asarray(sizes, float)
+    positive = sizes > 0
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        mu = numpy.where(positive, bias * numpy.log(sizes), 0)
+        sigmas = numpy.where(positive, sigma * sizes ** alpha, 0)
+    return sizes * numpy.exp(mu + sigmas * rng.standard_normal(len(sizes)))
+
+
+def normal(sizes, rng, sigma=0.5, factor=1):
+    """Multiplicative normal error, resampled while negative as
+    simulator.normal_error."""
+
+    errors = rng.normal(1, sigma, len(sizes))
+    negative = numpy.flatnonzero(errors < 0)
+    while len(negative):
+        errors[negative] = rng.normal(1, sigma, len(negative))
+        negative = negative[errors[negative] < 0]
+    return factor * sizes * errors
+
+
+def additive(sizes, rng, sigma=1, floor=0):
+    """Additive normal noise of standard deviation sigma; estimations below
+    floor are set to floor."""
+
+    estimations = sizes + sigma * rng.standard_normal(len(sizes))
+    return numpy.maximum(estimations, floor)
+
+
+def quantized(sizes, rng, step=2, sigma=0):
+    """Estimations rounded to the nearest power of step (in logarithmic
+    scale), after a log-normal error of parameter sigma."""
+
+    noisy = numpy.log(sizes) + sigma * rng.standard_normal(len(sizes))
+    log_step = numpy.log(step)
+    return numpy.exp(numpy.round(noisy / log_step) * log_step)
+
+
+def outliers(sizes, rng, p=0.05, sigma_out=3, sigma=0.5):
+    """Mixture of log-normal errors: with probability p, the error has
+    parameter sigma_out rather than sigma."""
+
+    sigmas = numpy.where(rng.random(len(sizes)) < p, sigma_out, sigma)
+    return sizes * numpy.exp(sigmas * rng.standard_normal(len(sizes)))
+
+
+def empirical(sizes, rng, fname, bins=10):
+    """Errors resampled from a trace with estimations (a binary trace or a
+    text schedule with job ids and estimations as last column).
+
+    Jobs of the trace and of the workload are divided in bins of equal
+    size ranked by job size, and the estimation / size ratio of each job is
+    drawn among the ones of the trace jobs in the same bin: this keeps the
+    dependency between size and error.
+    """
+
+    import synth_trace  # only needed for this model
+    _, trace_sizes, trace_estimations = synth_trace.load(fname,
+                                                         estimations=True)
+    if trace_estimations is None:
+        raise ValueError("{} has no estimations".format(fname))
+    trace_sizes = numpy.asarray(trace_sizes)
+    trace_estimations = numpy.asarray(trace_estimations)
+    valid = (trace_sizes > 0) & (trace_estimations > 0)
+    trace_sizes = trace_sizes[valid]
+    trace_estimations = trace_estimations[valid]
+    bins = int(min(bins, len(trace_sizes)))
+
+    def rank_bins(values):
+        n = len(values)
+        ranks = numpy.empty(n, int)
+        ranks[numpy.argsort(values, kind='stable')] = numpy.arange(n)
+        return ranks * bins // n
+
+    # ratios sorted by bin: bin b is ratios[starts[b]:starts[b] + counts[b]]
+    trace_bins = rank_bins(trace_sizes)
+    order = numpy.argsort(trace_bins, kind='stable')
+    ratios = (trace_estimations / trace_sizes)[order]
+    counts = numpy.bincount(trace_bins, minlength=bins)
+    starts = numpy.cumsum(counts) - counts
+
+    b = rank_bins(sizes)
+    idx = starts[b] + (rng.random(len(sizes)) * counts[b]).astype(int)
+    return sizes * ratios[idx]
+
+
+MODELS = {
+    'lognorm': lognorm,
+    'lognorm-size': lognorm_size,
+    'normal': normal,
+    'additive': additive,
+    'quantized': quantized,
+    'outliers': outliers,
+    'empirical': empirical,
+}
+
+
+class EstimationFactory(object):
+    """Base class of objects that, when called, return a new size
+    estimation function for each simulation run."""
+
+    def __call__(self):
+        raise NotImplementedError
+
+
+class ErrorModel(EstimationFactory):
+    """A model bound to the sizes of a workload.
+
+    Calling it returns a size estimation function for a simulation run,
+    backed by estimations freshly drawn from the model.
+    """
+
+    def __init__(self, model, params, jobs, seed=None):
+        if model not in MODELS:
+            raise ValueError("unknown error model {!r}; choose among "
+                             "{}".format(model, ', '.join(sorted(MODELS))))
+        self.model = MODELS[model]
+        self.params = params
+        # the simulator estimates sizes in order of arrival, breaking ties
+        # by jobid
+        arrival_order = sorted(jobs, key=lambda job: (job[1], job[0]))
+        self.sizes = numpy.array([size for _, _, size in arrival_order])
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.rng = numpy.random.default_rng(seed)
+
+    def __call__(self):
+        estimations = self.model(self.sizes, self.rng, *self.params)
+        return simulator.fixed_estimations(estimations.tolist())
+
+
+class FixedEstimations(EstimationFactory):
+    """Preset estimations, in order of arrival: each estimation function
+    starts from the first one, so that each run gets all of them."""
+
+    def __init__(self, estimations):
+        self.estimations = list(estimations)
+
+    def __call__(self):
+        return simulator.fixed_estimations(self.estimations)
+
+
+def _parse_param(param):
+    try:
+        return float(param)
+    except ValueError:
+        return param
+
+
+def add_arguments(parser):
+    parser.add_argument('--error_model', choices=sorted(MODELS),
+                        help="draw estimations from a model in "
+                        "estimations.py instead of the default error "
+                        "function; --sigma and --est_factor are then ignored")
+    parser.add_argument('--error_params', nargs='*', default=[],
+                        help="positional parameters of the error model")
+
+
+def from_args(args, jobs):
+    """Return an ErrorModel for the --error_model options, or None."""
+
+    if args.error_model is None:
+        return None
+    params = [_parse_param(p) for p in args.error_params]
+    return ErrorModel(args.error_model, params, jobs)
+
+
+def tag(args):
+    """Short description of the error model, to be used in file names."""
+
+    # underscores separate fields in result file names
+    params = [os.path.basename(p).replace('_', '-')
+              for p in args.error_params]
+    return ','.join(params) or '-'
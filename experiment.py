@@ -2,12 +2,13 @@
 
 from __future__ import print_function
 
-import shelve
-import sys
+import os
 
-from numpy import zeros
-
-from swim_parser import parse_swim
+import binary_trace
+import estimations
+import experiment_helpers
+import swim_parser
+import workload_cache
 import simulator
 import schedulers
 
@@ -16,7 +17,9 @@ import argparse
 parser = argparse.ArgumentParser(description="run the experiment; "
                                  "details on parameters in our TR "
                                  "at http://arxiv.org/abs/1306.6023")
-parser.add_argument('file', help="file with the trace to use")
+parser.add_argument('file', help="file with the trace to use; files "
+                    "ending in .trace are read as binary traces (see "
+                    "binary_trace.py)")
 parser.add_argument('iterations', type=int,
                     help="Iterations for each run of the experiment. "
                     "If that number of iterations is already in the "
@@ -40,27 +43,54 @@ parser.add_argument('--load', type=float, default=0.9,
                     "Ignored unless --parse-swim is set")
 parser.add_argument('--nojobid', default=False, action='store_true',
                     help="input files do not have jobids")
+estimations.add_arguments(parser)
+experiment_helpers.add_arguments(parser)
 args = parser.parse_args()
 
 if args.parse_swim:
-    jobs = parse_swim(args.file, args.d_over_n, args.load)
+    def generate_workload():
+        jobid, t, size = swim_parser.schedule(
+            swim_parser.load_columns(args.file), args.d_over_n, args.load)
+        return {'jobid': jobid, 't': t, 'size': size}
+
+    stat = os.stat(args.file)
+    workload = workload_cache.cached(
+        args.workload_cache, 'swim_parser.parse_swim',
+        {'file': os.path.abspath(args.file), 'mtime': stat.st_mtime,
+         'filesize': stat.st_size, 'd_over_n': args.d_over_n,
+         'load': args.load},
+        None, generate_workload, [swim_parser.__file__])
+    jobs = list(zip(workload['jobid'].tolist(), workload['t'].tolist(),
+                    workload['size'].tolist()))
+elif args.file.endswith('.trace'):
+    trace = binary_trace.read(args.file)
+    jobs = list(binary_trace.jobs(trace))
+    if args.read_estimations:
+        if trace.estimate is None:
+            parser.error("{} has no estimations".format(args.file))
+        args.sigma = None
+        preset_estimations = trace.estimate.tolist()
 else:
     with open(args.file) as f:
         jobs = (line.strip().split() for line in f)
         if args.read_estimations:
             args.sigma = None
             old_jobs = jobs
-            jobs, estimations = [], []
+            jobs, preset_estimations = [], []
             for job in old_jobs:
                 jobs.append(job[:-1])
-                estimations.append(float(job[-1]))
+                preset_estimations.append(float(job[-1]))
         if args.nojobid:
             jobs = ((i, t, size) for i, (t, size) in enumerate(jobs))
         jobs = [(jobid, float(t), float(size)) for jobid, t, size in jobs]
 
-error = (lambda: simulator.fixed_estimations(estimations)
-         if args.read_estimations
-         else lambda: simulator.lognorm_error(args.sigma))
+if args.read_estimations:
+    error = lambda: estimations.FixedEstimations(preset_estimations)
+else:
+    error = lambda: simulator.lognorm_error(args.sigma)
+error_model = estimations.from_args(args, jobs)
+if error_model is not None:
+    error = lambda: error_model
 
 instances = [
     ('FIFO', schedulers.FIFO, simulator.identity, None),
@@ -82,43 +112,50 @@ n_jobs = len(jobids)
 
 job_start = {jobid: start for jobid, start, size in jobs}
 
+sigma = args.sigma
+if error_model is not None:
+    # the sigma field describes the error model instead
+    sigma = '{}-{}'.format(args.error_model, estimations.tag(args))
+
 if args.parse_swim:
     fname_short = (args.file[:-4] if args.file.endswith('.tsv')
                    else args.file)
     result_fname = 'results_{}_{}_{}_{}.s'
-    result_fname = result_fname.format(fname_short, args.sigma, args.d_over_n,
+    result_fname = result_fname.format(fname_short, sigma, args.d_over_n,
                                        args.load)
 else:
-    fname_short = (args.file[:-4] if args.file.endswith('.txt')
-                   else args.file)
-    result_fname = 'results_{}_{}.s'.format(fname_short, args.sigma)
-final_results = shelve.open(result_fname)
+    fname_short = os.path.splitext(args.file)[0] if args.file.endswith(
+        ('.txt', '.trace')) else args.file
+    result_fname = 'results_{}_{}.s'.format(fname_short, sigma)
+final_results = experiment_helpers.open_results(result_fname)
 
-for name, scheduler, errfunc, args.iterations in instances:
+for name, scheduler, errfunc, iterations in instances:
 
     print("scheduler:", name)
 
-    if args.iterations is None:
+    if iterations is None and final_results.get(name):
         # if no. of iterations is None, it means that a single pass is
         # enough (no randomness there)
-        if name in final_results:
-            continue
-        else:
-            args.iterations = 1
+        continue
 
-    scheduler_results = final_results.get(name, [])
+    def run_once():
+        checkpoint = experiment_helpers.checkpoint_fname(args, result_fname, name)
+        samples = experiment_helpers.samples_fname(args, result_fname, name)
+        completions, _ = experiment_helpers.simulate(
+            jobs, scheduler, errfunc, args, checkpoint=checkpoint,
+            samples=samples)
+        return experiment_helpers.sojourns(completions, job_idxs, job_start)
 
-    for i in range(args.iterations - len(scheduler_results)):
-        results = list(simulator.simulator(jobs, scheduler, errfunc))
-        sojourns = zeros(n_jobs)
-        for compl, jobid in results:
-            sojourns[job_idxs[jobid]] = compl - job_start[jobid]
-        scheduler_results.append(sojourns)
-        print(sojourns.mean(), end=' ')
-        sys.stdout.flush()
+    scheduler_results = final_results.get(name, [])
+    metadata = experiment_helpers.replicate(run_once, scheduler_results,
+                                            iterations, args)
     print()
 
-    final_results[name] = scheduler_results
+    with experiment_helpers.updating(final_results, name):
+        final_results[name] = scheduler_results
+        experiment_helpers.update_metadata(final_results, name, metadata)
+        experiment_helpers.update_tails(final_results, name, scheduler_results,
+                                        [size for _, _, size in jobs])
     print()
 
-final_results.close()
+experiment_helpers.close_results(final_results)
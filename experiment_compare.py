@@ -56,11 +56,9 @@ instances = [
     ('WFQEGPS', schedulers.WFQE_GPS),
 ]
 
-results = {}
-for name, scheduler in instances:
-    sim = simulator.simulator(jobs, scheduler,
-                              simulator.fixed_estimations(estimations))
-    results[name] = {jobid: t for t, jobid in sim}
+completions = simulator.completion_matrix(
+    jobs, [scheduler for _, scheduler in instances],
+    simulator.fixed_estimations(estimations))
 
 
 head_fmt = '\t'.join(['{}'] * (len(instances) + 4))
@@ -70,6 +68,5 @@ scheduler_names = [n for n, _ in instances]
 header = head_fmt.format('Job', 'Arr.', 'Size', 'Est.', *scheduler_names)
 print(header)
 print('=' * len(header.expandtabs()))
-for (jobid, arrival, d), e in zip(jobs, estimations):
-    print(fmt.format(jobid, arrival, d, e,
-                     *(results[n][jobid] for n in scheduler_names)))
+for (jobid, arrival, d), e, row in zip(jobs, estimations, completions):
+    print(fmt.format(jobid, arrival, d, e, *row))
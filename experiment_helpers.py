@@ -0,0 +1,307 @@
+"""Functionality shared by the experiment_*.py drivers."""
+
+from __future__ import division, print_function
+
+import contextlib
+import itertools
+import os
+import shelve
+import sys
+import time
+
+import numpy
+import scipy.stats
+
+import analysis
+import estimations
+import memory_usage
+import result_loader
+import simulator
+
+# key of the result file under which we keep per-scheduler metadata
+METADATA = 'metadata'
+# key of the result file listing schedulers whose results are being written
+PENDING = result_loader.PENDING
+
+
+def open_results(fname):
+    """Open a result file to add results to it (see updating())."""
+
+    final_results = shelve.open(fname)
+    # left by a driver killed while writing: the results it was writing
+    # are rewritten by this run, and the others are complete
+    final_results.pop(PENDING, None)
+    return final_results
+
+
+def close_results(final_results):
+    final_results.close()
+
+
+@contextlib.contextmanager
+def updating(final_results, name):
+    """Mark the results of scheduler name as being written while the block
+    runs: plot scripts leave them out (see result_loader.py), while the
+    results of other schedulers remain visible."""
+
+    final_results[PENDING] = final_results.get(PENDING, ()) + (name,)
+    yield
+    final_results[PENDING] = tuple(pending for pending in
+                                   final_results[PENDING] if pending != name)
+
+
+def add_arguments(parser):
+    parser.add_argument('--target_precision', type=float,
+                        help="run iterations of the schedulers using "
+                        "estimations until the relative half-width of the "
+                        "confidence interval for the mean sojourn time "
+                        "goes below this value (e.g., 0.01); --iterations "
+                        "becomes the minimum number of iterations")
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help="confidence level used with --target_precision; "
+                        "default is 0.95")
+    parser.add_argument('--max_iterations', type=int, default=1000,
+                        help="maximum number of iterations with "
+                        "--target_precision; default is 1000")
+    parser.add_argument('--time_budget', type=float,
+                        help="with --target_precision, do not start new "
+                        "iterations for a scheduler after this many seconds")
+    parser.add_argument('--run_time_budget', type=float,
+                        help="stop a simulation run after this many "
+                        "seconds; the jobs completed so far are stored as "
+                        "a truncated result")
+    parser.add_argument('--run_event_budget', type=int,
+                        help="stop a simulation run after processing this "
+                        "many events; the jobs completed so far are stored "
+                        "as a truncated result")
+    parser.add_argument('--checkpoint_dir',
+                        help="periodically save the state of running "
+                        "simulations in this directory; interrupted or "
+                        "truncated runs are resumed from there")
+    parser.add_argument('--checkpoint_interval', type=float, default=600,
+                        help="seconds between checkpoints; default is 600")
+    parser.add_argument('--sample_interval', type=float,
+                        help="sample the state of simulations (jobs in the "
+                        "system, remaining work, late jobs...) every this "
+                        "much simulated time; samples are saved in "
+                        "--samples_dir")
+    parser.add_argument('--sample_every', type=int,
+                        help="sample the state of simulations every this "
+                        "many events")
+    parser.add_argument('--sample_memory', default=False,
+                        action='store_true',
+                        help="with --sample_interval or --sample_every, "
+                        "also sample the bytes used by each data structure "
+                        "of simulations (slow with many jobs; see "
+                        "memory_usage.py) and print their peaks")
+    parser.add_argument('--samples_dir', default='samples',
+                        help="directory for the samples of "
+                        "--sample_interval and --sample_every, one .npz "
+                        "file per run; default is 'samples'")
+    parser.add_argument('--workload_cache',
+                        default=os.environ.get('SCHEDSIM_WORKLOAD_CACHE'),
+                        help="directory where generated workloads are "
+                        "cached and shared between runs; default is the "
+                        "SCHEDSIM_WORKLOAD_CACHE environment variable "
+                        "(no caching if unset)")
+
+
+def relative_halfwidth(means, confidence=0.95):
+    """Relative half-width of the Student-t confidence interval of means."""
+
+    n = len(means)
+    if n < 2:
+        return float('inf')
+    means = numpy.asarray(means)
+    mean = means.mean()
+    if mean == 0:
+        return 0.0
+    sem = means.std(ddof=1) / n ** 0.5
+    t = scipy.stats.t.ppf((1 + confidence) / 2, n - 1)
+    return t * sem / abs(mean)
+
+
+def checkpoint_fname(args, result_fname, name):
+    """Checkpoint file for the runs of scheduler name in result_fname."""
+
+    if args.checkpoint_dir is None:
+        return None
+    if not os.path.isdir(args.checkpoint_dir):
+        os.makedirs(args.checkpoint_dir)
+    basename = os.path.basename(result_fname)
+    return os.path.join(args.checkpoint_dir, '{}_{}.ckpt'.format(
+        basename, name.replace(' ', '')))
+
+
+def samples_fname(args, result_fname, name):
+    """File for the samples of the next run of scheduler name in
+    result_fname, or None if sampling is not enabled in args."""
+
+    if args.sample_interval is None and args.sample_every is None:
+        return None
+    if not os.path.isdir(args.samples_dir):
+        os.makedirs(args.samples_dir)
+    basename = os.path.basename(result_fname)
+    for run in itertools.count():
+        fname = os.path.join(args.samples_dir, '{}_{}_{}.npz'.format(
+            basename, name.replace(' ', ''), run))
+        if not os.path.exists(fname):
+            return fname
+
+
+def simulate(jobs, scheduler, errfunc, args, priorities=None,
+             checkpoint=None, samples=None):
+    """Run the simulator within the run budgets in args.
+
+    If checkpoint is a file name, the simulation is resumed from it if it
+    exists, and saved there periodically and when a budget is exhausted;
+    the file is removed once the run is complete. Budgets apply to each
+    invocation, so a resumed run gets new ones.
+
+    If samples is a file name, the state of the simulation is sampled as
+    requested in args (see simulator.Sampler) and the columns of samples
+    are saved there with numpy.savez.
+
+    Returns the list of (completion time, jobid) pairs and a flag that is
+    True if the run has been truncated because a budget was exhausted.
+    """
+
+    if checkpoint is not None and os.path.exists(checkpoint):
+        simulation = simulator.Simulation.restore(checkpoint)
+    else:
+        if isinstance(errfunc, estimations.EstimationFactory):
+            errfunc = errfunc()  # new estimations for each run
+        sampler = None
+        if samples is not None:
+            sampler = simulator.Sampler(args.sample_interval,
+                                        args.sample_every, args.sample_memory)
+        simulation = simulator.Simulation(jobs, scheduler, errfunc,
+                                          priorities,
+                                          record_completions=True,
+                                          sampler=sampler)
+    try:
+        for _ in simulation.run(args.run_event_budget, args.run_time_budget,
+                                checkpoint, args.checkpoint_interval):
+            pass
+    except simulator.BudgetExceeded:
+        if checkpoint is None:
+            # otherwise, samples are kept in the checkpoint
+            save_samples(simulation.sampler, samples)
+        return simulation.completions, True
+    save_samples(simulation.sampler, samples)
+    if checkpoint is not None and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return simulation.completions, False
+
+
+def save_samples(sampler, fname):
+    """Save the columns of sampler in fname; if they include memory usage,
+    print the peaks of the largest structures."""
+
+    if sampler is None or fname is None or not len(sampler):
+        return
+    numpy.savez(fname, **{name: numpy.frombuffer(column)
+                          for name, column in sampler.columns.items()})
+    if sampler.memory:
+        peaks = memory_usage.peaks(sampler.columns)
+        print(' peak memory:', memory_usage.format_peaks(peaks, 3), end='')
+
+
+def sojourns(completions, job_idxs, job_start):
+    """Array of sojourn times; NaN for jobs that did not complete."""
+
+    res = numpy.empty(len(job_idxs))
+    res.fill(numpy.nan)
+    for compl, jobid in completions:
+        res[job_idxs[jobid]] = compl - job_start[jobid]
+    return res
+
+
+def replicate(run_once, scheduler_results, iterations, args):
+    """Append to scheduler_results the sojourn arrays returned by run_once().
+
+    If iterations is None the experiment is deterministic and run once.
+    Otherwise we run until there are `iterations` results or, if
+    args.target_precision is set, until the confidence interval is tight
+    enough or a budget is exhausted. A truncated run (i.e., one with NaN
+    sojourn times) is not appended: it stops the replication and is kept
+    in the 'partial' list of the returned metadata dictionary.
+    """
+
+    adaptive = iterations is not None and args.target_precision is not None
+    if iterations is None:
+        iterations = 1
+    if adaptive:
+        iterations = max(iterations, 2)
+
+    means = [sojourns.mean() for sojourns in scheduler_results]
+    partial = []
+    start = time.time()
+
+    while True:
+        if len(scheduler_results) >= iterations:
+            if not adaptive:
+                stop_reason = 'iterations'
+                break
+            precision = relative_halfwidth(means, args.confidence)
+            if precision <= args.target_precision:
+                stop_reason = 'precision'
+                break
+            if len(scheduler_results) >= args.max_iterations:
+                stop_reason = 'max_iterations'
+                break
+            if (args.time_budget is not None
+                    and time.time() - start >= args.time_budget):
+                stop_reason = 'time_budget'
+                break
+        sojourns = run_once()
+        if numpy.isnan(sojourns).any():
+            partial.append(sojourns)
+            print(' truncated', end='')
+            stop_reason = 'truncated'
+            break
+        scheduler_results.append(sojourns)
+        means.append(sojourns.mean())
+        print('', means[-1], end='')
+        sys.stdout.flush()
+
+    metadata = {'stop_reason': stop_reason,
+                'iterations': len(scheduler_results),
+                'truncated': bool(partial)}
+    if partial:
+        metadata['partial'] = partial
+    if adaptive:
+        metadata['precision'] = float(relative_halfwidth(means,
+                                                         args.confidence))
+        metadata['confidence'] = args.confidence
+    return metadata
+
+
+def update_tails(final_results, name, scheduler_results, sizes=None,
+                 priorities=None):
+    """Store the analysis.run_sketches() of the runs of scheduler name that
+    don't have them yet, and print the tails over all its runs."""
+
+    tails = final_results.get(analysis.TAILS, {})
+    sketches = tails.get(name, [])
+    sketches += [analysis.run_sketches(sojourns, sizes, priorities)
+                 for sojourns in scheduler_results[len(sketches):]]
+    tails[name] = sketches
+    final_results[analysis.TAILS] = tails
+
+    if not sketches:
+        return
+    for metric in 'sojourn', 'slowdown':
+        if metric in sketches[0]:
+            merged = analysis.merge([s[metric] for s in sketches])
+            quantiles = merged.quantile(analysis.TAIL_PROBABILITIES)
+            print(' {} {}'.format(metric, ' '.join(
+                'p{:g}={:.6g}'.format(100 * p, q) for p, q in
+                zip(analysis.TAIL_PROBABILITIES, quantiles))), end='')
+    print()
+
+
+def update_metadata(final_results, name, values):
+    metadata = final_results.get(METADATA, {})
+    metadata.setdefault(name, {}).update(values)
+    final_results[METADATA] = metadata
@@ -3,18 +3,18 @@
 from __future__ import print_function
 
 import argparse
-import itertools
 import os.path
 import random
-import shelve
-import sys
 
 import numpy
 import scipy.stats
 
+import estimations
+import experiment_helpers
 import norta
 import simulator
 import schedulers
+import workload_cache
 
 parser = argparse.ArgumentParser(description="Run our experiment replicating "
                                  "settings by Lu et al., MASCOTS 2004; "
@@ -46,6 +46,11 @@ parser.add_argument('--iterations', type=int, default=1,
 parser.add_argument('--est_factor', type=float, default=1,
                     help="multiply estimated size by this value")
 parser.add_argument('--seed', type=int, help="random seed")
+parser.add_argument('--norta_cache',
+                    help="file storing calibrated correlations for the "
+                    "NORTA generation of sizes and estimations; default is "
+                    "DIRNAME/norta_cache.db")
+experiment_helpers.add_arguments(parser)
 args = parser.parse_args()
 
 if args.seed is None:
@@ -55,17 +60,37 @@ else:
 
 random.seed(seed)
 
-sizes, estimations = norta.generate(args.corr, args.njobs,
-                                    scipy.stats.pareto(args.shape, args.loc))
-times = numpy.cumsum(scipy.stats.weibull_min(args.timeshape).rvs(args.njobs))
-times *= sizes.sum() * args.load / times[-1]
+# all runs in a file must be on the same workload: files written before
+# we stored this were generated with numpy's global, unseeded, state
+generator = 'experiment_lu.generate_workload'
+LEGACY_GENERATOR = 'norta.generate (unseeded)'
+
+norta_cache = (args.norta_cache if args.norta_cache is not None
+               else os.path.join(args.dirname, 'norta_cache.db'))
+
+def generate_workload():
+    rng = numpy.random.default_rng(seed)
+    sizes, size_estimations = norta.generate(
+        args.corr, args.njobs, scipy.stats.pareto(args.shape, args.loc),
+        cache=norta_cache, rng=rng)
+    times = numpy.cumsum(scipy.stats.weibull_min(args.timeshape).rvs(
+        args.njobs, random_state=rng))
+    times *= sizes.sum() * args.load / times[-1]
+    return {'t': times, 'size': sizes, 'estimate': size_estimations}
+
+workload = workload_cache.cached(
+    args.workload_cache, 'experiment_lu',
+    {'shape': args.shape, 'loc': args.loc, 'corr': args.corr,
+     'load': args.load, 'timeshape': args.timeshape, 'njobs': args.njobs},
+    seed, generate_workload, [norta.__file__, __file__])
+sizes = workload['size']
+
+jobs = list(zip(range(args.njobs), workload['t'].tolist(), sizes.tolist()))
+
+# each run starts from the first estimation
+error = estimations.FixedEstimations(
+    (args.est_factor * workload['estimate']).tolist())
 
-jobs = [(i, t, s) for i, (t, s) in enumerate(zip(times, sizes))]
-
-est_iter = itertools.cycle(estimations)
-def error(_):
-    return args.est_factor * next(est_iter)
-                    
 instances = [
     ('FIFO', schedulers.FIFO, simulator.identity, None),
     ('PS', schedulers.PS, simulator.identity, None),
@@ -90,32 +115,43 @@ fname_mask = 'lu_{}_{}_{}_{}_{}_{}_{}_{}.s'
 fname = fname_mask.format(args.shape, args.loc, args.corr, args.load,
                           args.timeshape, args.njobs, args.est_factor,
                           seed)
-final_results = shelve.open(os.path.join(args.dirname, fname))
-
-for name, scheduler, errfunc, args.iterations in instances:
+final_results = experiment_helpers.open_results(
+    os.path.join(args.dirname, fname))
+legacy = set(final_results) - {experiment_helpers.PENDING}
+stored_generator = final_results.get(
+    'generator', LEGACY_GENERATOR if legacy else generator)
+if stored_generator != generator:
+    experiment_helpers.close_results(final_results)
+    parser.error("{} contains results for workloads generated by {}".format(
+        fname, stored_generator))
+final_results['generator'] = generator
+
+for name, scheduler, errfunc, iterations in instances:
 
     print(name, end='')
 
-    if args.iterations is None:
+    if iterations is None and final_results.get(name):
         # if no. of iterations is None, it means that a single pass is
         # enough (no randomness there)
-        if name in final_results:
-            continue
-        else:
-            args.iterations = 1
+        continue
 
-    scheduler_results = final_results.get(name, [])
+    def run_once():
+        checkpoint = experiment_helpers.checkpoint_fname(args, fname, name)
+        samples = experiment_helpers.samples_fname(args, fname, name)
+        completions, _ = experiment_helpers.simulate(
+            jobs, scheduler, errfunc, args, checkpoint=checkpoint,
+            samples=samples)
+        return experiment_helpers.sojourns(completions, job_idxs, job_start)
 
-    for i in range(args.iterations - len(scheduler_results)):
-        results = list(simulator.simulator(jobs, scheduler, errfunc))
-        sojourns = numpy.zeros(n_jobs)
-        for compl, jobid in results:
-            sojourns[job_idxs[jobid]] = compl - job_start[jobid]
-        scheduler_results.append(sojourns)
-        print('', sojourns.mean(), end='')
-        sys.stdout.flush()
+    scheduler_results = final_results.get(name, [])
+    metadata = experiment_helpers.replicate(run_once, scheduler_results,
+                                            iterations, args)
     print()
 
-    final_results[name] = scheduler_results
+    with experiment_helpers.updating(final_results, name):
+        final_results[name] = scheduler_results
+        experiment_helpers.update_metadata(final_results, name, metadata)
+        experiment_helpers.update_tails(final_results, name, scheduler_results,
+                                        sizes)
 
-final_results.close()
+experiment_helpers.close_results(final_results)
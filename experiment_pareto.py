@@ -6,12 +6,13 @@ import argparse
 import itertools
 import os.path
 import random
-import shelve
-import sys
 
 import numpy
 import scipy.stats
 
+import arrivals
+import estimations
+import experiment_helpers
 import norta
 import simulator
 import schedulers
@@ -46,8 +47,21 @@ parser.add_argument('--iterations', type=int, default=1,
 parser.add_argument('--est_factor', type=float, default=1,
                     help="multiply estimated size by this value")
 parser.add_argument('--seed', type=int, help="random seed")
+parser.add_argument('--arrivals', help="bursty or non-stationary arrival "
+                    "process replacing Weibull inter-arrival times, e.g. "
+                    "'mmpp:1,10:100,10' (see arrivals.py); results are "
+                    "stored in DIRNAME/lu-PROCESS_SHAPE_LOC_SIGMA_LOAD_"
+                    "PARAMS_NJOBS_ESTFACTOR_SEED.s")
+estimations.add_arguments(parser)
+experiment_helpers.add_arguments(parser)
 args = parser.parse_args()
 
+if args.arrivals is not None:
+    try:
+        process = arrivals.parse(args.arrivals)
+    except ValueError as e:
+        parser.error(str(e))
+
 if args.seed is None:
     seed = random.randrange(2 ** 32)
 else:
@@ -56,12 +70,17 @@ else:
 random.seed(seed)
 
 sizes = scipy.stats.pareto(args.shape, args.loc).rvs(args.njobs)
-times = numpy.cumsum(scipy.stats.weibull_min(args.timeshape).rvs(args.njobs))
+if args.arrivals is None:
+    times = numpy.cumsum(
+        scipy.stats.weibull_min(args.timeshape).rvs(args.njobs))
+else:
+    times = process(args.njobs, numpy.random.default_rng(seed))
 times *= sizes.sum() * args.load / times[-1]
 
 jobs = [(i, t, s) for i, (t, s) in enumerate(zip(times, sizes))]
 
 error = simulator.lognorm_error(args.sigma, args.est_factor)
+error = estimations.from_args(args, jobs) or error
                     
 instances = [
     ('FIFO', schedulers.FIFO, simulator.identity, None),
@@ -83,36 +102,48 @@ n_jobs = len(jobids)
 
 job_start = {jobid: start for jobid, start, size in jobs}
 
-fname_mask = 'lu_{}_{}_{}_{}_{}_{}_{}_{}.s'
-fname = fname_mask.format(args.shape, args.loc, args.sigma, args.load,
-                          args.timeshape, args.njobs, args.est_factor,
-                          seed)
-final_results = shelve.open(os.path.join(args.dirname, fname))
-
-for name, scheduler, errfunc, args.iterations in instances:
+basename = 'lu'
+timeshape = args.timeshape
+sigma = args.sigma
+if args.arrivals is not None:
+    # as in experiment_weibull.py
+    process_name, timeshape = arrivals.tag(args.arrivals)
+    basename = '{}-{}'.format(basename, process_name)
+if args.error_model is not None:
+    basename = '{}-{}'.format(basename, args.error_model)
+    sigma = estimations.tag(args)
+fname_mask = '{}_{}_{}_{}_{}_{}_{}_{}_{}.s'
+fname = fname_mask.format(basename, args.shape, args.loc, sigma, args.load,
+                          timeshape, args.njobs, args.est_factor, seed)
+final_results = experiment_helpers.open_results(
+    os.path.join(args.dirname, fname))
+
+for name, scheduler, errfunc, iterations in instances:
 
     print(name, end='')
 
-    if args.iterations is None:
+    if iterations is None and final_results.get(name):
         # if no. of iterations is None, it means that a single pass is
         # enough (no randomness there)
-        if name in final_results:
-            continue
-        else:
-            args.iterations = 1
+        continue
 
-    scheduler_results = final_results.get(name, [])
+    def run_once():
+        checkpoint = experiment_helpers.checkpoint_fname(args, fname, name)
+        samples = experiment_helpers.samples_fname(args, fname, name)
+        completions, _ = experiment_helpers.simulate(
+            jobs, scheduler, errfunc, args, checkpoint=checkpoint,
+            samples=samples)
+        return experiment_helpers.sojourns(completions, job_idxs, job_start)
 
-    for i in range(args.iterations - len(scheduler_results)):
-        results = list(simulator.simulator(jobs, scheduler, errfunc))
-        sojourns = numpy.zeros(n_jobs)
-        for compl, jobid in results:
-            sojourns[job_idxs[jobid]] = compl - job_start[jobid]
-        scheduler_results.append(sojourns)
-        print('', sojourns.mean(), end='')
-        sys.stdout.flush()
+    scheduler_results = final_results.get(name, [])
+    metadata = experiment_helpers.replicate(run_once, scheduler_results,
+                                            iterations, args)
     print()
 
-    final_results[name] = scheduler_results
+    with experiment_helpers.updating(final_results, name):
+        final_results[name] = scheduler_results
+        experiment_helpers.update_metadata(final_results, name, metadata)
+        experiment_helpers.update_tails(final_results, name, scheduler_results,
+                                        sizes)
 
-final_results.close()
+experiment_helpers.close_results(final_results)
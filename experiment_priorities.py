@@ -6,9 +6,10 @@ import argparse
 import numpy
 import os.path
 import random
-import shelve
-import sys
 
+import arrivals
+import estimations
+import experiment_helpers
 import weibull_workload
 import simulator
 import schedulers
@@ -47,9 +48,23 @@ parser.add_argument('--alpha', type=float, default=1.0,
                     help="priority class x gets a weight of x**(-alpha); "
                     "default is 1")
 parser.add_argument('--seed', type=int, help="random seed")
+parser.add_argument('--arrivals', help="bursty or non-stationary arrival "
+                    "process replacing Weibull inter-arrival times, e.g. "
+                    "'mmpp:1,10:100,10' (see arrivals.py); the workload is "
+                    "then generated with numpy, and results are stored in "
+                    "DIRNAME/pri-PROCESS_SHAPE_SIGMA_LOAD_PARAMS_NJOBS_"
+                    "ESTFACTOR_ALPHA_SEED.s")
+estimations.add_arguments(parser)
+experiment_helpers.add_arguments(parser)
 
 args = parser.parse_args()
 
+if args.arrivals is not None:
+    try:
+        arrivals.parse(args.arrivals)
+    except ValueError as e:
+        parser.error(str(e))
+
 if args.seed is None:
     seed = random.randrange(2 ** 32)
 else:
@@ -57,8 +72,15 @@ else:
 
 random.seed(seed)
 
-jobs, priorities = weibull_workload.workload_priorities(
-    args.shape, args.load, args.njobs, args.timeshape, seed)
+if args.arrivals is None:
+    jobs, priorities = weibull_workload.workload_priorities(
+        args.shape, args.load, args.njobs, args.timeshape, seed)
+else:
+    workload = weibull_workload.cached_workload(
+        args.workload_cache, 'weibull_workload.workload_arrays', args.shape,
+        args.load, args.njobs, args.timeshape, seed, args.arrivals)
+    jobs = list(zip(workload['t'].tolist(), workload['size'].tolist()))
+    priorities = [random.randint(1, 5) for _ in range(args.njobs)]
 jobs = [(i, t, size) for i, (t, size) in enumerate(jobs)]
 weights = [p ** (-args.alpha) for p in priorities]
 
@@ -68,7 +90,7 @@ if args.est_factor:
     error = errfunc(args.sigma, args.est_factor)
 else:
     error = errfunc(args.sigma)
-    
+error = estimations.from_args(args, jobs) or error
 
 instances = [
     ('WFQE+GPS', schedulers.WFQE_GPS, error, args.iterations),
@@ -77,44 +99,63 @@ instances = [
 
 job_start = {jobid: t for (jobid, t, _) in jobs}
 
-basename = 'pri_normal' if args.normal_error else 'pri'
+basename = 'pri'
+timeshape = args.timeshape
+sigma = args.sigma
+if args.arrivals is not None:
+    # as in experiment_weibull.py
+    process, timeshape = arrivals.tag(args.arrivals)
+    basename = 'pri-{}'.format(process)
+if args.error_model is not None:
+    basename = '{}-{}'.format(basename, args.error_model)
+    sigma = estimations.tag(args)
+elif args.normal_error:
+    basename = ('pri_normal' if args.arrivals is None
+                else '{}-normal'.format(basename))
 
 fname_mask = '{}_{}_{}_{}_{}_{}_{}_{}_{}.s'
-fname = fname_mask.format(basename, args.shape, args.sigma, args.load,
-                          args.timeshape, args.njobs, args.est_factor,
+fname = fname_mask.format(basename, args.shape, sigma, args.load,
+                          timeshape, args.njobs, args.est_factor,
                           args.alpha, seed)
-final_results = shelve.open(os.path.join(args.dirname, fname))
+final_results = experiment_helpers.open_results(
+    os.path.join(args.dirname, fname))
 
-for name, scheduler, errfunc, args.iterations in instances:
+for name, scheduler, errfunc, iterations in instances:
 
     print(name, end='')
 
     sojourns_per_priority = {pri: [] for pri in range(1, 6)}
     
-    if args.iterations is None:
+    if iterations is None and final_results.get(name):
         # if no. of iterations is None, it means that a single pass is
         # enough (no randomness there)
-        if name in final_results:
-            continue
-        else:
-            args.iterations = 1
-
-    scheduler_results = final_results.get(name, [])
-
-    for i in range(args.iterations - len(scheduler_results)):
-        results = list(simulator.simulator(jobs, scheduler, errfunc,
-                                           weights))
-        sojourns = numpy.zeros(args.njobs)
+        continue
+
+    def run_once():
+        checkpoint = experiment_helpers.checkpoint_fname(args, fname, name)
+        samples = experiment_helpers.samples_fname(args, fname, name)
+        results, _ = experiment_helpers.simulate(jobs, scheduler, errfunc,
+                                                 args, weights, checkpoint,
+                                                 samples)
+        sojourns = numpy.empty(args.njobs)
+        sojourns.fill(numpy.nan)
         for compl, jobid in results:
             sojourn = compl - job_start[jobid]
             sojourns[jobid] = sojourn
             sojourns_per_priority[priorities[jobid]].append(sojourn)
-        scheduler_results.append(sojourns)
-        print('', sojourns.mean(), end='')
-        sys.stdout.flush()
-    final_results[name] = scheduler_results
+        return sojourns
+
+    scheduler_results = final_results.get(name, [])
+    metadata = experiment_helpers.replicate(run_once, scheduler_results,
+                                            iterations, args)
+    with experiment_helpers.updating(final_results, name):
+        final_results[name] = scheduler_results
+        experiment_helpers.update_metadata(final_results, name, metadata)
+        experiment_helpers.update_tails(final_results, name, scheduler_results,
+                                        [size for _, _, size in jobs],
+                                        priorities)
     print({pri: numpy.array(s).mean()
            for pri, s in sojourns_per_priority.items()})
     print()
 
-final_results.close()
+experiment_helpers.close_results(final_results)
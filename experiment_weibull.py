@@ -5,11 +5,12 @@ from __future__ import print_function
 import argparse
 import os.path
 import random
-import shelve
-import sys
 
-from numpy import zeros
+import numpy
 
+import arrivals
+import estimations
+import experiment_helpers
 import weibull_workload
 import simulator
 import schedulers
@@ -44,18 +45,42 @@ parser.add_argument('--normal_error', default=False, action='store_true',
                     help="error function distributed according to a normal "
                     "rather than a log-normal")
 parser.add_argument('--seed', type=int, help="random seed")
+parser.add_argument('--vectorized', default=False, action='store_true',
+                    help="generate the workload with numpy (much faster "
+                    "for large workloads, but different from the default "
+                    "one for the same seed)")
+parser.add_argument('--arrivals', help="bursty or non-stationary arrival "
+                    "process replacing Weibull inter-arrival times, e.g. "
+                    "'mmpp:1,10:100,10', 'diurnal:1,2,4,2:1000' or 'batch:8' "
+                    "(see arrivals.py); implies --vectorized, and results are "
+                    "stored in DIRNAME/res-PROCESS_SHAPE_SIGMA_LOAD_PARAMS_"
+                    "NJOBS_SEED.s")
+estimations.add_arguments(parser)
+experiment_helpers.add_arguments(parser)
 args = parser.parse_args()
 
+if args.arrivals is not None:
+    try:
+        arrivals.parse(args.arrivals)
+    except ValueError as e:
+        parser.error(str(e))
+    args.vectorized = True
+
 if args.seed is None:
     seed = random.randrange(2 ** 32)
 else:
     seed = args.seed
 
-random.seed(seed)
+if args.vectorized:
+    generator = 'weibull_workload.workload_arrays'
+else:
+    generator = 'weibull_workload.workload'
 
-jobs = weibull_workload.workload(args.shape, args.load, args.njobs,
-                                 args.timeshape)
-jobs = [(i, jobid, size) for i, (jobid, size) in enumerate(jobs)]
+workload = weibull_workload.cached_workload(
+    args.workload_cache, generator, args.shape, args.load, args.njobs,
+    args.timeshape, seed, args.arrivals)
+jobs = list(zip(range(args.njobs), workload['t'].tolist(),
+                workload['size'].tolist()))
 
 errfunc = (simulator.normal_error if args.normal_error
            else simulator.lognorm_error)
@@ -63,7 +88,7 @@ if args.est_factor:
     error = errfunc(args.sigma, args.est_factor)
 else:
     error = errfunc(args.sigma)
-    
+error = estimations.from_args(args, jobs) or error
 
 instances = [
     ('FIFO', schedulers.FIFO, simulator.identity, None),
@@ -88,42 +113,68 @@ job_start = {jobid: start for jobid, start, size in jobs}
 
 
 basename = 'normal' if args.normal_error else 'res'
+timeshape = args.timeshape
+if args.arrivals is not None:
+    # different processes go in different files; the parameters of the
+    # process take the place of the shape of inter-arrival times
+    process, timeshape = arrivals.tag(args.arrivals)
+    basename = '{}-{}'.format(basename, process)
+sigma = args.sigma
+if args.error_model is not None:
+    # likewise for error models and their parameters
+    basename = '{}-{}'.format(basename, args.error_model)
+    sigma = estimations.tag(args)
 
 if args.est_factor:
     fname_mask = '{}_{}_{}_{}_{}_{}_{}_{}.s'
-    fname = fname_mask.format(basename, args.shape, args.sigma, args.load,
-                              args.timeshape, args.njobs, args.est_factor,
-                              seed)
+    fname = fname_mask.format(basename, args.shape, sigma, args.load,
+                              timeshape, args.njobs, args.est_factor, seed)
 else:
     fname_mask = '{}_{}_{}_{}_{}_{}_{}.s'
-    fname = fname_mask.format(basename, args.shape, args.sigma, args.load,
-                              args.timeshape, args.njobs, seed)
-final_results = shelve.open(os.path.join(args.dirname, fname))
-
-for name, scheduler, errfunc, args.iterations in instances:
+    fname = fname_mask.format(basename, args.shape, sigma, args.load,
+                              timeshape, args.njobs, seed)
+final_results = experiment_helpers.open_results(
+    os.path.join(args.dirname, fname))
+# all runs in a file must be on the same workload; files written before
+# we stored this were all generated by weibull_workload.workload
+legacy = set(final_results) - {experiment_helpers.PENDING}
+stored_generator = final_results.get(
+    'generator', 'weibull_workload.workload' if legacy else generator)
+if stored_generator != generator:
+    experiment_helpers.close_results(final_results)
+    parser.error("{} contains results for workloads generated by {}".format(
+        fname, stored_generator))
+final_results['generator'] = generator
+if 'sizes' not in final_results:
+    # stored for the analysis of slowdowns (see analysis.py)
+    final_results['sizes'] = numpy.array(workload['size'])
+
+for name, scheduler, errfunc, iterations in instances:
 
     print(name, end='')
 
-    if args.iterations is None:
+    if iterations is None and final_results.get(name):
         # if no. of iterations is None, it means that a single pass is
         # enough (no randomness there)
-        if name in final_results:
-            continue
-        else:
-            args.iterations = 1
+        continue
 
-    scheduler_results = final_results.get(name, [])
+    def run_once():
+        checkpoint = experiment_helpers.checkpoint_fname(args, fname, name)
+        samples = experiment_helpers.samples_fname(args, fname, name)
+        completions, _ = experiment_helpers.simulate(
+            jobs, scheduler, errfunc, args, checkpoint=checkpoint,
+            samples=samples)
+        return experiment_helpers.sojourns(completions, job_idxs, job_start)
 
-    for i in range(args.iterations - len(scheduler_results)):
-        results = list(simulator.simulator(jobs, scheduler, errfunc))
-        sojourns = zeros(n_jobs)
-        for compl, jobid in results:
-            sojourns[job_idxs[jobid]] = compl - job_start[jobid]
-        scheduler_results.append(sojourns)
-        print('', sojourns.mean(), end='')
-        sys.stdout.flush()
+    scheduler_results = final_results.get(name, [])
+    metadata = experiment_helpers.replicate(run_once, scheduler_results,
+                                            iterations, args)
     print()
 
-    final_results[name] = scheduler_results
+    with experiment_helpers.updating(final_results, name):
+        final_results[name] = scheduler_results
+        experiment_helpers.update_metadata(final_results, name, metadata)
+        experiment_helpers.update_tails(final_results, name, scheduler_results,
+                                        workload['size'])
 
-final_results.close()
+experiment_helpers.close_results(final_results)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+"""Render the figures of the paper in a batch, without a display.
+
+Each figure is drawn by one of the plot scripts, run with the
+non-interactive Agg backend; figures are rendered in parallel. A manifest
+in the output directory records, for each figure, its command line and
+the signatures of its inputs: the result files it reads (as listed by
+the script with --list_inputs, run in this process so that an up to
+date figure costs no new interpreter) and the sources of the scripts.
+Figures whose inputs did not change since they were last rendered are
+skipped; the others are each rendered by a process of its own, since
+the scripts draw on pyplot's global state.
+
+Before rendering, the mean sojourn times of all the result files that
+figures need are summarized once, in parallel, in the index of
+result_loader.py: the plot scripts then find them there.
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import io
+import os
+import runpy
+import shelve
+import shlex
+import shutil
+import subprocess
+import sys
+
+import result_loader
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (output file, plot script, arguments); {dirname} and {njobs_dirname} are
+# replaced by the corresponding command line options
+FIGURES = [(
+    '3d{}.pdf'.format(scheduler), 'plot3d.py',
+    '{} --normalize PS {{dirname}} --notitle --zmin 0.25 --zmax 128'.format(
+        scheduler))
+    for scheduler in ['SRPTE', 'FSPE', 'FSPE+PS']
+] + [
+    ('shape.pdf', 'plot_weibull.py',
+     '{dirname} --xaxis shape --liny --normalize SRPT --shape 0.25 '
+     '--ymin 0.9 --ymax 10'),
+] + [(
+    '{}.pdf'.format(xaxis), 'plot_weibull.py',
+    '{{dirname}} --xaxis {} --liny --normalize SRPT --shape 0.25 '
+    '--ymin 0.9 --ymax 10 --nofifo'.format(xaxis))
+    for xaxis in ['sigma', 'load', 'timeshape']
+] + [(
+    'mst_0{}.pdf'.format(shape), 'plot_weibull.py',
+    '{{dirname}} --xaxis sigma --normalize SRPT --shape 0.{} '
+    '--nofifo'.format(shape))
+    for shape in ['125', '177']
+] + [(
+    '3d{}.pdf'.format(yaxis), 'plot3d.py',
+    'FSPE+PS {{dirname}} --normalize PS --yaxis {} --notitle --zmin 0.25 '
+    '--zmax 1'.format(yaxis))
+    for yaxis in ['load', 'timeshape']
+] + [
+    ('3dnjobs.pdf', 'plot3d.py',
+     'FSPE+PS {njobs_dirname} --normalize PS --notitle --xaxis njobs '
+     '--yaxis shape --zmin 0.25 --zmax 1'),
+    ('slowdown.pdf', 'plot_weibull_slowdown.py',
+     '{dirname} --shape 0.25 --xmin 0.95 --xmax 100 --ymax 1.02 '
+     '--legend_loc "center right"'),
+    ('slowdown_zoom.pdf', 'plot_weibull_slowdown.py',
+     '{dirname} --shape 0.25 --xmin 0.95 --xmax 100 --ymin 0.9 '
+     '--ymax 1.002 --nolegend'),
+    ('size_vs_slowdown.pdf', 'plot_weibull_size_vs_slowdown.py',
+     '{dirname} --shape 0.25 --xmin 0.0001 --ymin 0.9 --ymax 10000000'),
+    ('fb_mst.pdf', 'plot_real.py',
+     '--tsv FB10 -dn 1 --norm SRPT --nofifo --liny --ymin 0.9 --ymax 10'),
+    ('ircache_mst.pdf', 'plot_real.py',
+     'ircache2 --ymin 0.9 --normalize SRPT'),
+]
+
+# scripts plotting the mean sojourn times in result_loader's 'means' index
+MEANS_SCRIPTS = {'plot3d.py', 'plot_weibull.py', 'plot_pareto.py',
+                 'plot_real.py'}
+
+# modules whose changes can affect all figures
+SOURCES = ['plot_helpers.py', 'result_loader.py', 'analysis.py']
+
+Figure = collections.namedtuple('Figure', 'fname script command')
+
+
+def figures(outdir, dirname, njobs_dirname, only=None):
+    res = []
+    for fname, script, args in FIGURES:
+        if only and fname not in only:
+            continue
+        args = args.format(dirname=dirname, njobs_dirname=njobs_dirname)
+        command = [sys.executable, os.path.join(HERE, script)]
+        command += shlex.split(args)
+        res.append(Figure(os.path.join(outdir, fname), script, command))
+    return res
+
+
+def _environment():
+    return dict(os.environ, MPLBACKEND='Agg')
+
+
+def list_inputs(figure):
+    """Result files read by a figure, or None if they can't be listed.
+
+    The plot script runs in this process with --list_inputs, which makes
+    it exit before plotting; it uses the backend in MPLBACKEND if it
+    imports pyplot first.
+    """
+
+    script = figure.command[1]
+    output = io.StringIO()
+    argv = sys.argv
+    sys.argv = figure.command[1:] + ['--list_inputs']
+    try:
+        with contextlib.redirect_stdout(output), \
+                contextlib.redirect_stderr(io.StringIO()):
+            runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        if e.code:
+            return None  # rendering will fail too, and show the error
+    except Exception:
+        return None
+    finally:
+        sys.argv = argv
+    return sorted(line for line in output.getvalue().splitlines() if line)
+
+
+def inputs_signature(figure, inputs):
+    """What the rendering of a figure depends on."""
+
+    sources = [figure.script] + SOURCES
+    inputs = inputs or []
+    return (figure.command,
+            [(fname, result_loader.signature(fname)) for fname in inputs],
+            [(source, result_loader.signature(os.path.join(HERE, source)))
+             for source in sources])
+
+
+def render(figure, crop):
+    """Render a figure; return (figure, returncode, output)."""
+
+    proc = subprocess.run(figure.command + ['--save', figure.fname],
+                          env=_environment(), stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT, universal_newlines=True)
+    output = proc.stdout
+    if proc.returncode == 0 and crop and figure.fname.endswith('.pdf'):
+        crop_proc = subprocess.run(['pdfcrop', figure.fname, figure.fname],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT,
+                                   universal_newlines=True)
+        output += crop_proc.stdout
+    return figure, proc.returncode, output
+
+
+def warm_means(figures_inputs, processes):
+    # summarize all the result files that need it at once, rather than
+    # once for each figure reading them
+    by_index = collections.defaultdict(set)
+    for figure, inputs in figures_inputs:
+        if figure.script in MEANS_SCRIPTS:
+            for fname in inputs:
+                index = os.path.join(os.path.dirname(fname),
+                                     result_loader.INDEX)
+                by_index[index].add(fname)
+    for index, fnames in sorted(by_index.items()):
+        print("summarizing the {} result files of {}".format(
+            len(fnames), index))
+        result_loader.load(sorted(fnames), result_loader.means, 'means',
+                           index, processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="render the figures of the "
+                                     "paper, skipping the ones whose inputs "
+                                     "did not change")
+    parser.add_argument('figures', nargs='*',
+                        help="only render these figures (e.g., shape.pdf); "
+                        "default: all")
+    parser.add_argument('--dirname', default='weibull_20140217',
+                        help="directory with the results of "
+                        "experiment_weibull.py; default: weibull_20140217")
+    parser.add_argument('--njobs_dirname', default='weibull_20140213',
+                        help="directory with the results varying the "
+                        "number of jobs; default: weibull_20140213")
+    parser.add_argument('--outdir', default='plots',
+                        help="directory for the figures; default: plots")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help="number of figures rendered in parallel; "
+                        "default: one per CPU")
+    parser.add_argument('--force', default=False, action='store_true',
+                        help="render figures even if their inputs did not "
+                        "change")
+    parser.add_argument('--nocrop', default=False, action='store_true',
+                        help="don't crop PDF figures with pdfcrop")
+    parser.add_argument('--list', default=False, action='store_true',
+                        help="list the figures and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for fname, _, _ in FIGURES:
+            print(fname)
+        return
+
+    todo = figures(args.outdir, args.dirname, args.njobs_dirname,
+                   args.figures)
+    os.makedirs(args.outdir, exist_ok=True)
+    crop = not args.nocrop and shutil.which('pdfcrop') is not None
+
+    # scripts listing their inputs import pyplot in this process
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    all_inputs = [list_inputs(figure) for figure in todo]
+
+    manifest = shelve.open(os.path.join(args.outdir, 'manifest.s'))
+    try:
+        stale = []
+        for figure, inputs in zip(todo, all_inputs):
+            signature = inputs_signature(figure, inputs)
+            if (args.force or inputs is None
+                    or not os.path.exists(figure.fname)
+                    or manifest.get(figure.fname) != signature):
+                stale.append((figure, inputs, signature))
+            else:
+                print("{}: up to date".format(figure.fname))
+
+        warm_means([(figure, inputs) for figure, inputs, _ in stale
+                    if inputs is not None], args.jobs)
+
+        signatures = {figure.fname: signature
+                      for figure, _, signature in stale}
+        failed = 0
+        with concurrent.futures.ThreadPoolExecutor(args.jobs) as executor:
+            futures = [executor.submit(render, figure, crop)
+                       for figure, _, _ in stale]
+            for future in concurrent.futures.as_completed(futures):
+                figure, returncode, output = future.result()
+                if returncode == 0:
+                    manifest[figure.fname] = signatures[figure.fname]
+                    print("{}: rendered".format(figure.fname))
+                else:
+                    failed += 1
+                    print("{}: FAILED\n{}".format(figure.fname, output),
+                          file=sys.stderr)
+    finally:
+        manifest.close()
+
+    if failed:
+        sys.exit("{} figures failed".format(failed))
+
+
+if __name__ == '__main__':
+    main()
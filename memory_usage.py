@@ -0,0 +1,84 @@
+"""Memory used by the data structures of a simulation.
+
+Sizes are computed by walking containers (dicts, lists, tuples, sets, the
+blist types of schedulers...) and the attributes of objects, adding up
+sys.getsizeof() of everything reachable; each object is counted once per
+structure. Objects shared by several structures (e.g., jobids) are
+counted in each of them. Walking a structure takes time linear in its
+size: see simulator.Sampler to do it periodically during a simulation.
+"""
+
+from __future__ import division
+
+import collections
+import sys
+import types
+from array import array
+
+import numpy
+
+# objects that are not walked into
+_LEAVES = (str, bytes, bytearray, int, float, complex, bool, type(None),
+           array, numpy.ndarray, type, types.ModuleType, types.FunctionType,
+           types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_sizeof(obj):
+    """Bytes used by obj and all the objects reachable from it."""
+
+    seen = set()
+    res = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        res += sys.getsizeof(obj)
+        if isinstance(obj, _LEAVES):
+            continue
+        if isinstance(obj, collections.abc.Mapping):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif (isinstance(obj, collections.abc.Iterable)
+              and not isinstance(obj, collections.abc.Iterator)):
+            # iterators would be consumed
+            stack.extend(obj)
+        if hasattr(obj, '__dict__'):
+            stack.append(vars(obj))
+    return res
+
+
+def structure_sizes(simulation):
+    """{name: bytes} for the event heap, the per-job dictionaries of a
+    simulator.Simulation and each attribute of its scheduler."""
+
+    res = collections.OrderedDict()
+    res['events'] = deep_sizeof(simulation.events)
+    res['remaining'] = deep_sizeof(simulation.remaining)
+    res['schedule'] = deep_sizeof(simulation.schedule)
+    if simulation.completions is not None:
+        res['completions'] = deep_sizeof(simulation.completions)
+    for name, value in sorted(vars(simulation.scheduler).items()):
+        res['scheduler.' + name] = deep_sizeof(value)
+    return res
+
+
+def peaks(columns):
+    """{name: peak bytes} from the memory columns of a Sampler, largest
+    first."""
+
+    res = [(name[len('bytes_'):], max(column))
+           for name, column in columns.items() if name.startswith('bytes_')]
+    if 'traced' in columns:
+        res.append(('traced', max(columns['traced'])))
+    res.sort(key=lambda item: item[1], reverse=True)
+    return collections.OrderedDict(res)
+
+
+def format_peaks(peaks, top=None):
+    """A one-line description of the result of peaks()."""
+
+    items = list(peaks.items())[:top]
+    return ' '.join('{}={:.1f}MB'.format(name, size / 2 ** 20)
+                    for name, size in items)
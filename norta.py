@@ -1,29 +1,108 @@
 # Based on Lu et al.'s model for generating distributions with
 # arbitrary coefficients
 
+import hashlib
 import math
+import sqlite3
 
 import numpy
+import scipy.optimize
 import scipy.stats
 
 normal = scipy.stats.norm()
 
-def generate(r, n, real_dist=normal, est_dist=None, eps=0.01):
-    rho = r
+
+def _describe(dist):
+    # hashable description of a frozen scipy.stats distribution
+    return dist.dist.name, dist.args, sorted(dist.kwds.items())
+
+
+def _cache_key(r, real_dist, est_dist, eps, y1, x2):
+    # the sample is part of the key, so that a cached rho is the one
+    # calibration would find on it
+    digest = hashlib.sha1(y1.tobytes() + x2.tobytes()).hexdigest()
+    return repr((r, _describe(real_dist), _describe(est_dist), eps, digest))
+
+
+def _cached_rho(cache, key):
+    conn = sqlite3.connect(cache, timeout=60)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS calibration "
+                     "(key TEXT PRIMARY KEY, rho REAL)")
+        row = conn.execute("SELECT rho FROM calibration WHERE key = ?",
+                           (key,)).fetchone()
+    finally:
+        conn.close()
+    return None if row is None else row[0]
+
+
+def _store_rho(cache, key, rho):
+    conn = sqlite3.connect(cache, timeout=60)
+    try:
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO calibration VALUES (?, ?)",
+                         (key, rho))
+    finally:
+        conn.close()
+
+
+class _Found(Exception):
+    # used to stop the root finder as soon as we are within eps
+    pass
+
+
+def generate(r, n, real_dist=normal, est_dist=None, eps=0.01, cache=None,
+             rng=None):
+    """Return (estimations, real sizes) arrays with correlation r.
+
+    Variates are drawn from rng, a numpy.random.Generator (by default,
+    numpy's global random state).
+
+    A single sample of normal variates is drawn, and the correlation rho
+    of the underlying normals is calibrated on it with Brent's method, so
+    that the result only depends on the parameters and on rng. If cache
+    is a file name, calibrated rho values are stored there (in a SQLite
+    table, keyed by r, the distributions, eps and a digest of the
+    sample), and calibration is skipped when the same sample is drawn
+    again.
+    """
+
     if est_dist is None:
         est_dist = real_dist
-    low, high = 0, 1
-    while True:
-        y1, x2 = normal.rvs((2, n))
-        y2 = rho * y1 +  (1 - rho ** 2) ** 0.5 * x2
-        u1, u2 = normal.cdf([y1, y2])
-        est = est_dist.ppf(u1)
-        real = real_dist.ppf(u2)
-        diff = r - numpy.corrcoef(est, real)[0, 1]
-        if diff < -eps:
-            high = rho
-        elif diff < eps:
-            return est, real
-        else:
-            low = rho
-        rho = (low + high) / 2
+
+    y1, x2 = normal.rvs((2, n), random_state=rng)
+    est = est_dist.ppf(normal.cdf(y1))  # doesn't depend on rho
+
+    def real_for(rho):
+        y2 = rho * y1 + (1 - rho ** 2) ** 0.5 * x2
+        return real_dist.ppf(normal.cdf(y2))
+
+    def diff(rho):
+        real = real_for(rho)
+        d = numpy.corrcoef(est, real)[0, 1] - r
+        if abs(d) < eps:
+            raise _Found(rho, real)
+        return d
+
+    if cache is not None:
+        key = _cache_key(r, real_dist, est_dist, eps, y1, x2)
+        rho = _cached_rho(cache, key)
+        if rho is not None:
+            return est, real_for(rho)
+
+    low, high = (0, 1) if r >= 0 else (-1, 0)
+    try:
+        scipy.optimize.brentq(diff, low, high, xtol=1e-6)
+    except _Found as found:
+        rho, real = found.args
+    except ValueError:
+        raise ValueError("correlation {} cannot be obtained with these "
+                         "distributions".format(r))
+    else:
+        # brentq converged on rho without getting within eps
+        raise ValueError("correlation {} cannot be obtained with a "
+                         "precision of {}".format(r, eps))
+
+    if cache is not None:
+        _store_rho(cache, key, rho)
+    return est, real
@@ -4,8 +4,8 @@ import argparse
 import collections
 import glob
 import math
-import shelve
 import os.path
+import sys
 
 import numpy as np
 import matplotlib
@@ -16,6 +16,7 @@ from matplotlib import colors
 from mpl_toolkits.mplot3d import Axes3D
 
 import plot_helpers
+import result_loader
 
 names = ['FIFO', 'PS', 'SRPT', 'FSP', 'LAS', 'SRPTE', 'SRPTE+PS', 'SRPTE+LAS',
          'FSPE', 'FSPE+PS', 'FSPE+LAS']
@@ -59,6 +60,9 @@ parser.add_argument('--zmin', type=float,
 parser.add_argument('--zmax', type=float,
                     help="maximum value on z axis")
 parser.add_argument('--save', help="don't show but save in target filename")
+parser.add_argument('--list_inputs', default=False, action='store_true',
+                    help="only print the names of the result files that "
+                    "would be read (see make_figures.py)")
 args = parser.parse_args()
 
 if not args.est_factor and 'est_factor' not in [args.xaxis, args.yaxis]:
@@ -73,42 +77,31 @@ glob_str = os.path.join(args.dirname,
                         'res_{}_[0-9.]*.s'.format('_'.join(fname_regex)))
 fnames = glob.glob(glob_str)
 
-cache = shelve.open(os.path.join(args.dirname, 'cache.s'))
-def getmean(fname, scheduler):
-    key = '{}_mean_{}'.format(os.path.split(fname)[1], scheduler)
-    try:
-        return cache[key]
-    except KeyError:
-        shelve_ = shelve.open(fname, 'r')
-        mean = np.array(shelve_[scheduler]).mean()
-        shelve_.close()
-        cache[key] = mean
-        return mean
+if args.list_inputs:
+    print('\n'.join(fnames))
+    sys.exit()
+
+loaded = result_loader.load(fnames, result_loader.means, 'means',
+                            os.path.join(args.dirname, result_loader.INDEX))
+data = result_loader.tidy(loaded, {'x': xaxis_idx + 1, 'y': yaxis_idx + 1})
+missing = np.full(len(loaded), np.nan)
+msts = data.get(args.scheduler, missing)
+if args.normalize:
+    msts = msts / data.get(args.normalize, missing)
 
 results = collections.defaultdict(list)
 xvals, yvals = set(), set()
-for fname in fnames:
-    print('.', end='', flush=True)
-    split = os.path.splitext(os.path.split(fname)[1])[0].split('_')[1:-1]
-    xval = float(split[xaxis_idx])
+for xval, yval, mst in zip(data['x'].tolist(), data['y'].tolist(),
+                           msts.tolist()):
     if args.xaxis == 'load':
         xval = 1 - xval
-    yval = float(split[yaxis_idx])
     if args.yaxis == 'load':
         yval = 1 - yval
     xvals.add(xval)
     yvals.add(yval)
-    try:
-        mst = getmean(fname, args.scheduler)
-        if args.normalize:
-            mst = mst / getmean(fname, args.normalize)
-    except:
-        # the file is being written now
-        continue
-    results[xval, yval].append(mst)
-cache.close()
-
-print()
+    if not np.isnan(mst):
+        results[xval, yval].append(mst)
+
 xvals = sorted(xvals)
 yvals = sorted(yvals)
 X, Y = np.meshgrid(xvals, yvals)
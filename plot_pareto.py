@@ -5,13 +5,15 @@ from __future__ import division
 import argparse
 import collections
 import glob
-import shelve
 import os.path
+import sys
 
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter, ScalarFormatter, AutoLocator
 
+import result_loader
+
 names = ['FIFO', 'PS', 'SRPT', 'FSP', 'LAS', 'SRPTE', 'SRPTE+PS', 'SRPTE+LAS',
          'FSPE', 'FSPE+PS', 'FSPE+LAS']
 axes = 'shape loc sigma load timeshape njobs est_factor'.split()
@@ -70,6 +72,9 @@ parser.add_argument('--normal_error', default=False, action='store_true',
                     help="error function distributed according to a normal "
                     "rather than a log-normal")
 parser.add_argument('--save', help="don't show but save in target filename")
+parser.add_argument('--list_inputs', default=False, action='store_true',
+                    help="only print the names of the result files that "
+                    "would be read (see make_figures.py)")
 args = parser.parse_args()
 
 if args.nofifo:
@@ -83,37 +88,24 @@ glob_str = os.path.join(args.dirname,
                         'lu_{}_[0-9.]*.s'.format('_'.join(fname_regex)))
 fnames = glob.glob(glob_str)
 
-cache = shelve.open(os.path.join(args.dirname, 'cache.s'))
-def getmean(fname, scheduler):
-    key = '{}_mean_{}'.format(os.path.split(fname)[1], scheduler)
-    try:
-        return cache[key]
-    except KeyError:
-        shelve_ = shelve.open(fname, 'r')
-        mean = np.array(shelve_[scheduler]).mean()
-        shelve_.close()
-        cache[key] = mean
-        return mean
+if args.list_inputs:
+    print('\n'.join(fnames))
+    sys.exit()
+
+loaded = result_loader.load(fnames, result_loader.means, 'means',
+                            os.path.join(args.dirname, result_loader.INDEX))
+data = result_loader.tidy(loaded, {'x': xaxis_idx + 1})
+xvals = 1 - data['x'] if args.xaxis == 'load' else data['x']
+missing = np.full(len(loaded), np.nan)
 
 results = collections.defaultdict(lambda: collections.defaultdict(list))
-for fname in fnames:
-    print('.', end='', flush=True)
-    split = os.path.splitext(os.path.split(fname)[1])[0].split('_')[1:-1]
-    xval = float(split[xaxis_idx])
-    if args.xaxis == 'load':
-        xval = 1 - xval
-    for scheduler in plotted:
-        try:
-            mst = getmean(fname, scheduler)
-            if args.normalize:
-                mst = mst / getmean(fname, args.normalize)
-        except:
-            # the file is being written now
-            continue
-        results[scheduler][xval].append(mst)
-cache.close()
-
-print()
+for scheduler in plotted:
+    msts = data.get(scheduler, missing)
+    if args.normalize:
+        msts = msts / data.get(args.normalize, missing)
+    for xval, mst in zip(xvals.tolist(), msts.tolist()):
+        if not np.isnan(mst):
+            results[scheduler][xval].append(mst)
 
 def load_linformat(x, pos):
     return str(1 - x)
@@ -4,17 +4,18 @@ from __future__ import division
 
 import argparse
 import collections
+import functools
 import glob
 import itertools
-import shelve
 import os.path
+import sys
 
-import numpy as np
 import matplotlib.lines as mlines
 import matplotlib.pyplot as plt
-from matplotlib.ticker import FuncFormatter, ScalarFormatter, AutoLocator
+from matplotlib.ticker import ScalarFormatter
 
-import weibull_workload
+import analysis
+import result_loader
 
 names = ['WFQE+GPS', 'GPS']
 
@@ -68,6 +69,9 @@ parser.add_argument('--normal_error', default=False, action='store_true',
 parser.add_argument('--alpha_label', default=r'\alpha',
                     help="name for the alpha parameter in the label")
 parser.add_argument('--save', help="don't show but save in target filename")
+parser.add_argument('--list_inputs', default=False, action='store_true',
+                    help="only print the names of the result files that "
+                    "would be read (see make_figures.py)")
 args = parser.parse_args()
 
 fname_regex = '_'.join(str(getattr(args, param))
@@ -78,47 +82,28 @@ glob_str = os.path.join(args.dirname,
                         '{}_{}_[0-9.]*_[0-9.]*.s'.format(head, fname_regex))
 fnames = glob.glob(glob_str)
 
+if args.list_inputs:
+    print('\n'.join(fnames))
+    sys.exit()
+
 def get_basename(fname):
     return os.path.splitext(os.path.split(fname)[1])[0]
 
-cache = shelve.open(os.path.join(args.dirname, 'pri_cache.s'))
-def getmeans(fname, scheduler):
-    basename = get_basename(fname)
-    key = '{}_mean_{}'.format(basename, scheduler)
-    try:
-        return cache[key]
-    except KeyError:
-        shelve_ = shelve.open(fname, 'r')
-        seed = int(basename.split('_')[-1])
-        _, priorities = weibull_workload.workload_priorities(
-            args.shape, args.load, args.njobs, args.timeshape, seed)
-        sojourns = collections.defaultdict(list)
-        for results in shelve_.get(scheduler, []):
-            for sojourn, pri in zip(results, priorities):
-                sojourns[pri].append(sojourn)
-        means = {pri: np.array(s).mean() for pri, s in sojourns.items()}
-        shelve_.close()
-        cache[key] = means
-        return means
+loaded = result_loader.load(
+    fnames, functools.partial(analysis.priority_means, schedulers=names,
+                              shape=args.shape, load=args.load,
+                              njobs=args.njobs, timeshape=args.timeshape),
+    'priority_means', os.path.join(args.dirname, result_loader.INDEX))
 
 # results[alpha][scheduler][priority] = list of MSTs per experiment
 results = collections.defaultdict(lambda:
               collections.defaultdict(lambda:
                   collections.defaultdict(list)))
-for fname in fnames:
-    print('.', end='', flush=True)
+for fname, sched_means in loaded.items():
+    alpha = float(get_basename(fname).split('_')[-2])
     for scheduler in plotted:
-        alpha = float(get_basename(fname).split('_')[-2])
-#        try:
-        means = getmeans(fname, scheduler)
-#        except:
-            # the file is being written now
-#            continue
-        for pri, mst in means.items():
+        for pri, mst in sched_means[scheduler].items():
             results[alpha][scheduler][pri].append(mst)
-cache.close()
-
-print()
 
 fig = plt.figure(figsize=(8, 4.5))
 ax = fig.add_subplot(111)
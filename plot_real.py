@@ -5,12 +5,13 @@ from __future__ import division
 import argparse
 import collections
 import glob
-import shelve
-import os.path
+import sys
 
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.ticker import FuncFormatter, ScalarFormatter, AutoLocator
+from matplotlib.ticker import ScalarFormatter
+
+import result_loader
 
 old_names = {'FIFO': 'FIFO',
              'PS': 'PS',
@@ -67,6 +68,9 @@ parser.add_argument('--nolegend', default=False, action='store_true',
 parser.add_argument('--nofifo', default=False, action='store_true',
                     help="don't plot FIFO")
 parser.add_argument('--save', help="don't show but save in target filename")
+parser.add_argument('--list_inputs', default=False, action='store_true',
+                    help="only print the names of the result files that "
+                    "would be read (see make_figures.py)")
 args = parser.parse_args()
 
 if args.nofifo:
@@ -84,25 +88,28 @@ else:
                           for fname in glob.glob(glob_str))
 sigmas = [sigma for sigma, _ in shelve_files]
 
-def getmean(shelve_, scheduler):
-    return np.array(shelve_[scheduler]).mean()
+if args.list_inputs:
+    print('\n'.join(fname for _, fname in shelve_files))
+    sys.exit()
+
+loaded = result_loader.load([fname for _, fname in shelve_files],
+                            result_loader.means, 'means', result_loader.INDEX)
 
 results = collections.defaultdict(dict)
 for sigma, fname in shelve_files:
-    print('.', end='', flush=True)
-    try:
-        shelve_ = shelve.open(fname, 'r')
-    except:
-        # the file is being written now
+    if fname not in loaded:
         continue
+    means = loaded[fname]
     for scheduler in plotted:
-        mst = getmean(shelve_, old_names[scheduler])
+        # schedulers missing or being written are left out of means
+        mst = means.get(old_names[scheduler], np.nan)
         if args.normalize:
-            mst /= getmean(shelve_, old_names[args.normalize])
-        results[scheduler][sigma] = mst
-    shelve_.close()
+            mst /= means.get(old_names[args.normalize], np.nan)
+        if not np.isnan(mst):
+            results[scheduler][sigma] = mst
 
-print()
+if not any(results.values()):
+    sys.exit("no results to plot")
 
 fig = plt.figure(figsize=(8, 4.5))
 ax = fig.add_subplot(111)
@@ -113,7 +120,8 @@ else:
     ylabel = "Mean sojourn time"
 ax.set_ylabel(ylabel)
 for scheduler in plotted:
-    sched_results = sorted(results[scheduler].items())
+    if not results[scheduler]:
+        continue
     xs, ys = zip(*sorted(results[scheduler].items()))
     style = styles[scheduler]
     if args.linx:
@@ -140,8 +148,8 @@ ax.xaxis.set_ticklabels('0.125 0.25 0.5 1 2 4'.split())
     
 ax.yaxis.set_major_formatter(ScalarFormatter())
 
-minvs = min(min(vs) for vs in results.values())
-maxvs = max(max(vs) for vs in results.values())
+minvs = min(min(vs) for vs in results.values() if vs)
+maxvs = max(max(vs) for vs in results.values() if vs)
 
 ax.set_xlim(args.xmin if args.xmin is not None else minvs,
             args.xmax if args.xmax is not None else maxvs)
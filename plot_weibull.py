@@ -4,14 +4,18 @@ from __future__ import division
 
 import argparse
 import collections
+import functools
 import glob
-import shelve
 import os.path
+import sys
 
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter, ScalarFormatter, AutoLocator
 
+import analysis
+import result_loader
+
 names = ['FIFO', 'PS', 'SRPT', 'FSP', 'LAS', 'SRPTE', 'SRPTE+PS', 'SRPTE+LAS',
          'FSPE', 'FSPE+PS', 'FSPE+LAS']
 axes = 'shape sigma load timeshape njobs est_factor'.split()
@@ -66,10 +70,25 @@ parser.add_argument('--nofifo', default=False, action='store_true',
 parser.add_argument('--normal_error', default=False, action='store_true',
                     help="error function distributed according to a normal "
                     "rather than a log-normal")
+parser.add_argument('--metric', default='mean',
+                    help="'mean' for the mean sojourn time, or a quantile "
+                    "of sojourn time or slowdown over all runs such as "
+                    "'sojourn_p99' or 'slowdown_p99.9'; default: mean")
 parser.add_argument('--save', help="don't show but save in target filename")
+parser.add_argument('--list_inputs', default=False, action='store_true',
+                    help="only print the names of the result files that "
+                    "would be read (see make_figures.py)")
 args = parser.parse_args()
 
-
+if args.metric != 'mean':
+    tail_metric, _, percentile = args.metric.partition('_p')
+    try:
+        tail_p = float(percentile) / 100
+    except ValueError:
+        tail_p = None
+    if (tail_metric not in ('sojourn', 'slowdown') or tail_p is None
+            or not 0 <= tail_p <= 1):
+        parser.error("invalid metric {!r}".format(args.metric))
 
 if not args.est_factor and 'est_factor' != args.xaxis:
     axes.pop()
@@ -86,37 +105,52 @@ glob_str = os.path.join(args.dirname,
                         '{}_{}_[0-9.]*.s'.format(head, '_'.join(fname_regex)))
 fnames = glob.glob(glob_str)
 
-cache = shelve.open(os.path.join(args.dirname, 'cache.s'))
-def getmean(fname, scheduler):
-    key = '{}_mean_{}'.format(os.path.split(fname)[1], scheduler)
-    try:
-        return cache[key]
-    except KeyError:
-        shelve_ = shelve.open(fname, 'r')
-        mean = np.array(shelve_[scheduler]).mean()
-        shelve_.close()
-        cache[key] = mean
-        return mean
+if args.list_inputs:
+    print('\n'.join(fnames))
+    sys.exit()
 
+index = os.path.join(args.dirname, result_loader.INDEX)
 results = collections.defaultdict(lambda: collections.defaultdict(list))
-for fname in fnames:
-    print('.', end='', flush=True)
-    split = os.path.splitext(os.path.split(fname)[1])[0].split('_')[1:-1]
-    xval = float(split[xaxis_idx])
-    if args.xaxis == 'load':
-        xval = 1 - xval
+if args.metric == 'mean':
+    loaded = result_loader.load(fnames, result_loader.means, 'means', index)
+    data = result_loader.tidy(loaded, {'x': xaxis_idx + 1})
+    xvals = 1 - data['x'] if args.xaxis == 'load' else data['x']
+    missing = np.full(len(loaded), np.nan)
+
     for scheduler in plotted:
-        try:
-            mst = getmean(fname, scheduler)
-            if args.normalize:
-                mst = mst / getmean(fname, args.normalize)
-        except:
-            # the file is being written now
-            continue
-        results[scheduler][xval].append(mst)
-cache.close()
+        msts = data.get(scheduler, missing)
+        if args.normalize:
+            msts = msts / data.get(args.normalize, missing)
+        for xval, mst in zip(xvals.tolist(), msts.tolist()):
+            if not np.isnan(mst):
+                results[scheduler][xval].append(mst)
+else:
+    # sketches of all the files with the same x value are merged
+    loaded = result_loader.load(
+        fnames, functools.partial(
+            analysis.tail_sketches,
+            cachedir=os.environ.get('SCHEDSIM_WORKLOAD_CACHE')),
+        'tail_sketches', index)
+    sketches = collections.defaultdict(lambda: collections.defaultdict(list))
+    for fname, file_sketches in loaded.items():
+        xval = float(result_loader.fields(fname)[xaxis_idx + 1])
+        if args.xaxis == 'load':
+            xval = 1 - xval
+        for scheduler, sched_sketches in file_sketches.items():
+            if tail_metric in sched_sketches:
+                sketches[scheduler][xval].append(sched_sketches[tail_metric])
+
+    def tail(scheduler, xval):
+        merged = analysis.merge(sketches[scheduler].get(xval, []))
+        return float(merged.quantile(tail_p))
 
-print()
+    for scheduler in plotted:
+        for xval in sketches[scheduler]:
+            value = tail(scheduler, xval)
+            if args.normalize:
+                value /= tail(args.normalize, xval)
+            if not np.isnan(value):
+                results[scheduler][xval].append(value)
 
 def load_linformat(x, pos):
     return str(1 - x)
@@ -125,10 +159,12 @@ load_linformatter = FuncFormatter(load_linformat)
 fig = plt.figure(figsize=(8, 4.5))
 ax = fig.add_subplot(111)
 ax.set_xlabel(args.xaxis)
-if args.normalize:
-    ylabel = "MST / MST({})".format(args.normalize)
+if args.metric == 'mean':
+    ylabel = "MST" if args.normalize else "Mean sojourn time"
 else:
-    ylabel = "Mean sojourn time"
+    ylabel = "p{} {}".format(percentile, tail_metric)
+if args.normalize:
+    ylabel = "{0} / {0}({1})".format(ylabel, args.normalize)
 ax.set_ylabel(ylabel)
 for scheduler in plotted:
     sched_results = sorted(results[scheduler].items())
@@ -3,16 +3,16 @@
 from __future__ import division
 
 import argparse
-import collections
+import functools
 import glob
-import shelve
 import os.path
+import sys
 
-import numpy as np
 import matplotlib.pyplot as plt
 
+import analysis
 import plot_helpers
-import weibull_workload
+import result_loader
 
 axes = 'shape sigma load timeshape njobs'.split()
 
@@ -53,7 +53,13 @@ parser.add_argument('--nolegend', default=False, action='store_true',
                     help="don't put a legend in the plot")
 parser.add_argument('--legend_loc', default=0,
                     help="location for the legend (see matplotlib doc)")
+parser.add_argument('--quantile', type=float,
+                    help="plot this quantile of slowdown (e.g., 0.99) "
+                    "rather than the mean")
 parser.add_argument('--save', help="don't show but save in target filename")
+parser.add_argument('--list_inputs', default=False, action='store_true',
+                    help="only print the names of the result files that "
+                    "would be read (see make_figures.py)")
 args = parser.parse_args()
 
 fname_regex = [str(getattr(args, ax)) for ax in axes]
@@ -61,41 +67,33 @@ glob_str = os.path.join(args.dirname,
                         'res_{}_[0-9.]*.s'.format('_'.join(fname_regex)))
 fnames = glob.glob(glob_str)
 
-def sizes(seed):
-    gen = weibull_workload.workload(args.shape, args.load, args.njobs,
-                                    args.timeshape, seed)
-    return [size for _, size in gen]
-
-results = collections.defaultdict(list)
-for fname in fnames:
-    print('.', end='', flush=True)
-    seed = int(os.path.splitext(fname)[0].split('_')[-1])
-    job_sizes = sizes(seed)
-    try:
-        shelve_ = shelve.open(fname, 'r')
-    except:
-        # the file is being written now
-        continue
-    else:
-        for scheduler in plotted:
-            for sojourns in shelve_[scheduler]:
-                pairs = ((size, sojourn / size)
-                         for sojourn, size in zip(sojourns, job_sizes))
-                results[scheduler].extend(pairs)
-
-print()
+if args.list_inputs:
+    print('\n'.join(fnames))
+    sys.exit()
+
+loaded = result_loader.load(
+    fnames, functools.partial(
+        analysis.size_buckets, schedulers=plotted,
+        cachedir=os.environ.get('SCHEDSIM_WORKLOAD_CACHE')),
+    'size_buckets:' + ','.join(plotted),
+    os.path.join(args.dirname, result_loader.INDEX))
+results = {scheduler: analysis.SizeBuckets() for scheduler in plotted}
+for buckets in loaded.values():
+    for scheduler, sched_buckets in buckets.items():
+        results[scheduler] += sched_buckets
 
 fig = plt.figure(figsize=(8, 4.5))
 ax = fig.add_subplot(111)
 ax.set_xlabel("job size")
-ax.set_ylabel("slowdown")
+if args.quantile is None:
+    ax.set_ylabel("slowdown")
+else:
+    ax.set_ylabel("slowdown ({} quantile)".format(args.quantile))
 for scheduler in plotted:
-    pairs = results[scheduler]
-    pairs.sort()
-    pairs = np.array(pairs)
-    indexes = np.linspace(0, len(pairs), 101)
-    xs, ys = zip(*(pairs[ileft:iright].mean(0)
-                   for ileft, iright in zip(indexes[:-1], indexes[1:])))
+    if args.quantile is None:
+        xs, ys = results[scheduler].means()
+    else:
+        xs, ys = results[scheduler].quantiles(args.quantile)
     style = styles[scheduler]
     label = 'PSBS' if scheduler == 'FSPE+PS' else scheduler
     ax.loglog(xs, ys, style, label=label, linewidth=3,
@@ -4,15 +4,17 @@ from __future__ import division
 
 import argparse
 import collections
+import functools
 import glob
-import shelve
 import os.path
+import sys
 
 import numpy as np
 import matplotlib.pyplot as plt
 
+import analysis
 import plot_helpers
-import weibull_workload
+import result_loader
 
 axes = 'shape sigma load timeshape njobs'.split()
 
@@ -50,6 +52,9 @@ parser.add_argument('--normal_error', default=False, action='store_true',
 parser.add_argument('--alt_schedulers', default=False, action='store_true',
                      help="plot schedulers that are variants of FSPE+PS")
 parser.add_argument('--save', help="don't show but save in target filename")
+parser.add_argument('--list_inputs', default=False, action='store_true',
+                    help="only print the names of the result files that "
+                    "would be read (see make_figures.py)")
 args = parser.parse_args()
 
 if args.alt_schedulers:
@@ -75,29 +80,20 @@ glob_str = os.path.join(args.dirname,
                         '{}_{}_[0-9.]*.s'.format(head, '_'.join(fname_regex)))
 fnames = glob.glob(glob_str)
 
-def sizes(seed):
-    gen = weibull_workload.workload(args.shape, args.load, args.njobs,
-                                    args.timeshape, seed)
-    return [size for _, size in gen]
+if args.list_inputs:
+    print('\n'.join(fnames))
+    sys.exit()
 
+loaded = result_loader.load(
+    fnames, functools.partial(
+        analysis.slowdown_sketches, schedulers=plotted,
+        cachedir=os.environ.get('SCHEDSIM_WORKLOAD_CACHE')),
+    'slowdown_sketches:' + ','.join(plotted),
+    os.path.join(args.dirname, result_loader.INDEX))
 results = collections.defaultdict(list)
-for fname in fnames:
-    print('.', end='', flush=True)
-    seed = int(os.path.splitext(fname)[0].split('_')[-1])
-    job_sizes = sizes(seed)
-    try:
-        shelve_ = shelve.open(fname, 'r')
-    except:
-        # the file is being written now
-        continue
-    else:
-        for scheduler in plotted:
-            for sojourns in shelve_[scheduler]:
-                slowdowns = (sojourn / size
-                             for sojourn, size in zip(sojourns, job_sizes))
-                results[scheduler].extend(slowdowns)
-
-print()
+for sketches in loaded.values():
+    for scheduler, sketch in sketches.items():
+        results[scheduler].append(sketch)
 
 fig = plt.figure(figsize=(8, 4.5))
 ax = fig.add_subplot(111)
@@ -105,13 +101,7 @@ ax.set_xlabel("slowdown")
 ax.set_ylabel("ECDF")
 ys = np.linspace(max(0, args.ymin), min(1, args.ymax), 100)
 for scheduler in plotted:
-    slowdowns = results[scheduler]
-    slowdowns.sort()
-    last_idx = len(slowdowns) - 1
-    indexes = np.linspace(max(0, args.ymin) * last_idx,
-                          min(1, args.ymax) * last_idx,
-                          100).astype(int)
-    xs = [slowdowns[idx] for idx in indexes]
+    xs = analysis.merge(results[scheduler]).quantile(ys)
     style = styles[scheduler]
     label = 'PSBS' if scheduler == 'FSPE+PS' else scheduler
     ax.semilogx(xs, ys, style, label=label, linewidth=4,
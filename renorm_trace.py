@@ -1,33 +1,179 @@
 #!/usr/bin/env python3
 
+"""Renormalize a trace in two passes over fixed-size chunks.
+
+The first pass computes the totals needed to rescale the trace, the
+second one rewrites it; memory usage only depends on the chunk size, so
+traces larger than RAM can be renormalized. Input and output can be
+whitespace-separated tables of (submission time, size[, estimation])
+rows or binary traces (see binary_trace.py).
+"""
+
 import argparse
+import itertools
+import os
+import shutil
 import sys
+import tempfile
 
 import numpy as np
 
-parser = argparse.ArgumentParser(description="Renormalize trace by scaling "
-                                 "job size to obtain the desired load; "
-                                 "shift submission times to have the first "
-                                 "value at 0")
-parser.add_argument('load', type=float, help="desired load")
-parser.add_argument('--input', help="input file (stdin if omitted)")
-parser.add_argument('--output', help="output file (stdout if omitted)")
-parser.add_argument('--renorm_estimations', choices=['proportional', 'total'],
-                    help="renormalize the estimations as well: if "
-                    "'proportional', they will be rescaled by the same factor "
-                    "of sizes; if 'total', the sum of estimations will "
-                    "be equal to the sum of job sizes")
-args = parser.parse_args()
-
-schedule = np.loadtxt(args.input if args.input is not None else sys.stdin)
-
-schedule[:, 0] -= schedule[0, 0]
-factor = schedule[-1, 0] * args.load / schedule[:, 1].sum()
-schedule[:, 1] *= factor
-if args.renorm_estimations == 'proportional':
-    schedule[:, 2] *= factor
-elif args.renorm_estimations == 'total':
-    schedule[:, 2] *= schedule[:, 1].sum() / schedule[:, 2].sum()
-
-np.savetxt(args.output if args.output is not None else sys.stdout,
-           schedule)
+import binary_trace
+
+
+def text_chunks(fname, chunk_size):
+    with open(fname) as f:
+        while True:
+            lines = [line for line in itertools.islice(f, chunk_size)
+                     if line.strip()]
+            if not lines:
+                break
+            yield np.loadtxt(lines, ndmin=2)
+
+
+def binary_chunks(trace, chunk_size):
+    columns = [trace.t, trace.size]
+    if trace.estimate is not None:
+        columns.append(trace.estimate)
+    for start in range(0, len(trace.t), chunk_size):
+        yield np.column_stack([c[start:start + chunk_size] for c in columns])
+
+
+def totals(chunks):
+    """First pass: return (n, first t, last t, sum of sizes, sum of
+    estimations, number of columns)."""
+
+    n, first, last, size_sum, est_sum, ncols = 0, None, None, 0, 0, None
+    for chunk in chunks:
+        if first is None:
+            first, ncols = chunk[0, 0], chunk.shape[1]
+        n += len(chunk)
+        last = chunk[-1, 0]
+        size_sum += chunk[:, 1].sum()
+        if ncols > 2:
+            est_sum += chunk[:, 2].sum()
+    return n, first, last, size_sum, est_sum, ncols
+
+
+def renormalize(chunks, first, factor, est_factor):
+    """Second pass: shift times to start at 0 and rescale sizes and (if
+    est_factor is not None) estimations."""
+
+    for chunk in chunks:
+        chunk[:, 0] -= first
+        chunk[:, 1] *= factor
+        if est_factor is not None:
+            chunk[:, 2] *= est_factor
+        yield chunk
+
+
+def write_binary(fname, chunks, n, estimate, source=None):
+    # job ids (and names) are copied from source if it's a binary trace
+    names_len = None
+    if source is not None and source.names is not None:
+        names_len = len(source.names.table)
+    trace = binary_trace.create(fname, n, estimate, names_len)
+    start = 0
+    for chunk in chunks:
+        end = start + len(chunk)
+        trace.t[start:end] = chunk[:, 0]
+        trace.size[start:end] = chunk[:, 1]
+        if estimate:
+            trace.estimate[start:end] = chunk[:, 2]
+        if source is None:
+            trace.jobid[start:end] = np.arange(start, end)
+        else:
+            trace.jobid[start:end] = source.jobid[start:end]
+        start = end
+    if names_len is not None:
+        trace.names.offsets[:] = source.names.offsets
+        trace.names.table[:] = source.names.table
+    binary_trace.flush(trace)
+
+
+def renorm_file(fname, output, load, renorm_estimations=None,
+                chunk_size=2 ** 20):
+    """Renormalize the trace in fname to the given load, writing it to
+    output (stdout if None); see main() for renorm_estimations.
+
+    Raises ValueError if the trace can't be renormalized.
+    """
+
+    if (output is not None and os.path.exists(output)
+            and os.path.samefile(fname, output)):
+        # the input is read again while the output is written
+        raise ValueError("the output file must differ from the input file")
+
+    source = None
+    if binary_trace.is_trace(fname):
+        source = binary_trace.read(fname)
+        chunks = lambda: binary_chunks(source, chunk_size)
+    else:
+        chunks = lambda: text_chunks(fname, chunk_size)
+
+    n, first, last, size_sum, est_sum, ncols = totals(chunks())
+    if n == 0:
+        raise ValueError("empty trace")
+    if renorm_estimations and ncols < 3:
+        raise ValueError("the trace has no estimations")
+    factor = (last - first) * load / size_sum
+    if renorm_estimations == 'proportional':
+        est_factor = factor
+    elif renorm_estimations == 'total':
+        est_factor = factor * size_sum / est_sum
+    else:
+        est_factor = None
+
+    renormalized = renormalize(chunks(), first, factor, est_factor)
+    if output is not None and output.endswith('.trace'):
+        write_binary(output, renormalized, n, ncols > 2, source)
+    else:
+        out = open(output, 'wb') if output is not None else sys.stdout.buffer
+        for chunk in renormalized:
+            np.savetxt(out, chunk)
+        out.flush()
+        if output is not None:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Renormalize trace by "
+                                     "scaling job size to obtain the desired "
+                                     "load; shift submission times to have "
+                                     "the first value at 0")
+    parser.add_argument('load', type=float, help="desired load")
+    parser.add_argument('--input', help="input file (stdin if omitted); "
+                        "binary traces are recognized automatically")
+    parser.add_argument('--output', help="output file (stdout if omitted); "
+                        "written as a binary trace if its name ends in "
+                        ".trace")
+    parser.add_argument('--renorm_estimations',
+                        choices=['proportional', 'total'],
+                        help="renormalize the estimations as well: if "
+                        "'proportional', they will be rescaled by the same "
+                        "factor of sizes; if 'total', the sum of estimations "
+                        "will be equal to the sum of job sizes")
+    parser.add_argument('--chunk_size', type=int, default=2 ** 20,
+                        help="number of jobs processed at a time; default "
+                        "is 2^20")
+    args = parser.parse_args()
+
+    spooled = None
+    if args.input is None:
+        # we need two passes: spool stdin to a temporary file
+        fd, spooled = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(sys.stdin.buffer, f)
+    fname = spooled if spooled is not None else args.input
+
+    try:
+        renorm_file(fname, args.output, args.load, args.renorm_estimations,
+                    args.chunk_size)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if spooled is not None:
+            os.remove(spooled)
+
+if __name__ == '__main__':
+    main()
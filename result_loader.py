@@ -0,0 +1,207 @@
+"""Parallel, incremental loading of result files for the plot scripts.
+
+A summary of each result file (e.g., the mean sojourn time of each
+scheduler) is computed by a pool of processes, and stored in an index
+together with the modification time and size of the file: plotting again
+only reads the files that are new or have changed since. The results of
+schedulers that an experiment driver is writing (see
+experiment_helpers.updating) are left out.
+"""
+
+from __future__ import division, print_function
+
+import collections
+import contextlib
+import dbm
+import fcntl
+import functools
+import multiprocessing
+import os
+import shelve
+import sys
+
+import numpy
+
+# key of result files with the names of the schedulers whose results are
+# being written
+PENDING = 'pending'
+
+# name of the index in result directories
+INDEX = 'index.s'
+
+# files that a shelf can be made of, depending on the dbm backend
+_SUFFIXES = '', '.db', '.dat', '.dir', '.pag'
+
+
+def signature(fname):
+    """Names, modification times and sizes of the files of a shelf."""
+
+    res = []
+    for suffix in _SUFFIXES:
+        try:
+            stat = os.stat(fname + suffix)
+        except OSError:
+            continue
+        res.append((suffix, stat.st_mtime, stat.st_size))
+    return tuple(res)
+
+
+class _Without(collections.abc.Mapping):
+    # read-only view of a shelf without some keys
+
+    def __init__(self, shelf, hidden):
+        self.shelf = shelf
+        self.hidden = set(hidden)
+
+    def __getitem__(self, key):
+        if key in self.hidden:
+            raise KeyError(key)
+        return self.shelf[key]
+
+    def __iter__(self):
+        return (key for key in self.shelf if key not in self.hidden)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def _summarize(summarize, fname):
+    # returns (summarize(fname, shelf), whether some schedulers were left
+    # out), or None if the file can't be read
+    try:
+        shelf = shelve.open(fname, 'r')
+    except dbm.error:
+        # missing, or with gdbm, locked by the experiment writing it
+        return None
+    try:
+        pending = shelf.get(PENDING, ())
+        if pending:
+            return summarize(fname, _Without(shelf, pending)), True
+        return summarize(fname, shelf), False
+    finally:
+        shelf.close()
+
+
+@contextlib.contextmanager
+def _index(index):
+    # several plot scripts may use the same index at once (see
+    # make_figures.py): the lock is only held while reading or updating it
+    if index is None:
+        yield {}
+        return
+    with open(index + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        shelf = shelve.open(index)
+        try:
+            yield shelf
+        finally:
+            shelf.close()
+
+
+def load(fnames, summarize, kind, index=None, processes=None):
+    """Return {fname: summary} for the result files in fnames.
+
+    summarize(fname, shelf) returns the summary of a result file; it is
+    run in a process pool, so it must be picklable (e.g., a module-level
+    function, or a functools.partial of one). kind is a string identifying
+    summaries of the same type (and parameters) in the index, which is
+    the name of a shelve file: if it is not None, summaries are stored
+    there and reused for files that did not change. processes is the
+    number of processes to use (default: one per CPU).
+    """
+
+    res, todo = {}, []
+    with _index(index) as index_:
+        for fname in fnames:
+            key = '{}:{}'.format(kind, os.path.abspath(fname))
+            # taken before reading the file: if it changes while we read
+            # it, it will be read again next time
+            sig = signature(fname)
+            cached = index_.get(key)
+            if cached is not None and cached[0] == sig:
+                res[fname] = cached[1]
+            else:
+                todo.append((fname, key, sig))
+
+    worker = functools.partial(_summarize, summarize)
+    todo_fnames = [fname for fname, _, _ in todo]
+    pool = None
+    if len(todo) > 1 and processes != 1:
+        pool = multiprocessing.Pool(processes)
+        summaries = pool.imap(worker, todo_fnames)
+    else:
+        summaries = map(worker, todo_fnames)
+    new, missing, partial = {}, 0, 0
+    try:
+        for (fname, key, sig), res_partial in zip(todo, summaries):
+            print('.', end='', flush=True)
+            if res_partial is None:
+                missing += 1
+                continue
+            summary, is_partial = res_partial
+            partial += is_partial
+            new[key] = sig, summary
+            res[fname] = summary
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if new:
+        with _index(index) as index_:
+            index_.update(new)
+    print()
+    if missing:
+        print("skipped {} result files that could not be read (missing, or "
+              "locked by a running experiment)".format(missing),
+              file=sys.stderr)
+    if partial:
+        print("left out the schedulers being written in {} result "
+              "files".format(partial), file=sys.stderr)
+    return res
+
+
+def scheduler_names(shelf):
+    """Names of the schedulers in a result file."""
+
+    # sojourn times are lists of runs, unlike the other values
+    return [key for key, value in shelf.items()
+            if isinstance(value, list) and value]
+
+
+def means(fname, shelf, schedulers=None):
+    """{scheduler: mean sojourn time over all runs} for a result file.
+
+    By default, all schedulers in the file are considered.
+    """
+
+    if schedulers is None:
+        schedulers = scheduler_names(shelf)
+    return {scheduler: numpy.array(shelf[scheduler]).mean()
+            for scheduler in schedulers if shelf.get(scheduler)}
+
+
+def fields(fname):
+    """Parameters encoded in the name of a result file, as strings."""
+
+    return os.path.splitext(os.path.basename(fname))[0].split('_')
+
+
+def tidy(loaded, params):
+    """Turn the {fname: {metric: value}} result of load() into a dict of
+    arrays with one element per file.
+
+    params is a {name: index} dict of parameters to be parsed as floats
+    from the fields() of file names; metrics missing for a file are NaN.
+    """
+
+    fnames = sorted(loaded)
+    res = collections.OrderedDict()
+    for name, idx in params.items():
+        res[name] = numpy.array([float(fields(fname)[idx])
+                                 for fname in fnames])
+    metrics = sorted({metric for summary in loaded.values()
+                      for metric in summary})
+    for metric in metrics:
+        res[metric] = numpy.array([loaded[fname].get(metric, numpy.nan)
+                                   for fname in fnames])
+    return res
@@ -15,6 +15,10 @@ class Scheduler:
     def next_internal_event(self):
         return None
 
+    def gauges(self):
+        """Scheduler-specific counters, sampled by simulator.Sampler."""
+        return {}
+
 
 class PS(Scheduler):
     def __init__(self):
@@ -161,6 +165,9 @@ class SRPT_plus_PS(Scheduler):
         share = 1 / len(scheduled)
         return {jobid: share for jobid in scheduled}
 
+    def gauges(self):
+        return {'late': len(self.late)}
+
     def enqueue(self, t, jobid, job_size):
         self.update(t)
         heappush(self.jobs, [job_size, jobid])
@@ -212,6 +219,9 @@ class FSP(Scheduler):
         # (deals with floating point imprecision)
         self.eps = eps
 
+    def gauges(self):
+        return {'late': len(self.late), 'virtual': len(self.queue)}
+
     def enqueue(self, t, jobid, size):
         self.update(t)  # needed to age only existing jobs in the virtual queue
         insort(self.queue, [size, jobid])
@@ -463,6 +473,9 @@ class SRPT_plus_LAS(Scheduler):
         # last result of calling the schedule function
         self.scheduled = {}
 
+    def gauges(self):
+        return {'late': len(self.late)}
+
     def enqueue(self, t, jobid, size):
 
         size_int = intceil(size / self.eps)
@@ -604,6 +617,9 @@ class FSP_plus_LAS(Scheduler):
         # last result of calling the schedule function
         self.scheduled = {}
 
+    def gauges(self):
+        return {'late': len(self.late), 'virtual': len(self.queue)}
+
     def enqueue(self, t, jobid, size):
 
         self.update(t)  # needed to age only existing jobs in the virtual queue
@@ -769,6 +785,10 @@ class PSBS(Scheduler):
         # equivalent to sum(w for _, _, w in queue + early)
         self.virtual_w = 0
 
+    def gauges(self):
+        return {'late': len(self.late),
+                'virtual': len(self.queue) + len(self.early)}
+
     def enqueue(self, t, jobid, size, w=1):
 
         if w <= 0:
@@ -909,6 +929,9 @@ class WSRPTE_GPS(Scheduler):
             schedule[jobid] = w / tot_w
         return schedule
 
+    def gauges(self):
+        return {'late': len(self.late)}
+
     def enqueue(self, t, jobid, job_size, w=1):
         self.update(t)
         heappush(self.jobs, [job_size / w, w, jobid])
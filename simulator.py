@@ -1,93 +1,231 @@
 from __future__ import division
 
+import functools
+import os
+import pickle
 import random
+import time
 
+from array import array
 from heapq import heapify, heappop, heappush
 
+import memory_usage
 import schedulers
 
 ARRIVAL, COMPLETE, INTERNAL = 0, 1, 2
 eps = 0.001
 rand = random.Random()
 
+# with a time budget or checkpoints, run() looks at the clock once every
+# this many events
+CLOCK_EVERY = 1024
+
 
 def identity(x):
     return x
 
 
-def lognorm_error(sigma, factor=1):
-    def err_func(x):
-        return factor * x * rand.lognormvariate(0, sigma)
-    return err_func
+# Error functions are partial applications of module-level functions (rather
+# than closures) so that they can be pickled in simulation checkpoints.
 
+def _lognorm_error(sigma, factor, x):
+    return factor * x * rand.lognormvariate(0, sigma)
 
-def normal_error(sigma, factor=1):
-    def err_func(x):
-        while True:
-            res = factor * x * rand.gauss(1, sigma)
-            if res >= 0:
-                return res
-    return err_func
 
+def lognorm_error(sigma, factor=1):
+    return functools.partial(_lognorm_error, sigma, factor)
 
-def fixed_estimations(estimations):
-    estimations_i = iter(estimations)
 
-    def err_func(x):
-        return next(estimations_i)
-    return err_func
+def _normal_error(sigma, factor, x):
+    while True:
+        res = factor * x * rand.gauss(1, sigma)
+        if res >= 0:
+            return res
 
 
-def simulator(jobs, scheduler_factory=schedulers.PS,
-              size_estimation=identity, priorities=None):
+def normal_error(sigma, factor=1):
+    return functools.partial(_normal_error, sigma, factor)
 
-    events = [(t, ARRIVAL, (jobid, size)) for jobid, t, size in jobs]
-    heapify(events)  # not needed if jobs are sorted by arrival time
-    remaining = {}   # mapping jobid to remaining size
-    schedule = {}    # mapping from jobid to resource ratio -- values
-                     # should add up to <= 1
-    scheduler = scheduler_factory()
 
-    last_t = 0
+def _fixed_estimation(estimations_i, x):
+    return next(estimations_i)
 
-    if priorities is not None:
-        def enqueue(t, jobid, size):
-            scheduler.enqueue(t, jobid, size, priorities[jobid])
-    else:
-        def enqueue(t, jobid, size):
-            scheduler.enqueue(t, jobid, size)
-        
 
-    while events:  # main loop
+def fixed_estimations(estimations):
+    return functools.partial(_fixed_estimation, iter(estimations))
+
+
+class BudgetExceeded(Exception):
+    """Raised by simulator() when its time or event budget is exhausted.
+
+    Completions yielded before the exception are valid.
+    """
+
+
+class Sampler(object):
+    """Time series of the state of a simulation.
+
+    Samples are taken every interval units of simulated time or, if every
+    is given, after every `every` events. Each sample records the time,
+    the number of jobs in the system, the number of scheduled jobs, the
+    total remaining work and the gauges() of the scheduler (e.g., the
+    number of late jobs). Samples are stored by column, as arrays of
+    doubles in the columns dictionary; a column appearing after the first
+    samples, or missing from some of them, has NaN there. The simulation
+    keeps track of the total remaining work, so that, apart from the
+    gauges, taking a sample costs constant time.
+
+    If memory is True, samples also record the bytes used by each data
+    structure of the simulation (see memory_usage.structure_sizes), in
+    'bytes_'-prefixed columns, and the memory traced by tracemalloc, if
+    it is tracing, in the 'traced' column. This is slow for large
+    simulations: sample accordingly.
+    """
+
+    def __init__(self, interval=None, every=None, memory=False):
+        if (interval is None) == (every is None):
+            raise ValueError("sample either every interval or every events")
+        self.interval = interval
+        self.every = every
+        self.next_t = 0
+        self.countdown = every
+        self.memory = memory
+        self.columns = None
+
+    def observe(self, simulation, t):
+        """Called before processing the event at time t: the state of
+        simulation is the one it has since simulation.last_t."""
+
+        if self.every is not None:
+            self.countdown -= 1
+            if not self.countdown:
+                self.countdown = self.every
+                self.record(simulation, simulation.last_t)
+        else:
+            while self.next_t < t:
+                self.record(simulation, self.next_t)
+                self.next_t += self.interval
+
+    def record(self, simulation, t):
+        """Record the state of simulation at time t, between its last event
+        and the next one."""
+
+        gauges = simulation.scheduler.gauges()
+        if self.memory:
+            import tracemalloc  # not in Python 2
+            for name, size in memory_usage.structure_sizes(
+                    simulation).items():
+                gauges['bytes_' + name] = size
+            if tracemalloc.is_tracing():
+                gauges['traced'], _ = tracemalloc.get_traced_memory()
+        # remaining sizes are only updated when events are processed
+        elapsed = t - simulation.last_t
+        sample = [('t', t), ('jobs', len(simulation.remaining)),
+                  ('scheduled', len(simulation.schedule)),
+                  ('work', simulation.work - elapsed * simulation.rate)]
+        sample += sorted(gauges.items())
+        n = len(self)
+        if self.columns is None:
+            self.columns = {}
+        columns = self.columns
+        for name, value in sample:
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = array('d', [float('nan')] * n)
+            column.append(value)
+        for name, column in columns.items():
+            if len(column) == n:  # not in gauges
+                column.append(float('nan'))
+
+    def __len__(self):
+        return len(self.columns['t']) if self.columns else 0
+
+
+class Simulation(object):
+    """State of a simulation: the event heap, remaining sizes, current
+    schedule and scheduler.
+
+    Simulations can be saved to disk with checkpoint() and restored with
+    restore(): a restored simulation yields the same completions that the
+    original one would have yielded. This requires size_estimation to be
+    picklable, which is the case for the error functions in this module.
+    """
+
+    def __init__(self, jobs, scheduler_factory=schedulers.PS,
+                 size_estimation=identity, priorities=None,
+                 record_completions=False, sampler=None):
+
+        events = [(t, ARRIVAL, (jobid, size)) for jobid, t, size in jobs]
+        heapify(events)  # not needed if jobs are sorted by arrival time
+        self.events = events
+        self.remaining = {}  # mapping jobid to remaining size
+        self.schedule = {}   # mapping from jobid to resource ratio --
+                             # values should add up to <= 1
+        self.scheduler = scheduler_factory()
+        self.size_estimation = size_estimation
+        self.priorities = priorities
+        self.last_t = 0
+        self.n_events = 0
+
+        # total remaining size, and sum of the resource ratios in schedule
+        self.work = 0
+        self.rate = 0
+
+        # if not None, list of all (t, jobid) completions so far: it
+        # survives checkpoints, unlike what has been yielded by run()
+        self.completions = [] if record_completions else None
+
+        # if not None, a Sampler recording the state of the simulation
+        self.sampler = sampler
+
+    def step(self):
+        """Process the next event; return (t, jobid) if a job completes."""
+
+        events = self.events
+        remaining = self.remaining
+        scheduler = self.scheduler
+        completion = None
 
         t, event_type, event_data = heappop(events)
+        self.n_events += 1
 
-        delta = t - last_t
+        if self.sampler is not None:
+            self.sampler.observe(self, t)
+
+        delta = t - self.last_t
 
         # update remaining sizes
 
-        for jobid, resources in schedule.items():
+        for jobid, resources in self.schedule.items():
             remaining[jobid] -= delta * resources
             #assert remaining[jobid] > -eps
+        self.work -= delta * self.rate
 
         # process event (and call the scheduler)
 
         if event_type == ARRIVAL:
             jobid, size = event_data
             remaining[jobid] = size
-            enqueue(t, jobid, size_estimation(size))
+            self.work += size
+            estimation = self.size_estimation(size)
+            if self.priorities is not None:
+                scheduler.enqueue(t, jobid, estimation,
+                                  self.priorities[jobid])
+            else:
+                scheduler.enqueue(t, jobid, estimation)
         elif event_type == COMPLETE:
             jobid = event_data
             #assert -eps <= remaining[jobid] <= eps
-            yield t, jobid
-            del remaining[jobid]
+            completion = t, jobid
+            if self.completions is not None:
+                self.completions.append(completion)
+            self.work -= remaining.pop(jobid)
             scheduler.dequeue(t, jobid)
-        schedule = scheduler.schedule(t)
+        self.schedule = schedule = scheduler.schedule(t)
+        self.rate = sum(schedule.values())
 
         #assert sum(schedule.values()) < 1 + eps
         #assert not remaining or sum(schedule.values()) > 1 - eps
-        #if (scheduler_factory.__name__ == 'PS'):
-        #    assert set(schedule) == set(remaining)
 
         # if a job would terminate before next event, insert the
         # COMPLETE event
@@ -107,9 +245,6 @@ def simulator(jobs, scheduler_factory=schedulers.PS,
             except ValueError:  # no scheduled items
                 pass
             else:
-                #if (scheduler_factory.__name__ == 'FSP'
-                #    and size_estimation is identity):
-                #    assert schedule == {jobid: 1}
                 next_complete = t + next_delta
                 if not events or events[0][0] > next_complete:
                     if not candidate_event or next_time > next_complete:
@@ -118,6 +253,185 @@ def simulator(jobs, scheduler_factory=schedulers.PS,
         if candidate_event:
             heappush(events, candidate_event)
 
-        last_t = t
+        self.last_t = t
+
+        return completion
+
+    def run(self, max_events=None, time_budget=None, checkpoint_fname=None,
+            checkpoint_interval=600):
+        """Yield (t, jobid) completions until the simulation is over.
+
+        Raises BudgetExceeded if more than max_events events or
+        time_budget seconds are needed by this call (a resumed simulation
+        gets a new budget); if checkpoint_fname is given, the state is
+        saved there every checkpoint_interval seconds and when a budget is
+        exhausted. The clock is read every CLOCK_EVERY events, so time
+        budgets and checkpoint intervals can be overrun by that many
+        events.
+        """
+
+        if time_budget is not None:
+            deadline = time.time() + time_budget
+        if checkpoint_fname is not None:
+            next_checkpoint = time.time() + checkpoint_interval
+        if max_events is not None:
+            last_event = self.n_events + max_events
+        timed = time_budget is not None or checkpoint_fname is not None
+        clock_countdown = CLOCK_EVERY
+
+        while self.events:  # main loop
+
+            if max_events is not None and self.n_events >= last_event:
+                if checkpoint_fname is not None:
+                    self.checkpoint(checkpoint_fname)
+                raise BudgetExceeded("{} events processed".format(
+                    max_events))
+            if timed:
+                clock_countdown -= 1
+            if timed and not clock_countdown:
+                clock_countdown = CLOCK_EVERY
+                now = time.time()
+                if time_budget is not None and now > deadline:
+                    if checkpoint_fname is not None:
+                        self.checkpoint(checkpoint_fname)
+                    raise BudgetExceeded("{}s time budget exhausted".format(
+                        time_budget))
+                if checkpoint_fname is not None and now > next_checkpoint:
+                    self.checkpoint(checkpoint_fname)
+                    next_checkpoint = now + checkpoint_interval
+
+            completion = self.step()
+            if completion is not None:
+                yield completion
+
+        assert not self.remaining
+
+    def checkpoint(self, fname):
+        """Atomically save the simulation state (and that of rand)."""
+
+        tmp_fname = fname + '.tmp'
+        with open(tmp_fname, 'wb') as f:
+            pickle.dump((self, rand.getstate()), f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_fname, fname)
+
+    @staticmethod
+    def restore(fname):
+        """Load a simulation saved with checkpoint(); rand is restored too."""
+
+        with open(fname, 'rb') as f:
+            simulation, rand_state = pickle.load(f)
+        rand.setstate(rand_state)
+        return simulation
+
+
+def simulator(jobs, scheduler_factory=schedulers.PS,
+              size_estimation=identity, priorities=None,
+              max_events=None, time_budget=None, sampler=None):
+    simulation = Simulation(jobs, scheduler_factory, size_estimation,
+                            priorities, sampler=sampler)
+    return simulation.run(max_events, time_budget)
+
+
+def cosimulator(jobs, scheduler_factories, size_estimation=identity,
+                priorities=None):
+    """Simulate several schedulers on the same workload in a single pass.
+
+    Arrivals are read once and the size of each job is estimated once:
+    every scheduler sees the same estimation. Each scheduler has its own
+    remaining sizes, schedule and completion/internal events, which are
+    exactly those that simulator() would produce for it. Yields (t, jobid,
+    i) triples, where i is the index of the scheduler in
+    scheduler_factories.
+    """
+
+    arrivals = [(t, jobid, size) for jobid, t, size in jobs]
+    heapify(arrivals)  # not needed if jobs are sorted by arrival time
+    indexes = range(len(scheduler_factories))
+    scheduler_list = [factory() for factory in scheduler_factories]
+    remainings = [{} for _ in indexes]  # per-scheduler remaining sizes
+    schedules = [{} for _ in indexes]   # per-scheduler resource ratios
+    last_ts = [0 for _ in indexes]
+
+    # next COMPLETE or INTERNAL event of each scheduler; only set if it
+    # happens before the next arrival
+    pending = [None for _ in indexes]
+
+    def advance(i, t):
+        delta = t - last_ts[i]
+        remaining = remainings[i]
+        for jobid, resources in schedules[i].items():
+            remaining[jobid] -= delta * resources
+
+    def reschedule(i, t):
+        # same logic as in simulator()
+        scheduler = scheduler_list[i]
+        schedule = schedules[i] = scheduler.schedule(t)
+        next_arrival = arrivals[0][0] if arrivals else None
+
+        candidate_event = None
+        next_int = scheduler.next_internal_event()
+        if next_int is not None:
+            next_time = t + next_int
+            if next_arrival is None or next_time < next_arrival:
+                candidate_event = next_time, INTERNAL, None
+
+        remaining = remainings[i]
+        if remaining:
+            completions = ((remaining[jobid] / resources, jobid)
+                           for jobid, resources in schedule.items())
+            try:
+                next_delta, jobid = min(completions)
+            except ValueError:  # no scheduled items
+                pass
+            else:
+                next_complete = t + next_delta
+                if next_arrival is None or next_arrival > next_complete:
+                    if not candidate_event or next_time > next_complete:
+                        candidate_event = next_complete, COMPLETE, jobid
 
-    assert not remaining
+        pending[i] = candidate_event
+        last_ts[i] = t
+
+    while True:  # main loop
+
+        try:
+            t, i = min((event[0], i) for i, event in enumerate(pending)
+                       if event is not None)
+        except ValueError:  # no pending events
+            if not arrivals:
+                break
+            t, jobid, size = heappop(arrivals)
+            estimation = size_estimation(size)
+            for i in indexes:
+                advance(i, t)
+                remainings[i][jobid] = size
+                if priorities is not None:
+                    scheduler_list[i].enqueue(t, jobid, estimation,
+                                              priorities[jobid])
+                else:
+                    scheduler_list[i].enqueue(t, jobid, estimation)
+                reschedule(i, t)
+        else:
+            _, event_type, jobid = pending[i]
+            advance(i, t)
+            if event_type == COMPLETE:
+                yield t, jobid, i
+                del remainings[i][jobid]
+                scheduler_list[i].dequeue(t, jobid)
+            reschedule(i, t)
+
+    assert not any(remainings)
+
+
+def completion_matrix(jobs, scheduler_factories, size_estimation=identity,
+                      priorities=None):
+    """Completion times as a list with a row per job (in the order of jobs)
+    and a column per scheduler, computed with cosimulator()."""
+
+    jobs = list(jobs)
+    job_idxs = {jobid: idx for idx, (jobid, _, _) in enumerate(jobs)}
+    res = [[None] * len(scheduler_factories) for _ in job_idxs]
+    for t, jobid, i in cosimulator(jobs, scheduler_factories,
+                                   size_estimation, priorities):
+        res[job_idxs[jobid]][i] = t
+    return res
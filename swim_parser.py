@@ -3,27 +3,77 @@
 from __future__ import division, print_function
 
 import argparse
-import collections
+import os
+import tempfile
 
-SwimJob = collections.namedtuple('SwimJob', 'jobid t delta m s r')
-Job = collections.namedtuple('Job', 'jobid t size')
+import numpy
 
+# columns of SWIM .tsv files: jobid, submission time, inter-arrival time,
+# map input, shuffle and reduce output bytes
+COLUMNS = 'jobid t delta m s r'.split()
 
-def parse_swim(fname, d_over_n, load):
 
-    jobs = []
+def _parse(fname):
+    jobid = numpy.loadtxt(fname, dtype=str, delimiter='\t', usecols=0,
+                          ndmin=1)
+    values = numpy.loadtxt(fname, dtype=numpy.int64, delimiter='\t',
+                           usecols=range(1, len(COLUMNS)), ndmin=2)
+    columns = dict(zip(COLUMNS[1:], values.T.copy()))
+    columns['jobid'] = jobid
+    return columns
+
+
+def load_columns(fname):
+    """Return the columns of a SWIM .tsv file as a {name: array} dict.
+
+    The parsed columns are cached next to the file, in fname + '.npz', and
+    reused as long as the .tsv file is not modified.
+    """
+
+    stat = os.stat(fname)
+    signature = numpy.array([stat.st_mtime, stat.st_size])
+    cache = fname + '.npz'
+    try:
+        with numpy.load(cache) as cached:
+            if numpy.array_equal(cached['signature'], signature):
+                return {name: cached[name] for name in COLUMNS}
+    except (IOError, KeyError, ValueError):
+        pass
 
-    for line in open(fname):
-        values = line.strip().split('\t')
-        values[1:] = map(int, values[1:])
-        values = SwimJob(*values)
-        jobs.append(Job(values.jobid, values.t,
-                        values.m + (1 + d_over_n) * values.s + values.r))
+    columns = _parse(fname)
+    try:
+        fd, tmpname = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(fname)), suffix='.npz')
+    except (IOError, OSError):  # e.g., read-only directory: don't cache
+        return columns
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            numpy.savez(f, signature=signature, **columns)
+        os.rename(tmpname, cache)
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+    return columns
 
-    duration = jobs[-1].t
-    multiplier = load * duration / sum(j.size for j in jobs)
 
-    return [(j.jobid, j.t, j.size * multiplier) for j in jobs]
+def schedule(columns, d_over_n, load):
+    """Return (jobid, t, size) arrays for the columns of a SWIM workload.
+
+    Sizes are m + (1 + d_over_n) * s + r, scaled to obtain the given load.
+    """
+
+    size = columns['m'] + (1 + d_over_n) * columns['s'] + columns['r']
+    if not len(size):
+        return columns['jobid'], columns['t'], size.astype(float)
+    duration = columns['t'][-1]
+    # the builtin sum gives the same results as earlier versions
+    multiplier = load * duration / sum(size.tolist())
+    return columns['jobid'], columns['t'], size * multiplier
+
+
+def parse_swim(fname, d_over_n, load):
+    jobid, t, size = schedule(load_columns(fname), d_over_n, load)
+    return list(zip(jobid.tolist(), t.tolist(), size.tolist()))
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Output a job submission "
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""Synthesize arbitrarily long traces by bootstrapping a real one.
+
+Inter-arrival times are resampled in blocks of consecutive gaps (so that
+short-term burstiness is kept), and (size, estimation) pairs are
+resampled jointly, so that the size distribution and the error made by
+estimations are those of the source trace. Sizes can be smoothed by a
+log-normal kernel to avoid repeating exactly the same values, and are
+scaled to obtain the target load. Traces are generated in chunks and
+written to a binary trace (see binary_trace.py), so that their length is
+not bounded by memory.
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import sys
+
+import numpy
+
+import binary_trace
+import swim_parser
+
+
+def load(fname, fmt='auto', d_over_n=4, estimations=False, nojobid=False):
+    """Return (t, size, estimate) arrays of a trace; estimate may be None.
+
+    fmt is 'swim' for SWIM .tsv files, 'text' for schedules as read by
+    experiment.py; with 'auto', binary traces are recognized and .tsv files
+    are considered SWIM files. SWIM files have no load of their own: their
+    sizes are scaled as by swim_parser.schedule() for a load of 1.
+    """
+
+    if fmt == 'auto':
+        if binary_trace.is_trace(fname):
+            fmt = 'binary'
+        elif fname.endswith('.tsv'):
+            fmt = 'swim'
+        else:
+            fmt = 'text'
+    if fmt == 'binary':
+        trace = binary_trace.read(fname)
+        return trace.t, trace.size, trace.estimate
+    if fmt == 'swim':
+        _, t, size = swim_parser.schedule(swim_parser.load_columns(fname),
+                                          d_over_n, 1)
+        return t, size, None
+    t, size, estimate, _ = binary_trace.from_text(fname, estimations, nojobid)
+    return (numpy.asarray(t), numpy.asarray(size),
+            None if estimate is None else numpy.asarray(estimate))
+
+
+def synthesize(t, size, estimate, n, load=None, seed=None, block=1,
+               bandwidth=0, chunk_size=2 ** 20):
+    """Generate n jobs as (t, size, estimate) chunks; estimate is None if
+    the source trace has no estimations.
+
+    Blocks of block consecutive inter-arrival times are resampled from
+    the source. If bandwidth is positive, each resampled pair is
+    multiplied by exp(bandwidth * Z) with Z standard normal. If load is not
+    None, sizes and estimations are scaled so that the expected load is
+    load; otherwise the one of the source trace is kept.
+    """
+
+    order = numpy.argsort(t, kind='stable')
+    gaps = numpy.diff(numpy.asarray(t)[order])
+    size = numpy.asarray(size)
+    if estimate is not None:
+        estimate = numpy.asarray(estimate)
+    if len(gaps) < block:
+        raise ValueError("the source trace is too short for blocks of "
+                         "{} gaps".format(block))
+
+    factor = 1
+    if load is not None:
+        # E[exp(bandwidth * Z)] = exp(bandwidth ** 2 / 2)
+        expected_size = size.mean() * numpy.exp(bandwidth ** 2 / 2)
+        factor = load * gaps.mean() / expected_size
+
+    rng = numpy.random.default_rng(seed)
+    last_t = None
+    for start in range(0, n, chunk_size):
+        m = min(chunk_size, n - start)
+
+        nblocks = -(-m // block)
+        starts = rng.integers(0, len(gaps) - block + 1, nblocks)
+        idx = (starts[:, None] + numpy.arange(block)).ravel()[:m]
+        chunk_gaps = gaps[idx]
+        if last_t is None:  # the first job arrives at 0
+            chunk_gaps[0] = 0
+            last_t = 0
+        chunk_t = last_t + numpy.cumsum(chunk_gaps)
+        last_t = chunk_t[-1]
+
+        idx = rng.integers(0, len(size), m)
+        scale = factor
+        if bandwidth > 0:
+            scale = factor * numpy.exp(bandwidth * rng.standard_normal(m))
+        chunk_size_ = size[idx] * scale
+        chunk_estimate = None if estimate is None else estimate[idx] * scale
+        yield chunk_t, chunk_size_, chunk_estimate
+
+
+def write(fname, chunks, n, estimate):
+    """Write chunks of n jobs to a binary trace; return the realized load
+    (nan if n is 0)."""
+
+    trace = binary_trace.create(fname, n, estimate)
+    start, total = 0, 0
+    for t, size, est in chunks:
+        end = start + len(t)
+        trace.jobid[start:end] = numpy.arange(start, end)
+        trace.t[start:end] = t
+        trace.size[start:end] = size
+        if estimate:
+            trace.estimate[start:end] = est
+        total += size.sum()
+        start = end
+    binary_trace.flush(trace)
+    if n == 0:
+        return float('nan')
+    return total / trace.t[-1] if trace.t[-1] > 0 else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a large binary "
+                                     "trace by bootstrapping a real one")
+    parser.add_argument('input', help="source trace: SWIM .tsv file, binary "
+                        "trace or text schedule")
+    parser.add_argument('output', help="output binary trace")
+    parser.add_argument('njobs', type=int, help="number of jobs to generate")
+    parser.add_argument('--format', choices=['auto', 'swim', 'text'],
+                        default='auto', help="format of the input; default "
+                        "is to recognize binary traces and to parse .tsv "
+                        "files as SWIM files")
+    parser.add_argument('--d_over_n', type=float, default=4,
+                        help="d over n for SWIM files; default is 4")
+    parser.add_argument('--estimations', default=False, action='store_true',
+                        help="text files have estimations as last column")
+    parser.add_argument('--nojobid', default=False, action='store_true',
+                        help="text files do not have jobids")
+    parser.add_argument('--load', type=float, help="target load; default is "
+                        "the one of the source trace (1 for SWIM files, "
+                        "whose sizes are scaled for load 1)")
+    parser.add_argument('--block', type=int, default=1,
+                        help="length of the blocks of inter-arrival times "
+                        "resampled together; default is 1 (independent "
+                        "resampling)")
+    parser.add_argument('--bandwidth', type=float, default=0,
+                        help="sigma of the log-normal kernel used to smooth "
+                        "sizes; default is 0 (no smoothing)")
+    parser.add_argument('--seed', type=int, help="random seed")
+    parser.add_argument('--chunk_size', type=int, default=2 ** 20,
+                        help="number of jobs generated at a time; default "
+                        "is 2^20")
+    args = parser.parse_args()
+
+    t, size, estimate = load(args.input, args.format, args.d_over_n,
+                             args.estimations, args.nojobid)
+    try:
+        chunks = synthesize(t, size, estimate, args.njobs, args.load,
+                            args.seed, args.block, args.bandwidth,
+                            args.chunk_size)
+        realized = write(args.output, chunks, args.njobs,
+                         estimate is not None)
+    except ValueError as e:
+        parser.error(str(e))
+    print("realized load: {}".format(realized), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
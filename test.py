@@ -1,6 +1,37 @@
+import contextlib
+import functools
+import io
+import itertools
+import json
+import os
+import random
+import shelve
+import sys
+import tempfile
+import time
 import unittest
+import warnings
+import numpy
+import scipy.stats
+import analysis
+import arrivals
+import bench_schedulers
+import bench_simulator
+import binary_trace
+import difftest
+import estimations
+import experiment_helpers
+import make_figures
+import memory_usage
+import norta
+import renorm_trace
+import result_loader
 import schedulers
 import simulator
+import swim_parser
+import synth_trace
+import weibull_workload
+import workqueue
 
 
 def normalize(output):
@@ -133,5 +164,864 @@ class TestLAS(TestScheduler):
                                   (110, 'job1')])
 
 
+class TestBudget(unittest.TestCase):
+
+    jobs = [('job1', 0, 10), ('job2', 0, 10), ('job3', 5, 10)]
+
+    def test_max_events(self):
+        completions = []
+        sim = simulator.simulator(self.jobs, schedulers.FIFO, max_events=4)
+        with self.assertRaises(simulator.BudgetExceeded):
+            for completion in sim:
+                completions.append(completion)
+        self.assertEqual(completions, [(10, 'job1')])
+
+    def test_enough_events(self):
+        sim = simulator.simulator(self.jobs, schedulers.FIFO, max_events=6)
+        self.assertEqual(len(list(sim)), 3)
+
+    def test_time_budget(self):
+        # the clock is only read every CLOCK_EVERY events
+        jobs = [(i, i, 1) for i in range(2 * simulator.CLOCK_EVERY)]
+        simulation = simulator.Simulation(jobs, schedulers.FIFO)
+        with self.assertRaises(simulator.BudgetExceeded):
+            list(simulation.run(time_budget=0))
+        self.assertEqual(simulation.n_events, simulator.CLOCK_EVERY - 1)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    factories = [schedulers.SRPT, schedulers.FSP, schedulers.FSP_plus_PS,
+                 schedulers.LAS, schedulers.SRPT_plus_LAS,
+                 schedulers.FSP_plus_LAS, schedulers.PSBS]
+
+    def setUp(self):
+        rnd = random.Random(42)
+        t = 0
+        self.jobs = []
+        for i in range(200):
+            t += rnd.expovariate(1)
+            self.jobs.append((i, t, rnd.expovariate(1.1)))
+        fd, self.fname = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.fname)
+
+    def test_resume(self):
+        for factory in self.factories:
+            simulator.rand.seed(1)
+            error = simulator.lognorm_error(1)
+            expected = list(simulator.simulator(self.jobs, factory, error))
+
+            simulator.rand.seed(1)
+            simulation = simulator.Simulation(self.jobs, factory, error)
+            first = list(itertools.islice(simulation.run(), 50))
+            simulation.checkpoint(self.fname)
+            simulator.rand.seed(2)  # restore() resets it
+            resumed = simulator.Simulation.restore(self.fname)
+            self.assertEqual(first + list(resumed.run()), expected)
+
+    def test_resume_budget(self):
+        expected = list(simulator.simulator(self.jobs, schedulers.PS))
+        simulation = simulator.Simulation(self.jobs, schedulers.PS)
+        completions = []
+        with self.assertRaises(simulator.BudgetExceeded):
+            completions.extend(simulation.run(max_events=100,
+                                              checkpoint_fname=self.fname))
+        resumed = simulator.Simulation.restore(self.fname)
+        self.assertEqual(resumed.n_events, 100)
+        # the budget counts the events of this invocation only
+        completions.extend(resumed.run(max_events=1000))
+        self.assertEqual(completions, expected)
+
+
+class TestCosimulator(unittest.TestCase):
+
+    factories = [schedulers.FIFO, schedulers.PS, schedulers.SRPT,
+                 schedulers.FSP, schedulers.LAS]
+
+    jobs = [('job1', 0, 15), ('job2', 0, 10), ('job3', 10, 10),
+            ('job4', 20, 10), ('job5', 22, 1), ('job6', 60, 5)]
+
+    estimations = [10, 20, 5, 10, 3, 5]
+
+    def test_same_as_simulator(self):
+        matrix = simulator.completion_matrix(
+            self.jobs, self.factories,
+            simulator.fixed_estimations(self.estimations))
+        for i, factory in enumerate(self.factories):
+            sim = simulator.simulator(
+                self.jobs, factory,
+                simulator.fixed_estimations(self.estimations))
+            completions = dict((jobid, t) for t, jobid in sim)
+            self.assertEqual([row[i] for row in matrix],
+                             [completions[jobid] for jobid, _, _ in self.jobs])
+
+    def test_empty(self):
+        self.assertEqual(list(simulator.cosimulator([], self.factories)), [])
+
+
+class TestWeibullWorkload(unittest.TestCase):
+
+    def test_arrays(self):
+        times, sizes = weibull_workload.workload_arrays(0.5, 0.9, 1000,
+                                                        seed=1)
+        self.assertEqual(times[0], 0)
+        self.assertTrue((times[1:] >= times[:-1]).all())
+        self.assertAlmostEqual(sizes.sum() / times[-1], 0.9)
+        times2, sizes2 = weibull_workload.workload_arrays(0.5, 0.9, 1000,
+                                                          seed=1)
+        self.assertEqual(times.tolist(), times2.tolist())
+        self.assertEqual(sizes.tolist(), sizes2.tolist())
+
+    def test_chunks(self):
+        times, sizes = weibull_workload.workload_arrays(0.5, 0.9, 1000,
+                                                        seed=1)
+        jobs = list(weibull_workload.iter_jobs(
+            weibull_workload.workload_chunks(0.5, 0.9, 1000, seed=1,
+                                             chunk_size=77)))
+        self.assertEqual([jobid for jobid, _, _ in jobs], list(range(1000)))
+        self.assertEqual([size for _, _, size in jobs], sizes.tolist())
+        for (_, t, _), expected in zip(jobs, times):
+            self.assertAlmostEqual(t, expected, delta=1e-9 * times[-1])
+
+    def test_chunks_without_seed(self):
+        chunks = list(weibull_workload.workload_chunks(0.5, 0.9, 1000,
+                                                       chunk_size=77))
+        total_size = sum(sizes.sum() for _, sizes in chunks)
+        self.assertAlmostEqual(total_size / chunks[-1][0][-1], 0.9)
+
+
+class TestArrivals(unittest.TestCase):
+
+    def check(self, spec):
+        rng = numpy.random.default_rng(1)
+        times = arrivals.parse(spec)(100000, rng)
+        self.assertEqual(len(times), 100000)
+        self.assertEqual(times[0], 0)
+        self.assertTrue((times[1:] >= times[:-1]).all())
+        # rates are normalized to a mean inter-arrival time of 1
+        self.assertAlmostEqual(times[-1] / len(times), 1, delta=0.1)
+        return times
+
+    def test_mmpp(self):
+        self.check('mmpp:1,10:100,10')
+
+    def test_diurnal(self):
+        times = self.check('diurnal:1,3:1000')
+        # three times as many arrivals in the second half of each period
+        second_half = (times % 1000 >= 500).mean()
+        self.assertAlmostEqual(second_half, 0.75, delta=0.02)
+
+    def test_batch(self):
+        times = self.check('batch:8')
+        self.assertAlmostEqual(len(times) / len(numpy.unique(times)), 8,
+                               delta=0.5)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, arrivals.parse, 'poisson')
+
+    def test_invalid(self):
+        for spec in ['mmpp:1,10', 'mmpp:1,10:100,10:1', 'mmpp:1:100',
+                     'mmpp:1,10:100', 'mmpp:1,x:100,10', 'mmpp:1,10:0,10',
+                     'diurnal:1,2', 'diurnal:1,2:100,200', 'diurnal:0,0:10',
+                     'batch', 'batch:0.5', 'batch:4,8']:
+            with self.subTest(spec=spec):
+                self.assertRaises(ValueError, arrivals.parse, spec)
+
+    def test_empty(self):
+        rng = numpy.random.default_rng(1)
+        for spec in ['mmpp:1,10:100,10', 'diurnal:1,3:1000', 'batch:8']:
+            with self.subTest(spec=spec):
+                self.assertEqual(len(arrivals.parse(spec)(0, rng)), 0)
+
+    def test_workload(self):
+        times, sizes = weibull_workload.workload_arrays(
+            0.5, 0.9, 1000, seed=1, arrivals=arrivals.parse('batch:4'))
+        self.assertAlmostEqual(sizes.sum() / times[-1], 0.9)
+
+
+class TestEstimations(unittest.TestCase):
+
+    def test_models(self):
+        rng = numpy.random.default_rng(1)
+        sizes = numpy.array([0.5, 1, 2, 4] * 250)
+        for name, params in [('lognorm', [0.5]), ('lognorm-size', [0.5, 0.1]),
+                             ('normal', [1]), ('additive', [0.5]),
+                             ('quantized', [2, 0.3]), ('outliers', [0.1])]:
+            estimated = estimations.MODELS[name](sizes, rng, *params)
+            self.assertEqual(estimated.shape, sizes.shape, name)
+            self.assertTrue((estimated >= 0).all(), name)
+
+    def test_exact(self):
+        rng = numpy.random.default_rng(1)
+        sizes = numpy.array([1, 3, 8.])
+        self.assertEqual(estimations.lognorm(sizes, rng, 0).tolist(),
+                         sizes.tolist())
+        for estimated, expected in zip(estimations.quantized(sizes, rng),
+                                       [1, 4, 8]):
+            self.assertAlmostEqual(estimated, expected)
+
+    def test_zero_size(self):
+        rng = numpy.random.default_rng(1)
+        sizes = numpy.array([0., 1, 2])
+        for params in [(), (0.5, -0.5, 0.1)]:
+            estimated = estimations.lognorm_size(sizes, rng, *params)
+            self.assertFalse(numpy.isnan(estimated).any())
+            self.assertEqual(estimated[0], 0)
+
+    def test_arrival_order(self):
+        # the simulator asks for estimations in order of arrival
+        jobs = [(0, 1, 5), (1, 0, 3), (2, 2, 1)]
+        estimate = estimations.ErrorModel('lognorm', [0], jobs)()
+        self.assertEqual([estimate(None) for _ in jobs], [3, 5, 1])
+
+    def test_fixed(self):
+        model = estimations.FixedEstimations([1, 10, 1])
+        jobs = [(0, 0, 4), (1, 1, 2), (2, 2, 7)]
+        # a run truncated after the first arrival doesn't shift the
+        # estimations of the next ones
+        with self.assertRaises(simulator.BudgetExceeded):
+            list(simulator.simulator(jobs, schedulers.SRPT, model(),
+                                     max_events=1))
+        self.assertEqual(list(simulator.simulator(jobs, schedulers.SRPT,
+                                                  model())),
+                         [(4, 0), (11, 2), (13, 1)])
+
+
+class TestNorta(unittest.TestCase):
+
+    def test_seeded(self):
+        dist = scipy.stats.pareto(2, -1)
+        est, real = norta.generate(0.5, 10000, dist,
+                                   rng=numpy.random.default_rng(1))
+        self.assertAlmostEqual(numpy.corrcoef(est, real)[0, 1], 0.5,
+                               delta=0.01)
+        est2, real2 = norta.generate(0.5, 10000, dist,
+                                     rng=numpy.random.default_rng(1))
+        self.assertEqual(est.tolist(), est2.tolist())
+        self.assertEqual(real.tolist(), real2.tolist())
+
+    def test_cache(self):
+        # the workload does not depend on what is in the cache
+        dist = scipy.stats.pareto(3, -1)
+        dirname = tempfile.mkdtemp()
+        cache = os.path.join(dirname, 'norta_cache.db')
+        try:
+            norta.generate(0.5, 10000, dist, cache=cache,
+                           rng=numpy.random.default_rng(1000))
+            expected = norta.generate(0.5, 10000, dist,
+                                      rng=numpy.random.default_rng(2))
+            for _ in range(2):  # calibrating, then from the cache
+                est, real = norta.generate(0.5, 10000, dist, cache=cache,
+                                           rng=numpy.random.default_rng(2))
+                self.assertEqual(est.tolist(), expected[0].tolist())
+                self.assertEqual(real.tolist(), expected[1].tolist())
+        finally:
+            os.remove(cache)
+            os.rmdir(dirname)
+
+
+class TestSampler(unittest.TestCase):
+
+    jobs = [(0, 0, 2), (1, 1, 2)]
+
+    def test_interval(self):
+        sampler = simulator.Sampler(interval=1)
+        list(simulator.simulator(self.jobs, schedulers.PS, sampler=sampler))
+        columns = {name: column.tolist()
+                   for name, column in sampler.columns.items()}
+        self.assertEqual(columns, {'t': [0, 1, 2, 3], 'jobs': [1, 2, 2, 1],
+                                   'scheduled': [1, 2, 2, 1],
+                                   'work': [2, 3, 2, 1]})
+
+    def test_every(self):
+        sampler = simulator.Sampler(every=2)
+        list(simulator.simulator(self.jobs, schedulers.PS, sampler=sampler))
+        self.assertEqual(sampler.columns['t'].tolist(), [0, 3])
+        self.assertEqual(sampler.columns['work'].tolist(), [2, 1])
+
+    def test_gauges(self):
+        sampler = simulator.Sampler(every=1)
+        f = simulator.fixed_estimations([0.5, 10])
+        list(simulator.simulator(self.jobs, schedulers.FSP_plus_PS, f,
+                                 sampler=sampler))
+        self.assertIn('virtual', sampler.columns)
+        self.assertEqual(max(sampler.columns['late']), 1)
+
+    def test_new_gauge(self):
+
+        class Gauged(schedulers.PS):
+            def gauges(self):
+                return {'queued': len(self.running)} if self.running else {}
+
+        sampler = simulator.Sampler(every=1)
+        list(simulator.simulator(self.jobs, Gauged, sampler=sampler))
+        self.assertEqual(len(sampler.columns['queued']), len(sampler))
+        self.assertTrue(numpy.isnan(sampler.columns['queued'][0]))
+        self.assertEqual(sampler.columns['queued'][1], 1)
+
+
+class TestMemoryUsage(unittest.TestCase):
+
+    def test_deep_sizeof(self):
+        item = (1.5, 'job')
+        self.assertGreater(memory_usage.deep_sizeof([item]),
+                           sys.getsizeof([item]) + sys.getsizeof(item))
+        # shared objects are counted once
+        self.assertEqual(memory_usage.deep_sizeof([item, item]),
+                         memory_usage.deep_sizeof([item])
+                         + sys.getsizeof([item, item])
+                         - sys.getsizeof([item]))
+
+    def test_sampler(self):
+        jobs = [(i, i / 10, 1 + i % 3) for i in range(100)]
+        sampler = simulator.Sampler(every=10, memory=True)
+        list(simulator.simulator(jobs, schedulers.FSP_plus_LAS,
+                                 sampler=sampler))
+        peaks = memory_usage.peaks(sampler.columns)
+        for name in ['events', 'remaining', 'schedule', 'scheduler.queue',
+                     'scheduler.attained']:
+            self.assertGreater(peaks[name], 0)
+        self.assertEqual(list(peaks.values()),
+                         sorted(peaks.values(), reverse=True))
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_quantiles(self):
+        values = numpy.random.default_rng(1).pareto(1.5, 100000) + 1
+        sketch = analysis.QuantileSketch.from_values(values)
+        p = [0, 0.5, 0.99, 1]
+        for q, expected in zip(sketch.quantile(p), numpy.quantile(values, p)):
+            self.assertAlmostEqual(q, expected)
+
+    def test_merge(self):
+        rng = numpy.random.default_rng(1)
+        parts = [rng.pareto(1.1, 10000) + 1,
+                 10 * (rng.pareto(1.5, 30000) + 1), [numpy.nan]]
+        merged = analysis.merge(analysis.QuantileSketch.from_values(part)
+                                for part in parts)
+        self.assertEqual(merged.count, 40000)
+        pooled = numpy.concatenate(parts[:2])
+        p = [0.1, 0.5, 0.9, 0.99]
+        for q, expected in zip(merged.quantile(p), numpy.quantile(pooled, p)):
+            self.assertAlmostEqual(q / expected, 1, delta=0.05)
+
+
+class TestTailMetrics(unittest.TestCase):
+
+    def test_run_sketches(self):
+        sojourns = numpy.arange(1, 1001, dtype=float)
+        sizes = numpy.where(numpy.arange(1000) % 2, 1, 0.5)
+        priorities = numpy.arange(1000) % 2 + 1
+        sketches = analysis.run_sketches(sojourns, sizes, priorities)
+        self.assertEqual(sketches['sojourn'].quantile(0.99),
+                         numpy.quantile(sojourns, 0.99))
+        self.assertEqual(sketches['slowdown'].count, 1000)
+        self.assertEqual(sketches['sojourn', 1].count, 500)
+        self.assertAlmostEqual(sketches['slowdown', 1].quantile(1), 1998)
+        self.assertAlmostEqual(sketches['slowdown', 2].quantile(1), 1000)
+
+    def test_tail_sketches(self):
+        rng = numpy.random.default_rng(2)
+        sizes = rng.weibull(0.5, 10000)
+        runs = [sizes * (1 + rng.pareto(1, 10000)) for _ in range(3)]
+        shelf = {'PS': runs, 'sizes': sizes, 'metadata': {}}
+        legacy = analysis.tail_sketches('res.s', shelf)['PS']
+        shelf[analysis.TAILS] = {'PS': [analysis.run_sketches(run, sizes)
+                                        for run in runs]}
+        stored = analysis.tail_sketches('res.s', shelf)['PS']
+        self.assertEqual(stored['slowdown'].count, 30000)
+        self.assertEqual(stored['slowdown'].values.tolist(),
+                         legacy['slowdown'].values.tolist())
+        pooled = numpy.quantile(numpy.concatenate(runs) / numpy.tile(sizes, 3),
+                                analysis.TAIL_PROBABILITIES)
+        for q, expected in zip(
+                stored['slowdown'].quantile(analysis.TAIL_PROBABILITIES),
+                pooled):
+            self.assertAlmostEqual(q / expected, 1, delta=0.1)
+
+    def test_tail_sketches_legacy(self):
+        # legacy Weibull files have no sizes: the workload is regenerated
+        sizes = analysis.weibull_sizes('res_0.5_0.5_0.9_1_100_1.s', {})
+        shelf = {'PS': [2 * sizes], 'metadata': {}}
+        sketches = analysis.tail_sketches('res_0.5_0.5_0.9_1_100_1.s',
+                                          shelf)['PS']
+        self.assertEqual(sketches['slowdown'].quantile(0.5), 2)
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            sketches = analysis.tail_sketches('other.s', shelf)['PS']
+        self.assertIn('other.s', stderr.getvalue())
+        self.assertNotIn('slowdown', sketches)
+        self.assertEqual(sketches['sojourn'].count, 100)
+
+
+class TestSizeBuckets(unittest.TestCase):
+
+    def test_buckets(self):
+        sizes = numpy.array([0.01, 0.011, 5, 1e10])
+        slowdowns = numpy.array([[1, 3, 2, 1], [5, numpy.nan, 4, 1]])
+        buckets = analysis.SizeBuckets()
+        buckets.add(sizes, slowdowns)
+        xs, ys = buckets.means()
+        self.assertEqual(buckets.counts.sum(), 7)
+        self.assertEqual(len(xs), 3)
+        self.assertAlmostEqual(ys[0], 3)  # (1 + 3 + 5) / 3
+        self.assertEqual(ys.tolist()[1:], [3, 1])
+        xs, ys = buckets.quantiles(1)
+        self.assertAlmostEqual(ys[0], 5, delta=0.6)
+
+    def test_merge(self):
+        rng = numpy.random.default_rng(1)
+        sizes = rng.weibull(0.5, 1000)
+        slowdowns = 1 + rng.pareto(1, (4, 1000))
+        whole, parts = analysis.SizeBuckets(), analysis.SizeBuckets()
+        whole.add(sizes, slowdowns)
+        for run in slowdowns:
+            part = analysis.SizeBuckets()
+            part.add(sizes, run)
+            parts += part
+        self.assertEqual(whole.histograms.tolist(), parts.histograms.tolist())
+        for a, b in zip(whole.means(), parts.means()):
+            self.assertTrue(numpy.allclose(a, b))
+
+
+class TestSwimParser(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.fname = os.path.join(self.dirname, 'workload.tsv')
+        with open(self.fname, 'w') as f:
+            f.write("job0\t0\t0\t100\t0\t10\n"
+                    "job1\t5\t5\t200\t50\t20\n"
+                    "job2\t20\t15\t0\t30\t0\n")
+
+    def tearDown(self):
+        for fname in os.listdir(self.dirname):
+            os.remove(os.path.join(self.dirname, fname))
+        os.rmdir(self.dirname)
+
+    def test_parse(self):
+        sizes = [110, 200 + 5 * 50 + 20, 5 * 30]
+        multiplier = 0.9 * 20 / sum(sizes)
+        expected = [('job0', 0, 110 * multiplier),
+                    ('job1', 5, 470 * multiplier),
+                    ('job2', 20, 150 * multiplier)]
+        jobs = swim_parser.parse_swim(self.fname, 4, 0.9)
+        self.assertEqual([j[:2] for j in jobs], [e[:2] for e in expected])
+        for (_, _, size), (_, _, e) in zip(jobs, expected):
+            self.assertAlmostEqual(size, e)
+
+    def test_cache(self):
+        jobs = swim_parser.parse_swim(self.fname, 2, 0.5)
+        self.assertTrue(os.path.exists(self.fname + '.npz'))
+        self.assertEqual(swim_parser.parse_swim(self.fname, 2, 0.5), jobs)
+        # a modified file must be parsed again
+        with open(self.fname, 'a') as f:
+            f.write("job3\t40\t20\t10\t10\t10\n")
+        self.assertEqual(len(swim_parser.parse_swim(self.fname, 2, 0.5)), 4)
+
+    def test_empty(self):
+        fname = os.path.join(self.dirname, 'empty.tsv')
+        open(fname, 'w').close()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # numpy warns about empty files
+            self.assertEqual(swim_parser.parse_swim(fname, 4, 0.9), [])
+            self.assertEqual(swim_parser.parse_swim(fname, 4, 0.9), [])
+
+    def test_synth_load(self):
+        # SWIM files are loaded with load 1
+        t, size, estimate = synth_trace.load(self.fname)
+        self.assertIsNone(estimate)
+        self.assertAlmostEqual(size.sum() / t[-1], 1)
+
+
+class TestSynthTrace(unittest.TestCase):
+
+    def test_synthesize(self):
+        t = [0, 1, 3, 6, 10]
+        size = [1, 2, 3, 4, 5]
+        estimate = [10, 20, 30, 40, 50]
+        chunks = list(synth_trace.synthesize(t, size, estimate, 10000,
+                                             load=0.8, seed=1, block=2,
+                                             chunk_size=999))
+        times = [x for chunk_t, _, _ in chunks for x in chunk_t]
+        self.assertEqual(len(times), 10000)
+        self.assertEqual(times[0], 0)
+        self.assertEqual(times, sorted(times))
+        factor = 0.8 * 2.5 / 3
+        for _, chunk_size, chunk_estimate in chunks:
+            # pairs are resampled together
+            for s, e in zip(chunk_size, chunk_estimate):
+                self.assertAlmostEqual(e, 10 * s)
+                self.assertIn(round(s / factor), size)
+        total = sum(chunk_size.sum() for _, chunk_size, _ in chunks)
+        self.assertAlmostEqual(total / times[-1], 0.8, delta=0.05)
+
+    def test_write_empty(self):
+        dirname = tempfile.mkdtemp()
+        fname = os.path.join(dirname, 'empty.trace')
+        try:
+            chunks = synth_trace.synthesize([0, 1, 2], [1, 1, 1], None, 0)
+            realized = synth_trace.write(fname, chunks, 0, False)
+            self.assertTrue(numpy.isnan(realized))
+            self.assertEqual(len(binary_trace.read(fname).t), 0)
+        finally:
+            os.remove(fname)
+            os.rmdir(dirname)
+
+
+class TestBinaryTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.text = os.path.join(self.dirname, 'trace.txt')
+        self.binary = os.path.join(self.dirname, 'trace.trace')
+        with open(self.text, 'w') as f:
+            f.write("job_a 0 1.5 2\nb 0.25 3 1e-3\n\njob_\u00e9 7 0 4\n")
+
+    def tearDown(self):
+        for fname in os.listdir(self.dirname):
+            os.remove(os.path.join(self.dirname, fname))
+        os.rmdir(self.dirname)
+
+    def test_round_trip(self):
+        columns = binary_trace.from_text(self.text, estimations=True)
+        binary_trace.write(self.binary, *columns)
+        self.assertTrue(binary_trace.is_trace(self.binary))
+        trace = binary_trace.read(self.binary)
+        self.assertEqual(list(binary_trace.jobs(trace)),
+                         [('job_a', 0, 1.5), ('b', 0.25, 3),
+                          ('job_\u00e9', 7, 0)])
+        self.assertEqual(trace.estimate.tolist(), [2, 1e-3, 4])
+        self.assertEqual(len(trace.names), 3)
+        self.assertEqual(list(trace.names), ['job_a', 'b', 'job_\u00e9'])
+        self.assertEqual(trace.names.offsets.tolist(), [0, 5, 6, 12])
+
+    def test_without_estimates(self):
+        t, size, estimate, _ = binary_trace.from_text(self.text)
+        self.assertIsNone(estimate)
+        binary_trace.write(self.binary, t, size, jobids=[3, 1, 2])
+        trace = binary_trace.read(self.binary)
+        self.assertIsNone(trace.estimate)
+        self.assertIsNone(trace.names)
+        self.assertEqual(list(binary_trace.jobs(trace)),
+                         [(3, 0, 1.5), (1, 0.25, 3), (2, 7, 0)])
+
+    def test_not_a_trace(self):
+        self.assertFalse(binary_trace.is_trace(self.text))
+        with self.assertRaises(ValueError):
+            binary_trace.read(self.text)
+
+
+class TestRenormTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.fname = os.path.join(self.dirname, 'trace.txt')
+        rng = numpy.random.default_rng(1)
+        t = numpy.cumsum(rng.exponential(1, 1000)) + 5
+        size = rng.exponential(2, 1000)
+        numpy.savetxt(self.fname, numpy.column_stack([t, size, 3 * size]))
+
+    def tearDown(self):
+        for fname in os.listdir(self.dirname):
+            os.remove(os.path.join(self.dirname, fname))
+        os.rmdir(self.dirname)
+
+    def check_load(self, t, size, load):
+        self.assertEqual(t[0], 0)
+        self.assertAlmostEqual(sum(size) / t[-1], load)
+
+    def test_round_trip(self):
+        binary = os.path.join(self.dirname, 'trace.trace')
+        renorm_trace.renorm_file(self.fname, binary, 0.5, 'total',
+                                 chunk_size=77)
+        trace = binary_trace.read(binary)
+        self.check_load(trace.t, trace.size, 0.5)
+        self.assertAlmostEqual(trace.estimate.sum(), trace.size.sum())
+        text = os.path.join(self.dirname, 'trace2.txt')
+        renorm_trace.renorm_file(binary, text, 0.9, chunk_size=100)
+        t, size, estimate = numpy.loadtxt(text).T
+        self.check_load(t, size, 0.9)
+        self.assertEqual(estimate.tolist(), trace.estimate.tolist())
+
+    def test_same_file(self):
+        with self.assertRaises(ValueError):
+            renorm_trace.renorm_file(self.fname, self.fname, 0.5)
+
+
+class TestResultLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.index = os.path.join(self.dirname, result_loader.INDEX)
+        self.fnames = [self.write('res_0.5_{}.s'.format(seed), [[seed, 3]])
+                       for seed in range(3)]
+
+    def tearDown(self):
+        for fname in os.listdir(self.dirname):
+            os.remove(os.path.join(self.dirname, fname))
+        os.rmdir(self.dirname)
+
+    def write(self, basename, runs, pending=()):
+        fname = os.path.join(self.dirname, basename)
+        shelf = shelve.open(fname)
+        shelf['PS'] = runs
+        shelf['FIFO'] = [[2 * v for v in run] for run in runs]
+        shelf[result_loader.PENDING] = pending
+        shelf.close()
+        return fname
+
+    def load(self, fnames, read):
+        def summarize(fname, shelf):
+            read.append(fname)
+            return result_loader.means(fname, shelf, ['PS', 'FIFO'])
+        return result_loader.load(fnames, summarize, 'means', self.index,
+                                  processes=1)
+
+    def test_parallel(self):
+        loaded = result_loader.load(
+            self.fnames, functools.partial(result_loader.means,
+                                           schedulers=['PS']), 'means')
+        data = result_loader.tidy(loaded, {'shape': 1, 'seed': 2})
+        self.assertEqual(data['seed'].tolist(), [0, 1, 2])
+        self.assertEqual(data['shape'].tolist(), [0.5] * 3)
+        self.assertEqual(data['PS'].tolist(), [1.5, 2, 2.5])
+
+    def test_incremental(self):
+        read = []
+        self.assertEqual(len(self.load(self.fnames, read)), 3)
+        self.assertEqual(len(read), 3)
+        new = self.write('res_0.5_3.s', [[1, 1]])
+        self.write('res_0.5_0.s', [[1, 1, 1, 1]])
+        read = []
+        loaded = self.load(self.fnames + [new], read)
+        self.assertEqual(sorted(read), [self.fnames[0], new])
+        self.assertEqual(loaded[self.fnames[0]], {'PS': 1, 'FIFO': 2})
+        self.assertEqual(loaded[self.fnames[2]], {'PS': 2.5, 'FIFO': 5})
+
+    def test_pending(self):
+        writing = self.write('res_0.5_3.s', [[1]], pending=('FIFO',))
+        missing = os.path.join(self.dirname, 'res_0.5_4.s')
+        read = []
+        loaded = self.load(self.fnames + [writing, missing], read)
+        self.assertEqual(sorted(loaded), sorted(self.fnames + [writing]))
+        # only the results being written are left out
+        self.assertEqual(loaded[writing], {'PS': 1})
+        # and they are read once they are written
+        self.write('res_0.5_3.s', [[1, 2]])
+        read = []
+        self.assertEqual(self.load([writing], read),
+                         {writing: {'PS': 1.5, 'FIFO': 3}})
+        self.assertEqual(read, [writing])
+
+    def test_interrupted(self):
+        fname = self.write('res_0.5_3.s', [[1]])
+        final_results = experiment_helpers.open_results(fname)
+        try:
+            with experiment_helpers.updating(final_results, 'FIFO'):
+                final_results['FIFO'] = [[4]]
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+        final_results.close()
+        read = []
+        self.assertEqual(self.load([fname], read), {fname: {'PS': 1}})
+        # a new run of the driver makes them visible again
+        experiment_helpers.close_results(
+            experiment_helpers.open_results(fname))
+        self.assertEqual(self.load([fname], read),
+                         {fname: {'PS': 1, 'FIFO': 4}})
+
+
+class TestMakeFigures(unittest.TestCase):
+
+    def test_figures(self):
+        figures = make_figures.figures('out', 'res', 'res_njobs')
+        fnames = [figure.fname for figure in figures]
+        self.assertEqual(len(set(fnames)), len(make_figures.FIGURES))
+        njobs, = [f for f in figures if f.fname == 'out/3dnjobs.pdf']
+        self.assertIn('res_njobs', njobs.command)
+        slowdown, = make_figures.figures('out', 'res', 'res_njobs',
+                                         ['slowdown.pdf'])
+        self.assertIn('center right', slowdown.command)
+
+    def test_list_inputs(self):
+        dirname = tempfile.mkdtemp()
+        fname = os.path.join(dirname, 'res_0.25_0.5_0.9_1_10000_1.s')
+        try:
+            open(fname, 'w').close()
+            figure, = make_figures.figures('out', dirname, 'res_njobs',
+                                           ['slowdown.pdf'])
+            self.assertEqual(make_figures.list_inputs(figure), [fname])
+            figure = figure._replace(command=figure.command + ['--bad'])
+            self.assertIsNone(make_figures.list_inputs(figure))
+        finally:
+            os.remove(fname)
+            os.rmdir(dirname)
+
+    def test_signature(self):
+        figure, = make_figures.figures('out', 'res', 'res_njobs',
+                                       ['shape.pdf'])
+        with tempfile.NamedTemporaryFile('w') as f:
+            before = make_figures.inputs_signature(figure, [f.name])
+            self.assertEqual(make_figures.inputs_signature(figure, [f.name]),
+                             before)
+            f.write('more results')
+            f.flush()
+            self.assertNotEqual(
+                make_figures.inputs_signature(figure, [f.name]), before)
+
+
+class TestWorkqueue(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.fname = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.conn = workqueue.connect(self.fname)
+        workqueue.add(self.conn, ['true', 'false'], '/')
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove(self.fname)
+
+    def statuses(self):
+        return [row[0] for row in self.conn.execute(
+            "SELECT status FROM tasks ORDER BY id")]
+
+    def test_claim(self):
+        self.assertEqual(workqueue.claim(self.conn, 'w1', 60),
+                         (1, 'true', '/'))
+        self.assertEqual(workqueue.claim(self.conn, 'w2', 60)[0], 2)
+        self.assertIsNone(workqueue.claim(self.conn, 'w3', 60))
+        self.assertEqual(self.statuses(), [workqueue.RUNNING] * 2)
+
+    def test_renew(self):
+        task_id = workqueue.claim(self.conn, 'w1', 60)[0]
+        self.assertTrue(workqueue.renew(self.conn, task_id, 'w1', 60))
+        self.assertFalse(workqueue.renew(self.conn, task_id, 'w2', 60))
+
+    def test_finish(self):
+        workqueue.claim(self.conn, 'w1', 60)
+        workqueue.claim(self.conn, 'w1', 60)
+        workqueue.finish(self.conn, 1, 'w1', 0, 2)
+        workqueue.finish(self.conn, 2, 'w1', 1, 2)
+        self.assertEqual(self.statuses(), [workqueue.DONE, workqueue.PENDING])
+        workqueue.claim(self.conn, 'w1', 60)
+        workqueue.finish(self.conn, 2, 'w1', 1, 2)
+        self.assertEqual(self.statuses(), [workqueue.DONE, workqueue.FAILED])
+
+    def test_requeue_expired(self):
+        workqueue.claim(self.conn, 'w1', 60)
+        later = time.time() + 120
+        self.assertEqual(workqueue.requeue_expired(self.conn, 2, later), 1)
+        self.assertEqual(self.statuses(), [workqueue.PENDING] * 2)
+        # a task whose worker dies at every attempt ends up failed
+        workqueue.claim(self.conn, 'w2', 60)
+        self.assertEqual(workqueue.requeue_expired(self.conn, 2, later), 0)
+        self.assertEqual(self.statuses(),
+                         [workqueue.FAILED, workqueue.PENDING])
+
+    def test_lost_lease(self):
+        task_id, _, _ = workqueue.claim(self.conn, 'w1', 0.3)
+        # another worker takes the task over
+        self.conn.execute("UPDATE tasks SET worker = 'w2' WHERE id = ?",
+                          (task_id,))
+        start = time.time()
+        returncode = workqueue.run_task(self.fname, task_id, 'sleep 30',
+                                        '/', 'w1', 0.3)
+        self.assertNotEqual(returncode, 0)
+        self.assertLess(time.time() - start, 10)
+
+
+class TestBenchSchedulers(unittest.TestCase):
+
+    def test_exponent(self):
+        sizes = [10, 100, 1000]
+        self.assertAlmostEqual(
+            bench_schedulers.exponent(sizes, [2e-6 * n for n in sizes]), 1)
+        self.assertAlmostEqual(
+            bench_schedulers.exponent(sizes, [3e-7] * 3), 0)
+
+    def test_measure(self):
+        for name in ['PS', 'SRPT', 'PSBS']:
+            res = bench_schedulers.measure(bench_schedulers.SCHEDULERS[name],
+                                           20, min_time=0, max_cycles=10)
+            self.assertEqual(res['cycles'], 5)
+            self.assertEqual(set(res['latency']),
+                             set(bench_schedulers.OPERATIONS))
+            self.assertGreater(res['bytes_per_job'], 0)
+
+    def test_compare(self):
+        report = bench_schedulers.benchmark(['FIFO'], [10, 100], False, 0,
+                                            verbose=False)
+        self.assertEqual(bench_schedulers.compare(report, report), [])
+        slower = json.loads(json.dumps(report))
+        for latencies in slower['schedulers']['FIFO']['latency'].values():
+            latencies[-1] *= 3
+        self.assertEqual(len(bench_schedulers.compare(slower, report)),
+                         len(bench_schedulers.OPERATIONS))
+
+
+class TestBenchSimulator(unittest.TestCase):
+
+    def test_run(self):
+        specs = bench_simulator.workloads([0.5], [0.9], [100], [], 0)
+        (name, (generate, generate_args)), = specs.items()
+        self.assertEqual(name, 'weibull_0.5_0.9_100')
+        for scheduler in ['PS', 'FSPE+PS']:
+            res = bench_simulator.run(generate, generate_args, scheduler)
+            self.assertEqual(res['jobs'], 100)
+            self.assertGreaterEqual(res['events'], 200)
+            self.assertGreaterEqual(res['peak_rss'], res['setup_rss'])
+
+    def test_compare(self):
+        run = {'events_per_s': 1000, 'peak_rss': 2 ** 20}
+        baseline = {'runs': {'w/PS': run, 'w/SRPT': run}}
+        report = {'runs': {'w/PS': dict(run, events_per_s=900),
+                           'w/SRPT': dict(run, peak_rss=2 ** 21),
+                           'w/FIFO': dict(run, events_per_s=1)}}
+        regressions = bench_simulator.compare(report, baseline)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('w/SRPT'))
+
+
+class TestDifftest(unittest.TestCase):
+
+    def test_agree(self):
+        for name in ['FSP', 'LAS', 'SRPT_plus_LAS', 'FSP_plus_LAS']:
+            scheduler = getattr(schedulers, name)
+            self.assertIsNone(difftest.check(scheduler, scheduler, 50))
+
+    def test_shrink(self):
+        case, diffs = difftest.check(schedulers.FSP, schedulers.SRPT, 200)
+        self.assertTrue(diffs)
+        self.assertLessEqual(len(case), 4)
+        self.assertEqual(
+            difftest.differences(difftest.run(schedulers.FSP, case),
+                                 difftest.run(schedulers.SRPT, case)), diffs)
+
+    def test_shrink_terminates(self):
+        calls = []
+
+        def fails(case):
+            calls.append(case)
+            return True
+
+        case = difftest.shrink([(0, 2.6, 1, 1), (1, 2.6, 1, 1)], fails)
+        self.assertEqual(len(case), 1)
+        self.assertLess(len(calls), 100)
+
+    def test_differences(self):
+        self.assertEqual(difftest.differences({1: 1.0}, {1: 1.0 + 1e-12}), [])
+        self.assertEqual(len(difftest.differences({1: 1.0, 2: 2.0},
+                                                  {1: 1.1})), 2)
+        self.assertEqual(difftest.differences('ValueError', 'KeyError'), [])
+        self.assertEqual(len(difftest.differences({}, 'KeyError')), 1)
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=1)
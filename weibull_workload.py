@@ -7,6 +7,11 @@ import itertools
 import math
 import random
 
+import numpy
+
+import arrivals
+import workload_cache
+
 def workload_gen(shape, load, time_shape=1, seed=None):
 
     if seed is not None:
@@ -32,6 +37,129 @@ def workload(shape, load, n, time_shape=1, seed=None):
 
     return [(t * stretch_factor, size) for t, size in jobs]
 
+def _generators(seed):
+    # independent streams for sizes and inter-arrival times: drawing them
+    # in chunks or all at once yields the same values
+    return [numpy.random.default_rng(s)
+            for s in numpy.random.SeedSequence(seed).spawn(2)]
+
+def workload_arrays(shape, load, n, time_shape=1, seed=None, arrivals=None):
+    """Vectorized equivalent of workload(), returning (times, sizes) arrays.
+
+    Random values come from numpy rather than from the random module, so
+    the workload is not the one workload() generates with the same seed.
+    If arrivals is not None, it is an arrival process (see arrivals.py)
+    replacing Weibull inter-arrival times; time_shape is then ignored.
+    """
+
+    size_gen, time_gen = _generators(seed)
+    scale = 1 / math.gamma(1 + 1 / shape)
+
+    sizes = size_gen.weibull(shape, n)
+    sizes *= scale
+    if arrivals is not None:
+        times = arrivals(n, time_gen)
+    else:
+        time_scale = (1 / math.gamma(1 + 1 / time_shape)) / load
+        times = numpy.empty(n)
+        times[0] = 0
+        gaps = time_gen.weibull(time_shape, n - 1)
+        gaps *= time_scale
+        numpy.cumsum(gaps, out=times[1:])
+
+    # stretch submission times to get exactly the load we want
+    times *= sizes.sum() / (times[-1] * load)
+
+    return times, sizes
+
+def workload_chunks(shape, load, n, time_shape=1, seed=None,
+                    chunk_size=2 ** 20):
+    """Yield the workload_arrays() workload as (times, sizes) chunks.
+
+    Memory use is bounded by chunk_size. To get exactly the requested load
+    we make two passes over the same random streams: the first one only
+    accumulates the total size and the last arrival time, and the second
+    one regenerates the jobs and stretches their arrival times. Jobs are
+    those of workload_arrays() with the same seed, up to floating-point
+    rounding in the stretch factor.
+    """
+
+    if seed is None:
+        # both passes must draw the same values
+        seed = numpy.random.SeedSequence().entropy
+    scale = 1 / math.gamma(1 + 1 / shape)
+    time_scale = (1 / math.gamma(1 + 1 / time_shape)) / load
+
+    def chunks():
+        size_gen, time_gen = _generators(seed)
+        last_t = 0
+        for start in range(0, n, chunk_size):
+            k = min(chunk_size, n - start)
+            sizes = size_gen.weibull(shape, k)
+            sizes *= scale
+            # the first job arrives at 0, then one gap after each job
+            gaps = numpy.empty(k)
+            if start == 0:
+                gaps[0] = 0
+                gaps[1:] = time_gen.weibull(time_shape, k - 1)
+                gaps[1:] *= time_scale
+            else:
+                gaps[:] = time_gen.weibull(time_shape, k)
+                gaps *= time_scale
+            gaps[0] += last_t
+            times = numpy.cumsum(gaps, out=gaps)
+            last_t = times[-1]
+            yield times, sizes
+
+    totsize = last_t = 0
+    for times, sizes in chunks():
+        totsize += sizes.sum()
+        last_t = times[-1]
+    stretch_factor = totsize / (last_t * load)
+
+    for times, sizes in chunks():
+        times *= stretch_factor
+        yield times, sizes
+
+def iter_jobs(chunks):
+    """Turn (times, sizes) chunks in (jobid, t, size) triples, as expected by
+    simulator.simulator."""
+
+    jobid = 0
+    for times, sizes in chunks:
+        for t, size in zip(times.tolist(), sizes.tolist()):
+            yield jobid, t, size
+            jobid += 1
+
+def cached_workload(cachedir, generator, shape, load, n, time_shape=1,
+                    seed=None, arrivals_spec=None):
+    """Return the workload as a {'t': times, 'size': sizes} dict of arrays.
+
+    generator is 'weibull_workload.workload' or
+    'weibull_workload.workload_arrays', and arrivals_spec an optional
+    description of an arrival process for arrivals.parse() (only for
+    workload_arrays). Workloads are cached in cachedir, unless it is None
+    (see workload_cache).
+    """
+
+    def generate():
+        if generator == 'weibull_workload.workload_arrays':
+            process = None
+            if arrivals_spec is not None:
+                process = arrivals.parse(arrivals_spec)
+            t, size = workload_arrays(shape, load, n, time_shape, seed,
+                                      process)
+        else:
+            random.seed(seed)
+            t, size = zip(*workload(shape, load, n, time_shape))
+        return {'t': t, 'size': size}
+
+    return workload_cache.cached(
+        cachedir, generator,
+        {'shape': shape, 'load': load, 'njobs': n, 'timeshape': time_shape,
+         'arrivals': arrivals_spec},
+        seed, generate, [__file__, arrivals.__file__])
+
 def workload_priorities(shape, load, n, time_shape=1, seed=None,
                              nclasses=5):
     wl = workload(shape, load, n, time_shape, seed)
@@ -56,10 +184,33 @@ def main():
                         help="shape parameter for the Weibull distribution "
                         "of inter-arrival times; default is 1 (i.e. "
                         "exponential distribution)")
+    parser.add_argument('--vectorized', default=False, action='store_true',
+                        help="generate the workload with numpy (faster, "
+                        "streamed in bounded memory, but results differ "
+                        "from the default generator)")
+    parser.add_argument('--arrivals', help="bursty or non-stationary "
+                        "arrival process replacing Weibull inter-arrival "
+                        "times, e.g. 'mmpp:1,10:100,10' (see arrivals.py); "
+                        "implies --vectorized")
     parser.add_argument('n', type=int, help="number of jobs in the workload")
     args = parser.parse_args()
 
-    jobs = workload(args.shape, args.load, args.n, args.interarr, args.seed)
+    if args.arrivals is not None:
+        try:
+            process = arrivals.parse(args.arrivals)
+        except ValueError as e:
+            parser.error(str(e))
+        times, sizes = workload_arrays(args.shape, args.load, args.n,
+                                       seed=args.seed, arrivals=process)
+        jobs = zip(times.tolist(), sizes.tolist())
+    elif args.vectorized:
+        # streamed in chunks: memory use does not depend on n
+        chunks = workload_chunks(args.shape, args.load, args.n,
+                                 args.interarr, args.seed)
+        jobs = ((t, size) for _, t, size in iter_jobs(chunks))
+    else:
+        jobs = workload(args.shape, args.load, args.n, args.interarr,
+                        args.seed)
     for jobid, (t, size) in enumerate(jobs):
         print("{}\t{}\t{}".format(jobid, t, size))
 
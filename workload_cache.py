@@ -0,0 +1,80 @@
+"""Content-addressed cache of materialized workloads.
+
+A workload is identified by a hash of the generator name, its parameters,
+the seed and the source code that generates it. Its columns (e.g., arrival
+times, sizes and estimations) are stored as one .npy file each, in a
+directory named after the hash, and loaded memory-mapped: repeated or
+parallel experiments share the same pages instead of regenerating the
+workload.
+"""
+
+from __future__ import division
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy
+
+
+def code_version(sources):
+    """Hash of the contents of the source files in sources."""
+
+    h = hashlib.sha1()
+    for fname in sources:
+        with open(fname, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def key(generator, params, seed, version):
+    description = repr((generator, sorted(params.items()), seed, version))
+    return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+
+def _load(dirname):
+    return {os.path.splitext(fname)[0]:
+            numpy.load(os.path.join(dirname, fname), mmap_mode='r')
+            for fname in os.listdir(dirname) if fname.endswith('.npy')}
+
+
+def cached(cachedir, generator, params, seed, generate, sources=()):
+    """Return the {column: array} dictionary produced by generate().
+
+    If cachedir is None, caching is disabled and generate() is simply called.
+    Otherwise the result is looked up in cachedir using generator, params,
+    seed and the contents of the sources files as key; on a miss, generate()
+    is called and its result stored. Multiple processes can fill the cache
+    concurrently: each entry is written in a temporary directory and
+    atomically renamed.
+    """
+
+    if cachedir is None:
+        return {name: numpy.asarray(column)
+                for name, column in generate().items()}
+
+    version = code_version(sources)
+    dirname = os.path.join(cachedir, key(generator, params, seed, version))
+    if os.path.isdir(dirname):
+        return _load(dirname)
+
+    if not os.path.isdir(cachedir):
+        try:
+            os.makedirs(cachedir)
+        except OSError:  # somebody else created it in the meanwhile
+            pass
+    tmpdir = tempfile.mkdtemp(dir=cachedir, suffix='.tmp')
+    try:
+        for name, column in generate().items():
+            numpy.save(os.path.join(tmpdir, name + '.npy'),
+                       numpy.asarray(column))
+        os.rename(tmpdir, dirname)
+    except OSError:
+        # another process stored the same workload before us
+        if not os.path.isdir(dirname):
+            raise
+    finally:
+        if os.path.isdir(tmpdir):
+            shutil.rmtree(tmpdir)
+    return _load(dirname)
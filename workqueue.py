@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+"""Work queue to distribute experiments among several hosts.
+
+Tasks are shell commands (e.g., the lines of do_experiments) stored in a
+SQLite database that lives on a filesystem shared by the workers; no
+other service is needed. A worker claims a task by taking a lease on it
+and renews the lease while the task runs: if a worker dies, its lease
+expires and the task goes back to the queue, unless it has already been
+attempted max_attempts times (e.g., because it makes workers run out of
+memory). A worker that can't renew a lease aborts its task, which might
+be run by another worker. Tasks write their results in the usual result
+files, so nothing but exit statuses is stored here.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shlex
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    command TEXT NOT NULL,
+    cwd TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    returncode INTEGER,
+    started REAL,
+    finished REAL
+)
+"""
+
+
+def connect(fname):
+    conn = sqlite3.connect(fname, timeout=60, isolation_level=None)
+    conn.execute(SCHEMA)
+    return conn
+
+
+def add(conn, commands, cwd):
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO tasks (command, cwd) VALUES (?, ?)",
+                     ((command, cwd) for command in commands))
+    conn.execute("COMMIT")
+
+
+def requeue_expired(conn, max_attempts=MAX_ATTEMPTS, now=None):
+    """Put back in the queue the tasks whose lease has expired, or mark
+    them as failed if they have been attempted max_attempts times; return
+    the number of requeued tasks."""
+
+    if now is None:
+        now = time.time()
+    conn.execute("UPDATE tasks SET status = ?, worker = NULL "
+                 "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                 (FAILED, RUNNING, now, max_attempts))
+    cursor = conn.execute("UPDATE tasks SET status = ?, worker = NULL "
+                          "WHERE status = ? AND lease_until < ?",
+                          (PENDING, RUNNING, now))
+    return cursor.rowcount
+
+
+def claim(conn, worker, lease, max_attempts=MAX_ATTEMPTS):
+    """Lease the first pending task to worker; return (id, command, cwd).
+
+    Returns None if no task is pending.
+    """
+
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        requeue_expired(conn, max_attempts, now)
+        row = conn.execute("SELECT id, command, cwd FROM tasks "
+                           "WHERE status = ? ORDER BY id LIMIT 1",
+                           (PENDING,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE tasks SET status = ?, worker = ?, "
+                         "lease_until = ?, attempts = attempts + 1, "
+                         "started = ? WHERE id = ?",
+                         (RUNNING, worker, now + lease, now, row[0]))
+    except:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    return row
+
+
+def renew(conn, task_id, worker, lease):
+    """Extend the lease; returns False if the task is no longer ours."""
+
+    cursor = conn.execute("UPDATE tasks SET lease_until = ? "
+                          "WHERE id = ? AND worker = ? AND status = ?",
+                          (time.time() + lease, task_id, worker, RUNNING))
+    return cursor.rowcount == 1
+
+
+def finish(conn, task_id, worker, returncode, max_attempts):
+    attempts, = conn.execute("SELECT attempts FROM tasks WHERE id = ?",
+                             (task_id,)).fetchone()
+    if returncode == 0:
+        status = DONE
+    elif attempts >= max_attempts:
+        status = FAILED
+    else:
+        status = PENDING
+    conn.execute("UPDATE tasks SET status = ?, returncode = ?, "
+                 "finished = ?, lease_until = NULL "
+                 "WHERE id = ? AND worker = ?",
+                 (status, returncode, time.time(), task_id, worker))
+
+
+def run_task(fname, task_id, command, cwd, worker, lease):
+    """Run a task, renewing its lease; return its exit status.
+
+    If the lease can't be renewed, the task is killed: another worker might
+    be running it.
+    """
+
+    # the command runs in a session of its own, so that it can be killed
+    # with its children
+    proc = subprocess.Popen(command, shell=True, cwd=cwd,
+                            start_new_session=True)
+    # the lease is renewed by a separate connection in a background thread
+    stop = threading.Event()
+
+    def heartbeat():
+        renewed = True
+        try:
+            conn = connect(fname)
+            try:
+                while renewed and not stop.wait(lease / 3):
+                    renewed = renew(conn, task_id, worker, lease)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print('[{}] task {}: {}'.format(worker, task_id, e),
+                  file=sys.stderr)
+            renewed = False
+        if not renewed:
+            print('[{}] task {}: lease lost, aborting'.format(worker, task_id),
+                  file=sys.stderr)
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass  # already over
+
+    thread = threading.Thread(target=heartbeat)
+    thread.daemon = True
+    thread.start()
+    try:
+        return proc.wait()
+    finally:
+        stop.set()
+        thread.join()
+
+
+def work(fname, lease, poll, max_attempts, exit_when_empty):
+    worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+    conn = connect(fname)
+    while True:
+        task = claim(conn, worker, lease, max_attempts)
+        if task is None:
+            running, = conn.execute("SELECT COUNT(*) FROM tasks "
+                                    "WHERE status = ?",
+                                    (RUNNING,)).fetchone()
+            if exit_when_empty and not running:
+                break
+            time.sleep(poll)
+            continue
+        task_id, command, cwd = task
+        print('[{}] task {}: {}'.format(worker, task_id, command))
+        sys.stdout.flush()
+        returncode = run_task(fname, task_id, command, cwd, worker, lease)
+        finish(conn, task_id, worker, returncode, max_attempts)
+    conn.close()
+
+
+def status(conn):
+    return dict(conn.execute("SELECT status, COUNT(*) FROM tasks "
+                             "GROUP BY status"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work queue for running "
+                                     "experiments on several hosts sharing "
+                                     "a filesystem")
+    parser.add_argument('queue', help="SQLite file holding the queue; it "
+                        "should be on a filesystem shared by all workers")
+    subparsers = parser.add_subparsers(dest='action')
+
+    add_parser = subparsers.add_parser('add', help="add tasks, one shell "
+                                       "command per line")
+    add_parser.add_argument('file', nargs='?', help="file with commands "
+                            "(stdin if omitted); empty lines and lines "
+                            "starting with '#' are ignored")
+    add_parser.add_argument('--command', nargs=argparse.REMAINDER,
+                            help="add a single task running the remaining "
+                            "arguments, which are quoted for the shell")
+
+    work_parser = subparsers.add_parser('work', help="run tasks")
+    work_parser.add_argument('--lease', type=float, default=300,
+                             help="lease duration in seconds; it is renewed "
+                             "while the task runs; default is 300")
+    work_parser.add_argument('--poll', type=float, default=10,
+                             help="seconds to wait before looking again for "
+                             "tasks when the queue is empty; default is 10")
+    work_parser.add_argument('--max_attempts', type=int,
+                             default=MAX_ATTEMPTS,
+                             help="number of attempts before a failing task "
+                             "is marked as failed; default is {}".format(
+                                 MAX_ATTEMPTS))
+    work_parser.add_argument('--exit_when_empty', default=False,
+                             action='store_true',
+                             help="exit when no tasks are pending or running "
+                             "instead of waiting for new ones")
+
+    subparsers.add_parser('status', help="print number of tasks per status")
+
+    requeue_parser = subparsers.add_parser('requeue', help="put back in the "
+                                           "queue expired tasks")
+    requeue_parser.add_argument('--failed', default=False,
+                                action='store_true',
+                                help="requeue failed tasks as well")
+    requeue_parser.add_argument('--max_attempts', type=int,
+                                default=MAX_ATTEMPTS,
+                                help="expired tasks attempted this many "
+                                "times are marked as failed; default is "
+                                "{}".format(MAX_ATTEMPTS))
+    args = parser.parse_args()
+
+    if args.action == 'add':
+        if args.command is not None:
+            if not args.command:
+                add_parser.error("--command needs a command to run")
+            commands = [' '.join(shlex.quote(a) for a in args.command)]
+        else:
+            f = open(args.file) if args.file is not None else sys.stdin
+            commands = [line.strip() for line in f]
+            commands = [c for c in commands
+                        if c and not c.startswith('#')]
+        add(connect(args.queue), commands, os.getcwd())
+    elif args.action == 'work':
+        work(args.queue, args.lease, args.poll, args.max_attempts,
+             args.exit_when_empty)
+    elif args.action == 'status':
+        for status_, count in sorted(status(connect(args.queue)).items()):
+            print('{}\t{}'.format(status_, count))
+    elif args.action == 'requeue':
+        conn = connect(args.queue)
+        n = requeue_expired(conn, args.max_attempts)
+        if args.failed:
+            n += conn.execute("UPDATE tasks SET status = ?, attempts = 0 "
+                              "WHERE status = ?",
+                              (PENDING, FAILED)).rowcount
+        print(n, "tasks requeued")
+    else:
+        parser.error("an action is required")
+
+if __name__ == '__main__':
+    main()